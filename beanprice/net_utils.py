@@ -4,9 +4,36 @@ __copyright__ = "Copyright (C) 2015-2016  Martin Blais"
 __license__ = "GNU GPLv2"
 
 import logging
+import threading
+from typing import Any, List, Optional
 from urllib import request
 from urllib import error
 
+import requests
+from requests import adapters
+from curl_cffi import CurlHttpVersion
+from curl_cffi import requests as curl_requests
+
+
+# The default maximum number of connections kept alive per host.
+DEFAULT_POOL_SIZE = 10
+
+# The number of times to retry a request which failed to connect.
+DEFAULT_MAX_RETRIES = 3
+
+# The default number of seconds to wait for a server to respond to a request.
+DEFAULT_TIMEOUT = 30
+
+# The pool of connections shared by the sessions of all the threads, and
+# whether to speak HTTP/2 instead. See setup_session().
+_ADAPTER: Optional[adapters.HTTPAdapter] = None
+_HTTP2 = False
+
+# The per-thread sessions, and a list of all of them for closing.
+_LOCAL = threading.local()
+_SESSIONS: List[Any] = []
+_SESSIONS_LOCK = threading.Lock()
+
 
 def retrying_urlopen(url, timeout=5, max_retry=5):
     """Open and download the given URL, retrying if it times out.
@@ -30,3 +57,90 @@ def retrying_urlopen(url, timeout=5, max_retry=5):
     if response and response.getcode() != 200:
         return None
     return response
+
+
+def _make_adapter(pool_size: int) -> adapters.HTTPAdapter:
+    """Create a pool of connections to be shared by the sessions.
+
+    Args:
+      pool_size: An integer, the maximum number of connections kept alive to each
+        host.
+    Returns:
+      An HTTPAdapter instance, which retries the requests which fail to connect.
+    """
+    return adapters.HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=DEFAULT_MAX_RETRIES
+    )
+
+
+def setup_session(pool_size: int = DEFAULT_POOL_SIZE, http2: bool = False):
+    """Configure the HTTP sessions shared by the sources.
+
+    Any session created before this is closed.
+
+    Args:
+      pool_size: An integer, the maximum number of connections kept alive to each
+        host. This should be at least the number of threads making requests.
+      http2: A boolean, true to negotiate HTTP/2 with the servers, using curl
+        instead of the requests library.
+    """
+    global _ADAPTER, _HTTP2
+    close_sessions()
+    with _SESSIONS_LOCK:
+        _ADAPTER = _make_adapter(pool_size)
+        _HTTP2 = http2
+
+
+def get_session():
+    """Return the HTTP session of the current thread.
+
+    Sessions are not safe to share between threads, so each thread gets its own.
+    All the sessions share the same pool of connections, which are kept alive
+    between requests.
+
+    Returns:
+      A requests.Session instance, or a compatible curl_cffi.requests.Session
+      instance if HTTP/2 is enabled.
+    """
+    global _ADAPTER
+    session = getattr(_LOCAL, "session", None)
+    if session is None:
+        with _SESSIONS_LOCK:
+            if _HTTP2:
+                session = curl_requests.Session(http_version=CurlHttpVersion.V2TLS)
+            else:
+                if _ADAPTER is None:
+                    _ADAPTER = _make_adapter(DEFAULT_POOL_SIZE)
+                session = requests.Session()
+                session.mount("https://", _ADAPTER)
+                session.mount("http://", _ADAPTER)
+            _SESSIONS.append(session)
+        _LOCAL.session = session
+    return session
+
+
+def close_sessions():
+    """Close all the HTTP sessions and their connections."""
+    global _LOCAL
+    with _SESSIONS_LOCK:
+        for session in _SESSIONS:
+            session.close()
+        _SESSIONS.clear()
+        _LOCAL = threading.local()
+
+
+def get(url: str, params: Any = None, **kwargs: Any) -> Any:
+    """Send a GET request using the session of the current thread.
+
+    This is a drop-in replacement for requests.get() which reuses connections.
+    Unlike it, requests time out after DEFAULT_TIMEOUT seconds by default.
+
+    Args:
+      url: A string, the URL to fetch.
+      params: An optional dict or list of tuples of query parameters.
+      kwargs: Other arguments to the session's get() method, e.g. headers.
+    Returns:
+      A requests.Response instance, or a compatible object.
+    """
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    return get_session().get(url, params=params, **kwargs)
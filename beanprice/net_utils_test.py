@@ -2,9 +2,12 @@ __copyright__ = "Copyright (C) 2015-2016  Martin Blais"
 __license__ = "GNU GPLv2"
 
 import http.client
+import threading
 import unittest
 from unittest import mock
 
+from curl_cffi import requests as curl_requests
+
 from beanprice import net_utils
 
 
@@ -33,5 +36,52 @@ class TestRetryingUrlopen(unittest.TestCase):
             self.assertIsNone(net_utils.retrying_urlopen("http://nowhere.com"))
 
 
+class TestSession(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(net_utils.setup_session)
+
+    def test_get_session__per_thread(self):
+        net_utils.setup_session(pool_size=4)
+        session = net_utils.get_session()
+        self.assertIs(session, net_utils.get_session())
+
+        sessions = []
+        thread = threading.Thread(target=lambda: sessions.append(net_utils.get_session()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(session, sessions[0])
+
+        # The connection pool is shared by all the threads.
+        adapter = session.get_adapter("https://example.com")
+        self.assertIs(adapter, sessions[0].get_adapter("https://example.com"))
+        self.assertEqual(4, adapter._pool_maxsize)
+
+    def test_close_sessions(self):
+        session = net_utils.get_session()
+        with mock.patch.object(session, "close") as close:
+            net_utils.close_sessions()
+        close.assert_called_once_with()
+        self.assertIsNot(session, net_utils.get_session())
+
+    def test_get_session__http2(self):
+        net_utils.setup_session(http2=True)
+        self.assertIsInstance(net_utils.get_session(), curl_requests.Session)
+
+    def test_get(self):
+        with mock.patch("requests.Session.get") as get:
+            net_utils.get("http://nowhere.com", {"a": "b"}, headers={"c": "d"})
+        get.assert_called_once_with(
+            "http://nowhere.com",
+            params={"a": "b"},
+            headers={"c": "d"},
+            timeout=net_utils.DEFAULT_TIMEOUT,
+        )
+
+    def test_get__timeout(self):
+        with mock.patch("requests.Session.get") as get:
+            net_utils.get("http://nowhere.com", timeout=5)
+        get.assert_called_once_with("http://nowhere.com", params=None, timeout=5)
+
+
 if __name__ == "__main__":
     unittest.main()
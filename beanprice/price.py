@@ -4,9 +4,12 @@ __copyright__ = "Copyright (C) 2015-2020  Martin Blais"
 __license__ = "GNU GPLv2"
 
 import argparse
+import asyncio
+import bisect
 import collections
 import datetime
 import functools
+import itertools
 from os import path
 import os
 import tempfile
@@ -14,8 +17,20 @@ import hashlib
 import re
 import sys
 import logging
+import threading
 from concurrent import futures
-from typing import Any, Dict, List, Optional, NamedTuple, Tuple
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    NamedTuple,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
 import diskcache
 
 from dateutil import tz
@@ -24,14 +39,15 @@ from beancount.core.number import ONE
 from beancount import loader
 from beancount.core import data
 from beancount.core import amount
-from beancount.core import prices
-from beancount.core import getters
+from beancount.core import inventory
 from beancount.ops import lifetimes
 from beancount.parser import printer
-from beancount.ops import find_prices
 
 from beanprice import date_utils
+from beanprice import net_utils
+from beanprice import rate_limit
 import beanprice
+import beanprice.source
 
 
 # A price source.
@@ -63,6 +79,31 @@ class DatedPrice(NamedTuple):
     sources: List[PriceSource]
 
 
+# A range of dates to fetch for a single pair, from a common list of sources.
+#
+# Attributes:
+#   base: A commodity string, as for DatedPrice.
+#   quote: A commodity string, as for DatedPrice.
+#   dates: A sorted list of datetime.date objects, the dates to be fetched.
+#   sources: A list of PriceSource instances describing where to fetch prices from.
+class DatedPriceRange(NamedTuple):
+    base: Optional[str]
+    quote: Optional[str]
+    dates: List[datetime.date]
+    sources: List[PriceSource]
+
+
+# A group of jobs for the latest price whose first source is from the same
+# module, to be fetched with a single call to the source.
+#
+# Attributes:
+#   module: A Python module, the module of the first source of all the jobs.
+#   jobs: A list of DatedPrice instances, all with a date of None.
+class PriceBatch(NamedTuple):
+    module: Any
+    jobs: List[DatedPrice]
+
+
 # The Python package where the default sources are found.
 DEFAULT_PACKAGE = "beanprice.sources"
 
@@ -74,14 +115,78 @@ UNKNOWN_CURRENCY = "?"
 # A cache for the prices.
 _CACHE = None
 
-# Expiration for latest prices in the cache.
+# A registry of Source instances, one per source module name, shared across all
+# jobs and worker threads, and the locks guarding their creation.
+_SOURCES: Dict[str, Any] = {}
+_SOURCES_LOCKS: Dict[str, threading.Lock] = {}
+_SOURCES_LOCK = threading.Lock()
+
+# Expiration for latest prices in the cache, and for prices at a date while the
+# market is still open on that date.
 DEFAULT_EXPIRATION = datetime.timedelta(seconds=30 * 60)  # 30 mins.
 
+# Expiration for prices at a recent date, after the query time on that date but
+# before the close is considered final.
+RECENT_EXPIRATION = datetime.timedelta(hours=6)
+
+# The time after the end of a trading day, in the timezone of the market, from
+# which its closing price is considered final and is cached forever. This leaves
+# time for late corrections from the sources.
+SETTLEMENT_DELAY = datetime.timedelta(hours=12)
+
+# Expiration for failures to fetch a price in the cache, during which the price
+# is not requested again. This doubles with each consecutive failure to fetch
+# the same symbol from the same source, up to a maximum.
+DEFAULT_NEGATIVE_EXPIRATION = datetime.timedelta(hours=1)
+MAX_NEGATIVE_EXPIRATION = datetime.timedelta(days=7)
+
+# The cache key of the record of consecutive failures, by source and symbol.
+_FAILURES_KEY = "failures"
+
+# The (module name, symbol) pairs whose fetching was skipped in this run due to
+# recent failures.
+_SUPPRESSED: Set[Tuple[str, str]] = set()
+
+# The prefix of the cache keys of the planning states of the ledgers, and the
+# version of their format. States of another version are ignored.
+_LEDGER_STATE_PREFIX = "ledger-state"
+_LEDGER_STATE_VERSION = 2
+
 
 # The default source parser is back.
 DEFAULT_SOURCE = "beanprice.sources.yahoo"
 
 
+# Default limits on the rate of requests per second and on the number of
+# concurrent requests for some of the sources, by module name. These can be
+# overridden with --rate-limit.
+DEFAULT_RATE_LIMITS: Dict[str, Tuple[Optional[float], Optional[int]]] = {
+    # The free tier of Alphavantage allows 5 requests per minute.
+    "beanprice.sources.alphavantage": (5 / 60, 1),
+}
+
+# The rate limits in effect, by module name, and the corresponding limiters.
+_RATE_LIMITS: Dict[str, Tuple[Optional[float], Optional[int]]] = dict(
+    DEFAULT_RATE_LIMITS
+)
+_RATE_LIMITERS: Dict[str, rate_limit.RateLimiter] = {}
+_RATE_LIMITERS_LOCK = threading.Lock()
+
+
+# The maximum number of days between two consecutive dates of a pair for them
+# to be merged in the same range job. This is large enough to bridge weekends
+# and the weekly update rate.
+DEFAULT_MAX_RANGE_GAP = 7
+
+# The default maximum number of concurrent requests to a single source in
+# asynchronous mode.
+DEFAULT_SOURCE_CONCURRENCY = 4
+
+# How far back before the first date of a range we fetch series for, in order
+# to find a price for dates on which the market was closed.
+SERIES_LOOKBACK = datetime.timedelta(days=5)
+
+
 def format_dated_price_str(dprice: DatedPrice) -> str:
     """Convert a dated price to a one-line printable string.
 
@@ -199,6 +304,187 @@ def import_source(module_name: str):
             ) from exc
 
 
+def _get_module_names(psources: List[PriceSource]) -> List[PriceSource]:
+    """Replace the modules of price sources by their names, to pickle them."""
+    return [psource._replace(module=psource.module.__name__) for psource in psources]
+
+
+def _import_modules(psources: List[PriceSource]) -> List[PriceSource]:
+    """Replace the module names of price sources by the modules, see _get_module_names().
+
+    Raises:
+      ImportError: If a module cannot be imported.
+    """
+    return [psource._replace(module=import_source(psource.module)) for psource in psources]
+
+
+def get_source(module) -> Any:
+    """Return the shared Source instance for a source module.
+
+    The instance is created on first use and reused for all subsequent jobs,
+    from any thread. Creation is serialized per module, so that a slow
+    constructor (e.g., one which establishes a session) only runs once and
+    does not block the creation of sources from other modules.
+
+    Args:
+      module: A Python module object with a Source class.
+    Returns:
+      An instance of the module's Source class.
+    Raises:
+      AttributeError: If the module has no Source class.
+    """
+    name = module.__name__
+    with _SOURCES_LOCK:
+        lock = _SOURCES_LOCKS.setdefault(name, threading.Lock())
+    with lock:
+        source = _SOURCES.get(name, None)
+        if source is None:
+            source = _SOURCES[name] = module.Source()
+            # Only hand the cache to sources which follow the contract and do not
+            # set their own.
+            if (
+                _CACHE is not None
+                and isinstance(source, beanprice.source.Source)
+                and source.cache is beanprice.source.Source.cache
+            ):
+                source.cache = _CACHE
+    return source
+
+
+async def aclose_sources():
+    """Release the asynchronous resources of all the shared Source instances."""
+    with _SOURCES_LOCK:
+        sources = list(_SOURCES.values())
+    for source in sources:
+        aclose = getattr(source, "aclose", None)
+        if asyncio.iscoroutinefunction(aclose):
+            try:
+                await aclose()
+            except Exception as exc:
+                logging.warning("Error closing source %s: %s", source, exc)
+
+
+def reset_sources():
+    """Release all the shared Source instances."""
+    with _SOURCES_LOCK:
+        sources = list(_SOURCES.values())
+        _SOURCES.clear()
+        _SOURCES_LOCKS.clear()
+    for source in sources:
+        close = getattr(source, "close", None)
+        if close is not None:
+            try:
+                close()
+            except Exception as exc:
+                logging.warning("Error closing source %s: %s", source, exc)
+
+
+def parse_rate_limit(spec: str) -> Tuple[str, Optional[float], Optional[int]]:
+    """Parse a rate limit specification string.
+
+    Rate limit specifications follow the syntax:
+
+      <module>=<rate>[/<concurrency>]
+
+    where <rate> is the maximum number of requests per second, and the optional
+    <concurrency> is the maximum number of requests in flight at the same time.
+    Either may be empty for no limit. For example, "yahoo=2/4".
+
+    Args:
+      spec: A string, the rate limit specification.
+    Returns:
+      A tuple of the full module name, rate and concurrency.
+    Raises:
+      ValueError: If the specification is invalid.
+      ImportError: If the module cannot be imported.
+    """
+    match = re.match(r"([a-zA-Z]+[a-zA-Z0-9\._]*)=([0-9.]*)(?:/([0-9]*))?$", spec)
+    if not match:
+        raise ValueError('Invalid rate limit: "{}"'.format(spec))
+    module_name, rate_str, concurrency_str = match.groups()
+    rate = float(rate_str) if rate_str else None
+    concurrency = int(concurrency_str) if concurrency_str else None
+    if rate is not None and rate <= 0 or concurrency is not None and concurrency <= 0:
+        raise ValueError('Invalid rate limit: "{}"'.format(spec))
+    return import_source(module_name).__name__, rate, concurrency
+
+
+def setup_rate_limits(specs: Optional[List[str]]):
+    """Setup the rate limits of the sources.
+
+    Args:
+      specs: A list of rate limit specification strings, overriding the
+        default limits of their modules.
+    Raises:
+      ValueError: If a specification is invalid.
+    """
+    limits = dict(DEFAULT_RATE_LIMITS)
+    for spec in specs or []:
+        module_name, rate, concurrency = parse_rate_limit(spec)
+        limits[module_name] = (rate, concurrency)
+    with _RATE_LIMITERS_LOCK:
+        _RATE_LIMITS.clear()
+        _RATE_LIMITS.update(limits)
+        _RATE_LIMITERS.clear()
+
+
+def get_rate_limiter(module_name: str) -> rate_limit.RateLimiter:
+    """Return the shared rate limiter for a source module.
+
+    Args:
+      module_name: A string, the full name of the source module.
+    Returns:
+      A RateLimiter instance. Modules without configured limits get a limiter
+      which never waits.
+    """
+    with _RATE_LIMITERS_LOCK:
+        limiter = _RATE_LIMITERS.get(module_name, None)
+        if limiter is None:
+            rate, concurrency = _RATE_LIMITS.get(module_name, (None, None))
+            limiter = _RATE_LIMITERS[module_name] = rate_limit.RateLimiter(
+                rate, concurrency
+            )
+    return limiter
+
+
+def _get_declared(entry: data.Commodity) -> List[Tuple[str, str, List[PriceSource]]]:
+    """Return the currencies declared by a Commodity directive.
+
+    Args:
+      entry: A Commodity directive.
+    Returns:
+      A list of (base, quote, list of PriceSource) currencies, from its 'price'
+      metadata field.
+    """
+    # Here we have to infer which quote currencies the commodity is for
+    # (maybe down the road this should be better handled by providing a list
+    # of quote currencies in the Commodity directive itself).
+    #
+    # First, we look for a "price" metadata field, which defines conversions
+    # for various currencies. Each of these quote currencies generates a
+    # pair in the output.
+    source_str = entry.meta.get("price", None)
+    if source_str is None:
+        # Otherwise we simply ignore the declaration. That is, a Commodity
+        # directive without any "price" metadata would not register as a
+        # declared currency.
+        logging.debug("Ignoring currency with no metadata: %s", entry.currency)
+        return []
+    if source_str == "":
+        logging.debug("Skipping ignored currency (with empty price): %s", entry.currency)
+        return []
+    try:
+        source_map = parse_source_map(source_str)
+    except ValueError as exc:
+        logging.warning(
+            "Ignoring currency with invalid 'price' source: %s (%s)",
+            entry.currency,
+            exc,
+        )
+        return []
+    return [(entry.currency, quote, psources) for quote, psources in source_map.items()]
+
+
 def find_currencies_declared(
     entries: data.Entries,
     date: Optional[datetime.date] = None,
@@ -221,41 +507,185 @@ def find_currencies_declared(
             continue
         if date and entry.date >= date:
             break
+        currencies.extend(_get_declared(entry))
+    return currencies
 
-        # Here we have to infer which quote currencies the commodity is for
-        # (maybe down the road this should be better handled by providing a list
-        # of quote currencies in the Commodity directive itself).
-        #
-        # First, we look for a "price" metadata field, which defines conversions
-        # for various currencies. Each of these quote currencies generates a
-        # pair in the output.
-        source_str = entry.meta.get("price", None)
-        if source_str is not None:
-            if source_str == "":
-                logging.debug(
-                    "Skipping ignored currency (with empty price): %s", entry.currency
-                )
-                continue
-            try:
-                source_map = parse_source_map(source_str)
-            except ValueError as exc:
-                logging.warning(
-                    "Ignoring currency with invalid 'price' source: %s (%s)",
-                    entry.currency,
-                    exc,
-                )
-            else:
-                for quote, psources in source_map.items():
-                    currencies.append((entry.currency, quote, psources))
-        else:
-            # Otherwise we simply ignore the declaration. That is, a Commodity
-            # directive without any "price" metadata would not register as a
-            # declared currency.
-            logging.debug("Ignoring currency with no metadata: %s", entry.currency)
 
+# The information needed from the entries of a ledger to build the price jobs,
+# gathered in a single pass over them by scan_entries().
+#
+# Attributes:
+#   declared: A list of (base, quote, list of PriceSource) currencies, as from
+#     find_currencies_declared().
+#   commodities: A dict of currency to its Commodity directive.
+#   at_cost: A set of (base, quote) currencies held at cost at some point.
+#   converted: A set of (base, quote) currencies from price conversions before
+#     the date.
+#   priced: A set of (base, quote) currencies from Price directives before the
+#     date.
+#   balance_currencies: A set of (base, quote) currencies relevant for the
+#     balances at the date, as from find_prices.find_balance_currencies().
+#   lifetimes: A dict of (base, quote) currencies to lists of (begin, end)
+#     dates, as from lifetimes.get_commodity_lifetimes(), or None if not
+#     requested.
+#   latest_dates: A dict of (base, quote) currencies to the date of their latest
+#     price, or None if not requested. This is the date get_latest_price() would
+#     find in the price map of the entries; see _update_latest_dates().
+class LedgerScan(NamedTuple):
+    declared: List[Tuple[str, str, List[PriceSource]]]
+    commodities: Dict[str, data.Commodity]
+    at_cost: Set[Tuple[str, str]]
+    converted: Set[Tuple[str, str]]
+    priced: Set[Tuple[str, str]]
+    balance_currencies: Set[Tuple[str, str]]
+    lifetimes: Optional[Dict[Tuple[str, str], List[Tuple]]]
+    latest_dates: Optional[Dict[Tuple[str, str], datetime.date]]
+
+
+def _update_latest_dates(latest_dates, entry):
+    """Record the date of a Price directive in an index of the latest prices.
+
+    A price also provides the rate of the inverted pair, unless it is zero, as
+    in the price map.
+
+    Args:
+      latest_dates: A dict of (base, quote) currencies to the date of their
+        latest price, updated in place.
+      entry: A Price directive.
+    """
+    base, quote = entry.currency, entry.amount.currency
+    pairs = [(base, quote)]
+    if entry.amount.number:
+        pairs.append((quote, base))
+    for base_quote in pairs:
+        latest_date = latest_dates.get(base_quote)
+        if latest_date is None or latest_date < entry.date:
+            latest_dates[base_quote] = entry.date
+
+
+def _get_balance_currencies(balances, converted):
+    """Return the currencies relevant for some balances.
+
+    See find_prices.find_balance_currencies(), which this mirrors.
+
+    Args:
+      balances: A dict of account to Inventory instance.
+      converted: A set of (base, quote) currencies from conversions and prices.
+    Returns:
+      A set of (base, quote) currencies.
+    """
+    currencies = set()
+    currencies_on_books = set()
+    for balance in balances.values():
+        for pos in balance:
+            if pos.cost is not None:
+                currencies.add((pos.units.currency, pos.cost.currency))
+            else:
+                currencies_on_books.add(pos.units.currency)
+    for base_quote in converted:
+        if base_quote[0] in currencies_on_books:
+            currencies.add(base_quote)
     return currencies
 
 
+def scan_entries(entries, date=None, history=False):
+    """Gather the information needed to build price jobs, in a single pass.
+
+    This computes the same results as the individual functions referenced in
+    LedgerScan, each of which would walk the entries again.
+
+    Args:
+      entries: A sorted list of directives.
+      date: A datetime.date instance. Only the directives strictly before it are
+        considered, except for the currencies held at cost, the Commodity
+        directives and the lifetimes, which consider all of them.
+      history: A boolean, true to also compute the lifetimes of the commodities
+        and the dates of the latest prices.
+    Returns:
+      A LedgerScan instance.
+    """
+    declared: List[Tuple[str, str, List[PriceSource]]] = []
+    commodities: Dict[str, data.Commodity] = {}
+    at_cost: Set[Tuple[str, str]] = set()
+    converted: Set[Tuple[str, str]] = set()
+    priced: Set[Tuple[str, str]] = set()
+    balance_currencies: Optional[Set[Tuple[str, str]]] = None
+    latest_dates: Dict[Tuple[str, str], datetime.date] = {}
+
+    # The balances of all the accounts, the lifetimes of the commodities, and
+    # the set of commodities currently held, as in get_commodity_lifetimes().
+    balances: Dict[str, inventory.Inventory] = collections.defaultdict(
+        inventory.Inventory
+    )
+    lifetimes_map: Dict[Tuple[str, str], List[Tuple]] = collections.defaultdict(list)
+    held: Set[Tuple[str, str]] = set()
+
+    for entry in entries:
+        before = not date or entry.date < date
+        if not before and balance_currencies is None:
+            balance_currencies = _get_balance_currencies(balances, converted | priced)
+
+        if isinstance(entry, data.Transaction):
+            changed = False
+            for posting in entry.postings:
+                if posting.cost is not None:
+                    if posting.cost.number is not None:
+                        at_cost.add((posting.units.currency, posting.cost.currency))
+                elif before and posting.price is not None:
+                    converted.add((posting.units.currency, posting.price.currency))
+
+                # Past the date, the balances are only needed for the lifetimes.
+                if not (before or history):
+                    continue
+                balance = balances[posting.account]
+                if history:
+                    pairs_before = balance.currency_pairs()
+                    balance.add_position(posting)
+                    changed |= balance.currency_pairs() != pairs_before
+                else:
+                    balance.add_position(posting)
+
+            # Only recompute the global set of commodities held when the
+            # commodities of one of the affected accounts changed.
+            if changed:
+                new_held = set(
+                    itertools.chain(*(inv.currency_pairs() for inv in balances.values()))
+                )
+                for base_quote in new_held - held:
+                    lifetimes_map[base_quote].append((entry.date, None))
+                for base_quote in held - new_held:
+                    begin_date, _ = lifetimes_map[base_quote].pop(-1)
+                    lifetimes_map[base_quote].append(
+                        (begin_date, entry.date + datetime.timedelta(days=1))
+                    )
+                held = new_held
+
+        elif isinstance(entry, data.Price):
+            if history:
+                _update_latest_dates(latest_dates, entry)
+            if before:
+                priced.add((entry.currency, entry.amount.currency))
+
+        elif isinstance(entry, data.Commodity):
+            commodities[entry.currency] = entry
+            if before:
+                declared.extend(_get_declared(entry))
+
+    if balance_currencies is None:
+        balance_currencies = _get_balance_currencies(balances, converted | priced)
+
+    return LedgerScan(
+        declared,
+        commodities,
+        at_cost,
+        converted,
+        priced,
+        balance_currencies,
+        lifetimes_map if history else None,
+        latest_dates if history else None,
+    )
+
+
 def log_currency_list(message, currencies):
     """Log a list of currencies to debug output.
 
@@ -268,6 +698,35 @@ def log_currency_list(message, currencies):
         logging.debug("  {:>32}".format("{} /{}".format(base, quote)))
 
 
+def _get_primary_currencies(scan, currency_map, undeclared_source):
+    """Compute the initial set of currencies to consider for the price jobs.
+
+    Args:
+      scan: A LedgerScan instance.
+      currency_map: A dict of the declared (base, quote) currencies to their
+        list of PriceSource.
+      undeclared_source: A string, the name of the default source module, or
+        None to only consider the declared currencies.
+    Returns:
+      A pair of the set of (base, quote) currencies, and the default source
+      module or None.
+    """
+    if undeclared_source:
+        # Use the full set of possible currencies.
+        currencies = scan.at_cost | scan.converted | scan.priced
+        log_currency_list("Currency held at cost", scan.at_cost)
+        log_currency_list("Currency converted", scan.converted)
+        log_currency_list("Currency priced", scan.priced)
+        default_source = import_source(undeclared_source)
+    else:
+        # Use the currencies from the Commodity directives.
+        currencies = set(currency_map.keys())
+        default_source = None
+
+    log_currency_list("Currencies in primary list", currencies)
+    return currencies, default_source
+
+
 def get_price_jobs_at_date(
     entries: data.Entries,
     date: Optional[datetime.date] = None,
@@ -290,34 +749,21 @@ def get_price_jobs_at_date(
       A list of DatedPrice instances.
 
     """
+    # Gather everything needed from the entries in a single pass.
+    scan = scan_entries(entries, date)
+
     # Find the list of declared currencies, and from it build a mapping for
     # tickers for each (base, quote) pair. This is the only place tickers
     # appear.
-    declared_triples = find_currencies_declared(entries, date)
-    currency_map = {(base, quote): psources for base, quote, psources in declared_triples}
-
-    # Compute the initial list of currencies to consider.
-    if undeclared_source:
-        # Use the full set of possible currencies.
-        cur_at_cost = find_prices.find_currencies_at_cost(entries)
-        cur_converted = find_prices.find_currencies_converted(entries, date)
-        cur_priced = find_prices.find_currencies_priced(entries, date)
-        currencies = cur_at_cost | cur_converted | cur_priced
-        log_currency_list("Currency held at cost", cur_at_cost)
-        log_currency_list("Currency converted", cur_converted)
-        log_currency_list("Currency priced", cur_priced)
-        default_source = import_source(undeclared_source)
-    else:
-        # Use the currencies from the Commodity directives.
-        currencies = set(currency_map.keys())
-        default_source = None
-
-    log_currency_list("Currencies in primary list", currencies)
+    currency_map = {(base, quote): psources for base, quote, psources in scan.declared}
+    currencies, default_source = _get_primary_currencies(
+        scan, currency_map, undeclared_source
+    )
 
     # By default, restrict to only the currencies with non-zero balances at the
     # given date.
     if not inactive:
-        balance_currencies = find_prices.find_balance_currencies(entries, date)
+        balance_currencies = scan.balance_currencies
         log_currency_list("Currencies held in assets", balance_currencies)
         currencies = currencies & balance_currencies
 
@@ -337,10 +783,6 @@ def get_price_jobs_at_date(
     return sorted(jobs)
 
 
-# TODO(blais): This could be modified to use the get_daily_prices() interface,
-# or perhaps to extend it to intervals, and let the price source decide for
-# itself how to implement fetching (e.g., use a single call + filter, or use
-# multiple calls). Querying independently for each day is not the best strategy.
 def get_price_jobs_up_to_date(
     entries,
     date_last=None,
@@ -364,38 +806,47 @@ def get_price_jobs_up_to_date(
     Returns:
       A list of DatedPrice instances.
     """
-    price_map = prices.build_price_map(entries)
+    # Gather everything needed from the entries in a single pass.
+    scan = scan_entries(entries, date_last, history=True)
+    return get_price_jobs_from_scan(
+        scan, date_last, inactive, undeclared_source, update_rate, compress_days
+    )
+
+
+def get_price_jobs_from_scan(
+    scan,
+    date_last=None,
+    inactive=False,
+    undeclared_source=None,
+    update_rate="weekday",
+    compress_days=1,
+):
+    """Get a list of trailing prices to fetch from the scan of a ledger.
+
+    See get_price_jobs_up_to_date(). The lifetimes of the scan are modified.
 
+    Args:
+      scan: A LedgerScan instance, with the history of the entries up to date_last.
+      date_last: The date up to where to find prices to as an exclusive range end.
+      inactive: Include currencies with no balance at the given date.
+      undeclared_source: A string, the name of the default source module, or None.
+    Returns:
+      A list of DatedPrice instances.
+    """
     # Find the list of declared currencies, and from it build a mapping for
     # tickers for each (base, quote) pair. This is the only place tickers
     # appear.
-    declared_triples = find_currencies_declared(entries, date_last)
-    currency_map = {(base, quote): psources for base, quote, psources in declared_triples}
-
-    # Compute the initial list of currencies to consider.
-    if undeclared_source:
-        # Use the full set of possible currencies.
-        cur_at_cost = find_prices.find_currencies_at_cost(entries)
-        cur_converted = find_prices.find_currencies_converted(entries, date_last)
-        cur_priced = find_prices.find_currencies_priced(entries, date_last)
-        currencies = cur_at_cost | cur_converted | cur_priced
-        log_currency_list("Currency held at cost", cur_at_cost)
-        log_currency_list("Currency converted", cur_converted)
-        log_currency_list("Currency priced", cur_priced)
-        default_source = import_source(undeclared_source)
-    else:
-        # Use the currencies from the Commodity directives.
-        currencies = set(currency_map.keys())
-        default_source = None
-
-    log_currency_list("Currencies in primary list", currencies)
+    currency_map = {(base, quote): psources for base, quote, psources in scan.declared}
+    currencies, default_source = _get_primary_currencies(
+        scan, currency_map, undeclared_source
+    )
 
     # By default, restrict to only the currencies with non-zero balances
     # up to the given date.
     # Also, find the earliest start date to fetch prices from.
     # Look at both latest prices and start dates.
-    lifetimes_map = lifetimes.get_commodity_lifetimes(entries)
-    commodity_map = getters.get_commodity_directives(entries)
+    lifetimes_map = scan.lifetimes
+    commodity_map = scan.commodities
 
     if inactive:
         for base_quote in currencies:
@@ -415,11 +866,10 @@ def get_price_jobs_up_to_date(
     # Trim lifetimes based on latest price dates.
     for base_quote in lifetimes_map:
         intervals = lifetimes_map[base_quote]
-        result = prices.get_latest_price(price_map, base_quote)
-        if result is None or result[0] is None:
+        latest_price_date = scan.latest_dates.get(base_quote, None)
+        if latest_price_date is None:
             lifetimes_map[base_quote] = lifetimes.trim_intervals(intervals, None, date_last)
         else:
-            latest_price_date = result[0]
             date_first = latest_price_date + datetime.timedelta(days=1)
             if date_first < date_last:
                 lifetimes_map[base_quote] = lifetimes.trim_intervals(
@@ -463,11 +913,448 @@ def get_price_jobs_up_to_date(
     return sorted(jobs)
 
 
+def get_module_capabilities(module) -> beanprice.source.Capabilities:
+    """Return the capabilities of the Source class of a source module.
+
+    Args:
+      module: A Python module object, which may lack a Source class.
+    Returns:
+      A Capabilities instance.
+    """
+    return beanprice.source.get_capabilities(getattr(module, "Source", None))
+
+
+def merge_price_jobs(
+    jobs: List[DatedPrice], max_gap: int = DEFAULT_MAX_RANGE_GAP
+) -> List[Union[DatedPrice, DatedPriceRange]]:
+    """Merge dated jobs for the same pair and sources into range jobs.
+
+    Jobs for consecutive dates of the same (base, quote, sources) are grouped
+    together so that they may be fetched with a single call to sources which
+    support fetching a series of prices. Jobs for the latest price, for isolated
+    dates, and whose sources cannot fetch series are returned unmodified, so
+    that they are fetched independently.
+
+    Args:
+      jobs: A list of DatedPrice instances.
+      max_gap: An integer, the maximum number of days between two dates for
+        them to be merged in the same range.
+    Returns:
+      A list of DatedPrice and DatedPriceRange instances.
+    """
+    merged: List[Union[DatedPrice, DatedPriceRange]] = []
+    groups: Dict[Tuple, List[datetime.date]] = collections.defaultdict(list)
+    for dprice in jobs:
+        if dprice.date is None or not any(
+            get_module_capabilities(psource.module).series for psource in dprice.sources
+        ):
+            merged.append(dprice)
+        else:
+            key = (dprice.base, dprice.quote, tuple(dprice.sources))
+            groups[key].append(dprice.date)
+
+    for (base, quote, psources), dates in groups.items():
+        dates = sorted(set(dates))
+        runs = [[dates[0]]]
+        for date in dates[1:]:
+            if (date - runs[-1][-1]).days > max_gap:
+                runs.append([])
+            runs[-1].append(date)
+        for run in runs:
+            if len(run) == 1:
+                merged.append(DatedPrice(base, quote, run[0], list(psources)))
+            else:
+                merged.append(DatedPriceRange(base, quote, run, list(psources)))
+    return merged
+
+
+def batch_price_jobs(
+    jobs: List[Union[DatedPrice, DatedPriceRange]],
+) -> List[Union[DatedPrice, DatedPriceRange, PriceBatch]]:
+    """Group the jobs for the latest price by the module of their first source.
+
+    Only the modules whose source implements get_latest_prices() are grouped
+    together; all other jobs are returned unmodified.
+
+    Args:
+      jobs: A list of DatedPrice and DatedPriceRange instances.
+    Returns:
+      A list of DatedPrice, DatedPriceRange and PriceBatch instances.
+    """
+    batched: List[Union[DatedPrice, DatedPriceRange, PriceBatch]] = []
+    groups: Dict[str, PriceBatch] = {}
+    for job in jobs:
+        if isinstance(job, DatedPrice) and job.date is None and job.sources:
+            module = job.sources[0].module
+            if get_module_capabilities(module).batch:
+                if module.__name__ not in groups:
+                    groups[module.__name__] = PriceBatch(module, [])
+                groups[module.__name__].jobs.append(job)
+                continue
+        batched.append(job)
+
+    for batch in groups.values():
+        if len(batch.jobs) == 1:
+            batched.append(batch.jobs[0])
+        else:
+            batched.append(batch)
+    return batched
+
+
 def now():
     "Indirection in order to be able to mock it out in the tests."
     return datetime.datetime.now(datetime.timezone.utc)
 
 
+def get_query_time(date: datetime.date) -> datetime.datetime:
+    """Compute the timestamp at which we query for prices on a given date.
+
+    Args:
+      date: A datetime.date instance.
+    Returns:
+      A timezone-aware datetime.datetime instance, in UTC.
+    """
+    # We query as for 4pm for the given date of the current timezone, if
+    # specified.
+    query_time = datetime.time(16, 0, 0)
+    time_local = datetime.datetime.combine(date, query_time, tzinfo=tz.tzlocal())
+    return time_local.astimezone(tz.tzutc())
+
+
+def _get_cache_key(module_name: str, symbol: str, date: Optional[datetime.date]) -> str:
+    """Compute the cache key for a price."""
+    md5 = hashlib.md5()
+    md5.update(str((module_name, symbol, date)).encode("utf-8"))
+    return md5.hexdigest()
+
+
+def get_expiration(
+    date: Optional[datetime.date],
+    time_fetched: datetime.datetime,
+    market_tz: Optional[datetime.tzinfo] = None,
+) -> Optional[datetime.timedelta]:
+    """Compute how long a price remains valid in the cache.
+
+    Latest prices are intraday quotes and expire quickly. The price at a date is
+    final once the trading day is over in the market's timezone, plus a delay
+    for late corrections; it then never expires. Until then, it expires quickly
+    while the market may still be open, and after a medium time otherwise.
+
+    Args:
+      date: A datetime.date instance, or None for the latest price.
+      time_fetched: A timezone-aware datetime, the time the price was fetched at.
+      market_tz: A tzinfo, the timezone of the market of the price, if known.
+        Defaults to the local timezone.
+    Returns:
+      A timedelta instance, or None if the price never expires.
+    """
+    if date is None:
+        return DEFAULT_EXPIRATION
+    end_of_day = datetime.datetime.combine(
+        date + datetime.timedelta(days=1), datetime.time(), market_tz or tz.tzlocal()
+    )
+    if time_fetched >= end_of_day + SETTLEMENT_DELAY:
+        return None
+    if time_fetched < get_query_time(date):
+        return DEFAULT_EXPIRATION
+    return RECENT_EXPIRATION
+
+
+def _cache_get(key):
+    """Read a price from the cache.
+
+    Args:
+      key: A string, the cache key.
+    Returns:
+      A SourcePrice instance with a timezone-aware time.
+    Raises:
+      KeyError: If the price is not in the cache or has expired.
+    """
+    timestamp_created, result_naive, *timestamp_expires = _CACHE[key]
+
+    # Convert naive timezone to UTC, which is what the cache is always
+    # assumed to store. (The reason for this is that timezones from
+    # aware datetime objects cannot be serialized properly due to bug.)
+    if result_naive.time is not None:
+        result = result_naive._replace(time=result_naive.time.replace(tzinfo=tz.tzutc()))
+    else:
+        result = result_naive
+
+    # Entries from older versions don't have an expiration time.
+    if not timestamp_expires:
+        timestamp_expires = [timestamp_created + _CACHE.expiration.total_seconds()]
+    if timestamp_expires[0] is not None and int(now().timestamp()) > timestamp_expires[0]:
+        raise KeyError
+    return result
+
+
+def _cache_set(key, result, date=None):
+    """Store a price in the cache.
+
+    Args:
+      key: A string, the cache key.
+      result: A SourcePrice instance, or None, in which case nothing is stored.
+      date: A datetime.date instance, the date the price was fetched for, or
+        None for the latest price. This determines when the price expires.
+    """
+    # Make sure the timezone is UTC and make naive before serialization.
+    if result and result.time is not None:
+        time_utc = result.time.astimezone(tz.tzutc())
+        time_naive = time_utc.replace(tzinfo=None)
+        result_naive = result._replace(time=time_naive)
+    else:
+        result_naive = result
+
+    if result_naive is not None:
+        time_now = now()
+        market_tz = result.time.tzinfo if result.time is not None else None
+        expiration = get_expiration(date, time_now, market_tz)
+        timestamp_expires = (
+            int((time_now + expiration).timestamp()) if expiration is not None else None
+        )
+        _CACHE[key] = (int(time_now.timestamp()), result_naive, timestamp_expires)
+
+
+def _get_negative_key(
+    module_name: str, symbol: str, date: Optional[datetime.date]
+) -> str:
+    """Compute the cache key for a failure to fetch a price."""
+    md5 = hashlib.md5()
+    md5.update(str((module_name, symbol, date, "negative")).encode("utf-8"))
+    return md5.hexdigest()
+
+
+def _is_suppressed(module_name, symbol, date):
+    """Return true if fetching a price failed recently and should not be retried.
+
+    Args:
+      module_name: A string, the name of the source module.
+      symbol: A string, the ticker.
+      date: A datetime.date instance, or None for the latest price.
+    Returns:
+      A boolean.
+    """
+    timestamp_expires = _CACHE.get(_get_negative_key(module_name, symbol, date))
+    if timestamp_expires is None or timestamp_expires <= int(now().timestamp()):
+        return False
+    logging.info("Skipping: %s (date: %s), which failed recently", symbol, date)
+    _SUPPRESSED.add((module_name, symbol))
+    return True
+
+
+def _record_result(module_name, symbol, date, result):
+    """Record the outcome of fetching a price, for backing off on failures.
+
+    A failure is cached for a time which doubles with each consecutive failure
+    of the symbol from the source. A success resets the count of failures.
+
+    Args:
+      module_name: A string, the name of the source module.
+      symbol: A string, the ticker.
+      date: A datetime.date instance, or None for the latest price.
+      result: A SourcePrice instance, or None if fetching it failed.
+    """
+    if result is not None:
+        with _CACHE.transact():
+            failures = _CACHE.get(_FAILURES_KEY, {})
+            if failures.pop((module_name, symbol), None) is not None:
+                _CACHE[_FAILURES_KEY] = failures
+        return
+
+    if not _CACHE.negative_expiration:
+        return
+    with _CACHE.transact():
+        failures = _CACHE.get(_FAILURES_KEY, {})
+        count = failures.get((module_name, symbol), (0, 0))[0] + 1
+        expiration = min(
+            _CACHE.negative_expiration * 2 ** min(count - 1, 16), MAX_NEGATIVE_EXPIRATION
+        )
+        timestamp_expires = int((now() + expiration).timestamp())
+        failures[(module_name, symbol)] = (count, timestamp_expires)
+        _CACHE[_FAILURES_KEY] = failures
+        _CACHE[_get_negative_key(module_name, symbol, date)] = timestamp_expires
+
+
+def get_failures() -> Dict[Tuple[str, str], Tuple[int, datetime.datetime]]:
+    """Return the symbols which recently failed to fetch.
+
+    Returns:
+      A dict of (module name, symbol) to a pair of the number of consecutive
+      failures and the time until which the last failure is cached.
+    """
+    if _CACHE is None:
+        return {}
+    return {
+        key: (count, datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc))
+        for key, (count, timestamp) in _CACHE.get(_FAILURES_KEY, {}).items()
+    }
+
+
+def _get_series_key(module_name: str, symbol: str) -> str:
+    """Compute the cache key for a series of prices."""
+    md5 = hashlib.md5()
+    md5.update(str((module_name, symbol, "series")).encode("utf-8"))
+    return md5.hexdigest()
+
+
+def _merge_coverage(coverage):
+    """Merge the overlapping intervals of a coverage list.
+
+    Args:
+      coverage: A list of (begin, end, timestamp) tuples, where timestamp is the
+        time at which the series fetched over the [begin, end] interval expires,
+        or None if it never does.
+    Returns:
+      A sorted list of disjoint intervals. Only intervals which both expire or
+      both never do are merged; merged intervals keep the earliest expiration.
+    """
+    merged = []
+    for begin, end, timestamp in sorted(coverage, key=lambda interval: interval[:2]):
+        if merged and begin <= merged[-1][1]:
+            last_begin, last_end, last_timestamp = merged[-1]
+            if (timestamp is None) == (last_timestamp is None):
+                merged[-1] = (
+                    last_begin,
+                    max(last_end, end),
+                    None if timestamp is None else min(last_timestamp, timestamp),
+                )
+                continue
+            if end <= last_end:
+                continue
+            begin = last_end
+        merged.append((begin, end, timestamp))
+    return merged
+
+
+def _subtract_coverage(needed, coverage):
+    """Compute the parts of the needed intervals which are not covered.
+
+    Args:
+      needed: A sorted list of disjoint coverage intervals.
+      coverage: A sorted list of disjoint coverage intervals.
+    Returns:
+      A sorted list of (begin, end) intervals.
+    """
+    gaps = []
+    for begin, end, _ in needed:
+        for cov_begin, cov_end, _ in coverage:
+            if cov_end < begin or cov_begin > end:
+                continue
+            if cov_begin > begin:
+                gaps.append((begin, cov_begin))
+            begin = max(begin, cov_end)
+        if begin < end:
+            gaps.append((begin, end))
+    return gaps
+
+
+def _find_coverage(coverage, begins, time):
+    """Find the interval of a coverage list which contains a given time.
+
+    Args:
+      coverage: A sorted list of disjoint (begin, end, timestamp) intervals.
+      begins: A list of the beginnings of the intervals, to bisect on.
+      time: A timezone-aware datetime instance.
+    Returns:
+      A (begin, end) pair, the span of the contiguous intervals containing the
+      time, or None.
+    """
+    index = bisect.bisect_right(begins, time) - 1
+    if index < 0 or coverage[index][1] < time:
+        return None
+    end = coverage[index][1]
+    while index > 0 and coverage[index - 1][1] >= coverage[index][0]:
+        index -= 1
+    return coverage[index][0], end
+
+
+# A series of prices of a symbol, along with the intervals it is known over.
+#
+#   points: A sorted list of SourcePrice instances.
+#   coverage: A sorted list of disjoint intervals the points were fetched over,
+#     as (begin, end, timestamp) tuples; see _merge_coverage().
+#   times: A list of the times of the points, to bisect on.
+#   begins: A list of the beginnings of the coverage intervals, to bisect on.
+class PriceSeries(NamedTuple):
+    points: List[beanprice.source.SourcePrice]
+    coverage: List[Tuple]
+    times: List[datetime.datetime]
+    begins: List[datetime.datetime]
+
+
+def _make_series(points, coverage) -> PriceSeries:
+    """Make a series from its sorted points and coverage, indexing them."""
+    return PriceSeries(
+        points,
+        coverage,
+        [point.time for point in points],
+        [begin for begin, _, _ in coverage],
+    )
+
+
+def _find_series_price(series, time):
+    """Find the price of a series at a given time.
+
+    Args:
+      series: A PriceSeries instance.
+      time: A timezone-aware datetime instance.
+    Returns:
+      The latest SourcePrice at or before the given time, or None if there is
+      none or if the series is not known over the interval in between.
+    """
+    interval = _find_coverage(series.coverage, series.begins, time)
+    if interval is None:
+        return None
+    index = bisect.bisect_right(series.times, time) - 1
+    if index < 0 or series.times[index] < interval[0]:
+        return None
+    return series.points[index]
+
+
+def _series_cache_get(key):
+    """Read a series of prices from the cache.
+
+    Args:
+      key: A string, the cache key.
+    Returns:
+      A PriceSeries instance, with timezone-aware times. Expired intervals and
+      their prices are left out.
+    """
+    points_naive, coverage_naive = _CACHE.get(key, ([], []))
+    timestamp_now = int(now().timestamp())
+    coverage = [
+        (begin.replace(tzinfo=tz.tzutc()), end.replace(tzinfo=tz.tzutc()), timestamp)
+        for begin, end, timestamp in coverage_naive
+        if timestamp is None or timestamp >= timestamp_now
+    ]
+    begins = [begin for begin, _, _ in coverage]
+    points = [
+        point._replace(time=point.time.replace(tzinfo=tz.tzutc()))
+        for point in points_naive
+    ]
+    points = [point for point in points if _find_coverage(coverage, begins, point.time)]
+    return _make_series(points, coverage)
+
+
+def _series_cache_set(key, points, coverage):
+    """Store a series of prices in the cache.
+
+    Args:
+      key: A string, the cache key.
+      points: A sorted list of SourcePrice instances with timezone-aware times.
+      coverage: A sorted list of disjoint intervals the prices were fetched over.
+    """
+    # Make sure the timezone is UTC and make naive before serialization.
+    def naive(time):
+        return time.astimezone(tz.tzutc()).replace(tzinfo=None)
+
+    points_naive = [point._replace(time=naive(point.time)) for point in points]
+    coverage_naive = [
+        (naive(begin), naive(end), timestamp) for begin, end, timestamp in coverage
+    ]
+    _CACHE[key] = (points_naive, coverage_naive)
+
+
 def fetch_cached_price(source, symbol, date):
     """Call Source to fetch a price, but look and/or update the cache first.
 
@@ -483,77 +1370,322 @@ def fetch_cached_price(source, symbol, date):
       A SourcePrice instance.
     """
     # Compute a suitable timestamp from the date, if specified.
-    if date is not None:
-        # We query as for 4pm for the given date of the current timezone, if
-        # specified.
-        query_time = datetime.time(16, 0, 0)
-        time_local = datetime.datetime.combine(date, query_time, tzinfo=tz.tzlocal())
-        time = time_local.astimezone(tz.tzutc())
-    else:
-        time = None
+    time = get_query_time(date) if date is not None else None
 
+    limiter = get_rate_limiter(type(source).__module__)
     if _CACHE is None:
         # The cache is disabled; just call and return.
-        result = (
-            source.get_latest_price(symbol)
-            if time is None
-            else source.get_historical_price(symbol, time)
-        )
+        with limiter.acquire():
+            result = (
+                source.get_latest_price(symbol)
+                if time is None
+                else source.get_historical_price(symbol, time)
+            )
 
     else:
         # The cache is enabled and we have to compute the current/latest price.
         # Try to fetch from the cache but miss if the price is too old.
-        md5 = hashlib.md5()
-        md5.update(str((type(source).__module__, symbol, date)).encode("utf-8"))
-        key = md5.hexdigest()
-        timestamp_now = int(now().timestamp())
+        module_name = type(source).__module__
+        key = _get_cache_key(module_name, symbol, date)
         try:
-            timestamp_created, result_naive = _CACHE[key]
-
-            # Convert naive timezone to UTC, which is what the cache is always
-            # assumed to store. (The reason for this is that timezones from
-            # aware datetime objects cannot be serialized properly due to bug.)
-            if result_naive.time is not None:
-                result = result_naive._replace(
-                    time=result_naive.time.replace(tzinfo=tz.tzutc())
-                )
-            else:
-                result = result_naive
-
-            if (timestamp_now - timestamp_created) > _CACHE.expiration.total_seconds():
-                raise KeyError
+            result = _cache_get(key)
         except KeyError:
+            if _is_suppressed(module_name, symbol, date):
+                return None
             logging.info("Fetching: %s (time: %s)", symbol, time)
             try:
-                result = (
-                    source.get_latest_price(symbol)
-                    if time is None
-                    else source.get_historical_price(symbol, time)
-                )
+                with limiter.acquire():
+                    result = (
+                        source.get_latest_price(symbol)
+                        if time is None
+                        else source.get_historical_price(symbol, time)
+                    )
             except ValueError as exc:
                 logging.error("Error fetching %s: %s", symbol, exc)
                 result = None
+            _cache_set(key, result, date)
+            _record_result(module_name, symbol, date, result)
+    return result
+
+
+async def fetch_cached_price_async(source, symbol, date):
+    """Asynchronous version of fetch_cached_price().
+
+    This awaits the source's get_latest_price_async() or
+    get_historical_price_async() coroutines on a cache miss.
+
+    Args:
+      source: A Source instance implementing the asynchronous methods.
+      symbol: A string, the ticker to fetch.
+      date: A datetime.date instance, None if we're to fetch the latest date.
+    Returns:
+      A SourcePrice instance.
+    """
+    time = get_query_time(date) if date is not None else None
+    limiter = get_rate_limiter(type(source).__module__)
+
+    if _CACHE is None:
+        # The cache is disabled; just call and return.
+        await asyncio.sleep(limiter.reserve())
+        return await (
+            source.get_latest_price_async(symbol)
+            if time is None
+            else source.get_historical_price_async(symbol, time)
+        )
+
+    module_name = type(source).__module__
+    key = _get_cache_key(module_name, symbol, date)
+    try:
+        return _cache_get(key)
+    except KeyError:
+        pass
+    if _is_suppressed(module_name, symbol, date):
+        return None
+    logging.info("Fetching: %s (time: %s)", symbol, time)
+    await asyncio.sleep(limiter.reserve())
+    try:
+        result = await (
+            source.get_latest_price_async(symbol)
+            if time is None
+            else source.get_historical_price_async(symbol, time)
+        )
+    except ValueError as exc:
+        logging.error("Error fetching %s: %s", symbol, exc)
+        result = None
+    _cache_set(key, result, date)
+    _record_result(module_name, symbol, date, result)
+    return result
+
+
+def has_async(source_class, date: Optional[datetime.date]) -> bool:
+    """Return true if the source class implements asynchronous fetching.
+
+    Args:
+      source_class: A Source class, or None.
+      date: A datetime.date instance, or None for the latest price.
+    Returns:
+      A boolean, true if the source has a coroutine to fetch a price at that date.
+    """
+    capabilities = beanprice.source.get_capabilities(source_class)
+    if date is None:
+        return capabilities.latest_async
+    return capabilities.historical_async
+
+
+def fetch_cached_latest_prices(
+    source, symbols: List[str]
+) -> Dict[str, beanprice.source.SourcePrice]:
+    """Call Source to fetch many latest prices at once, looking up the cache first.
+
+    Only the symbols which are not already in the cache are requested, with a
+    single call to get_latest_prices().
+
+    Args:
+      source: A Source instance implementing get_latest_prices().
+      symbols: A list of strings, the tickers to fetch.
+    Returns:
+      A dict of symbol to SourcePrice instance, for the symbols which could be
+      fetched.
+    Raises:
+      ValueError: If the batched call failed as a whole.
+    """
+    module_name = type(source).__module__
+    results: Dict[str, beanprice.source.SourcePrice] = {}
+    missing = []
+    for symbol in symbols:
+        if _CACHE is not None:
+            try:
+                results[symbol] = _cache_get(_get_cache_key(module_name, symbol, None))
+                continue
+            except KeyError:
+                pass
+            if _is_suppressed(module_name, symbol, None):
+                continue
+        missing.append(symbol)
+    if not missing:
+        return results
+
+    logging.info("Fetching: %s", ",".join(missing))
+    with get_rate_limiter(module_name).acquire():
+        fetched = source.get_latest_prices(missing)
+    for symbol in missing:
+        result = fetched.get(symbol, None)
+        if result is not None:
+            results[symbol] = result
+        if _CACHE is not None:
+            _cache_set(_get_cache_key(module_name, symbol, None), result)
+            _record_result(module_name, symbol, None, result)
+    return results
+
+
+def fetch_cached_price_series(
+    source, symbol: str, dates: List[datetime.date]
+) -> Dict[datetime.date, Optional[beanprice.source.SourcePrice]]:
+    """Call Source to fetch a series of prices, looking up the cache first.
+
+    The cache holds the series of each symbol along with the intervals it is
+    known over. Only the parts of the interval spanned by the dates which are
+    not covered yet are fetched, with calls to get_prices_series(). The price
+    for each date is the latest price of the series at or before its query
+    time, as for get_historical_price().
+
+    Args:
+      source: A Source instance implementing get_prices_series().
+      symbol: A string, the ticker to fetch.
+      dates: A sorted list of datetime.date instances.
+    Returns:
+      A dict of date to SourcePrice instance, or None if we failed to find a
+      price for that date.
+    """
+    key = _get_series_key(type(source).__module__, symbol)
+    series = _make_series([], [])
+    if _CACHE is not None:
+        series = _series_cache_get(key)
+
+    # Fetch the missing parts of the series, bridging short holes between them
+    # in order to make fewer calls.
+    query_times = [get_query_time(date) for date in dates]
+    needed = _merge_coverage([(time - SERIES_LOOKBACK, time, 0) for time in query_times])
+    gaps: List[Tuple[datetime.datetime, datetime.datetime]] = []
+    for begin, end in _subtract_coverage(needed, series.coverage):
+        if gaps and begin - gaps[-1][1] <= datetime.timedelta(days=DEFAULT_MAX_RANGE_GAP):
+            gaps[-1] = (gaps[-1][0], end)
+        else:
+            gaps.append((begin, end))
+    max_range = beanprice.source.get_capabilities(type(source)).max_range
+    if max_range is not None:
+        gaps = [
+            interval for gap in gaps for interval in _split_interval(*gap, max_range)
+        ]
+
+    # Failures are recorded by the date at the beginning of each gap, which
+    # stays the same from one run to the next while no prices are found.
+    module_name = type(source).__module__
+    new_points: List[beanprice.source.SourcePrice] = []
+    new_coverage: List[Tuple] = []
+    for time_begin, time_end in gaps:
+        date_begin = time_begin.date()
+        if _CACHE is not None and _is_suppressed(module_name, symbol, date_begin):
+            continue
+        logging.info("Fetching: %s (from: %s to: %s)", symbol, time_begin, time_end)
+        try:
+            with get_rate_limiter(module_name).acquire():
+                fetched = source.get_prices_series(symbol, time_begin, time_end)
+        except ValueError as exc:
+            logging.error("Error fetching %s: %s", symbol, exc)
+            fetched = None
+        # A None result is a failed fetch, which tells nothing about the gap.
+        if fetched is not None:
+            new_coverage.extend(_get_series_coverage(time_begin, time_end, now()))
+        gap_points = [
+            srcprice
+            for srcprice in fetched or []
+            if srcprice.time is not None and time_begin <= srcprice.time <= time_end
+        ]
+        if _CACHE is not None:
+            _record_result(
+                module_name, symbol, date_begin, gap_points[-1] if gap_points else None
+            )
+        new_points.extend(gap_points)
+    # The intervals split from the same gap share their bounds.
+    new_points = list({srcprice.time: srcprice for srcprice in new_points}.values())
+
+    if new_coverage:
+        if _CACHE is not None:
+            # Merge with the series as currently stored, which other workers may
+            # have extended in the meantime.
+            with _CACHE.transact():
+                series = _update_series(_series_cache_get(key), new_points, new_coverage)
+                _series_cache_set(key, series.points, series.coverage)
+        else:
+            series = _update_series(series, new_points, new_coverage)
+
+    return {
+        date: _find_series_price(series, time)
+        for date, time in zip(dates, query_times)
+    }
+
+
+def _split_interval(time_begin, time_end, max_range):
+    """Split a time interval in consecutive intervals of a maximum length.
+
+    Args:
+      time_begin: A datetime, the beginning of the interval.
+      time_end: A datetime, the end of the interval.
+      max_range: A timedelta, the maximum length of the intervals.
+    Returns:
+      A list of (begin, end) pairs of datetimes, covering the interval.
+    """
+    intervals = []
+    while time_end - time_begin > max_range:
+        intervals.append((time_begin, time_begin + max_range))
+        time_begin += max_range
+    intervals.append((time_begin, time_end))
+    return intervals
+
+
+def _get_series_coverage(time_begin, time_end, time_fetched):
+    """Compute the coverage intervals of a series fetched over a time interval.
+
+    The part of the series for the trading days which are final, as per
+    get_expiration() in UTC, never expires; the rest expires as recent prices.
+
+    Args:
+      time_begin: A timezone-aware datetime, the beginning of the interval.
+      time_end: A timezone-aware datetime, the end of the interval.
+      time_fetched: A timezone-aware datetime, the time the series was fetched at.
+    Returns:
+      A list of coverage intervals.
+    """
+    settled = datetime.datetime.combine(
+        (time_fetched - SETTLEMENT_DELAY).astimezone(tz.tzutc()).date(),
+        datetime.time(),
+        tz.tzutc(),
+    )
+    coverage = []
+    if time_begin < settled:
+        coverage.append((time_begin, min(time_end, settled), None))
+    if time_end > settled:
+        expiration = DEFAULT_EXPIRATION if time_end > time_fetched else RECENT_EXPIRATION
+        timestamp = int((time_fetched + expiration).timestamp())
+        coverage.append((max(time_begin, settled), time_end, timestamp))
+    return coverage
+
 
-            # Make sure the timezone is UTC and make naive before serialization.
-            if result and result.time is not None:
-                time_utc = result.time.astimezone(tz.tzutc())
-                time_naive = time_utc.replace(tzinfo=None)
-                result_naive = result._replace(time=time_naive)
-            else:
-                result_naive = result
+def _update_series(series, new_points, new_coverage):
+    """Replace the parts of a series with newly fetched prices.
 
-            if result_naive is not None:
-                _CACHE[key] = (timestamp_now, result_naive)
-    return result
+    Args:
+      series: A PriceSeries instance.
+      new_points: A list of SourcePrice instances.
+      new_coverage: A list of intervals the new points were fetched over.
+    Returns:
+      An updated PriceSeries instance.
+    """
+    new_coverage = sorted(new_coverage)
+    new_begins = [begin for begin, _, _ in new_coverage]
+    points = [
+        point
+        for point in series.points
+        if not _find_coverage(new_coverage, new_begins, point.time)
+    ]
+    points = sorted(points + new_points, key=lambda point: point.time)
+    return _make_series(points, _merge_coverage(series.coverage + new_coverage))
 
 
-def setup_cache(cache_filename: Optional[str], clear_cache: bool):
+def setup_cache(
+    cache_filename: Optional[str],
+    clear_cache: bool,
+    negative_expiration: datetime.timedelta = DEFAULT_NEGATIVE_EXPIRATION,
+):
     """Setup the results cache.
 
     Args:
       cache_filename: A string or None, the base filename for the cache. An extension
         may be added to the filename and more than one file may be created.
       clear_cache: A boolean, if true, delete the cache before beginning.
+      negative_expiration: A timedelta, the initial time for which failures to
+        fetch a price are cached. Zero disables caching failures.
     """
     if not cache_filename:
         return
@@ -573,6 +1705,7 @@ def setup_cache(cache_filename: Optional[str], clear_cache: bool):
     global _CACHE
     _CACHE = diskcache.Cache(cache_filename, flag=flag)
     _CACHE.expiration = DEFAULT_EXPIRATION  # type: ignore
+    _CACHE.negative_expiration = negative_expiration  # type: ignore
 
 
 def reset_cache():
@@ -583,6 +1716,194 @@ def reset_cache():
             _CACHE.clear()
         _CACHE.close()
     _CACHE = None
+    _SUPPRESSED.clear()
+
+
+# The state of a ledger needed to plan the jobs updating its prices, saved in the
+# cache so that they can be planned again without loading the ledger.
+#
+#   hashes: A dict of the filenames of the ledger, including the files it
+#     includes, to the MD5 digests of their contents.
+#   date_end: The date of the last directive of the ledger, or None if it has
+#     none. The state only applies to the dates after it.
+#   scan: A LedgerScan instance with the history of the ledger. The modules of
+#     its declared price sources are replaced by their names when saved.
+#   prices: A dict of the prices of the ledger, as returned by index_prices(), to
+#     avoid clobbering them.
+#   dcontext: The DisplayContext of the ledger.
+class LedgerState(NamedTuple):
+    hashes: Dict[str, str]
+    date_end: Optional[datetime.date]
+    scan: LedgerScan
+    prices: Dict[Tuple[datetime.date, str], amount.Amount]
+    dcontext: Any
+
+
+def _get_ledger_state_key(filename: str) -> str:
+    """Compute the cache key for the planning state of a ledger."""
+    md5 = hashlib.md5()
+    md5.update(str((_LEDGER_STATE_PREFIX, path.abspath(filename))).encode("utf-8"))
+    return md5.hexdigest()
+
+
+def _hash_files(filenames: List[str]) -> Optional[Dict[str, str]]:
+    """Compute the digests of the contents of some files.
+
+    Args:
+      filenames: A list of filename strings.
+    Returns:
+      A dict of filename to the MD5 digest of its contents, or None if one of the
+      files cannot be read.
+    """
+    hashes = {}
+    for filename in filenames:
+        md5 = hashlib.md5()
+        try:
+            with open(filename, "rb") as file:
+                md5.update(file.read())
+        except OSError:
+            return None
+        hashes[filename] = md5.hexdigest()
+    return hashes
+
+
+def save_ledger_state(filename, scan, entries, options_map):
+    """Save the planning state of a ledger in the cache.
+
+    Args:
+      filename: A string, the filename of the ledger.
+      scan: A LedgerScan instance with the history of the entries, at a date
+        after all of them.
+      entries: A sorted list of the directives of the ledger.
+      options_map: A dict of the options of the ledger.
+    """
+    if _CACHE is None:
+        return
+    hashes = _hash_files(options_map["include"])
+    if hashes is None:
+        return
+    declared = [
+        (base, quote, _get_module_names(psources))
+        for base, quote, psources in scan.declared
+    ]
+    state = LedgerState(
+        hashes,
+        entries[-1].date if entries else None,
+        scan._replace(declared=declared),
+        index_prices(entries),
+        options_map["dcontext"],
+    )
+    _CACHE.set(_get_ledger_state_key(filename), (_LEDGER_STATE_VERSION, state))
+
+
+def load_ledger_state(filename: str, date: datetime.date) -> Optional[LedgerState]:
+    """Load the planning state of a ledger from the cache.
+
+    Args:
+      filename: A string, the filename of the ledger.
+      date: The date up to which the prices are to be updated.
+    Returns:
+      A LedgerState instance, or None if none was saved, if it does not apply to
+      the date, or if the files of the ledger have changed since.
+    """
+    if _CACHE is None:
+        return None
+    version, state = _CACHE.get(_get_ledger_state_key(filename), (None, None))
+    if version != _LEDGER_STATE_VERSION:
+        return None
+    if state.date_end is not None and state.date_end >= date:
+        return None
+    if _hash_files(list(state.hashes)) != state.hashes:
+        return None
+    try:
+        declared = [
+            (base, quote, _import_modules(psources))
+            for base, quote, psources in state.scan.declared
+        ]
+    except ImportError:
+        return None
+    return state._replace(scan=state.scan._replace(declared=declared))
+
+
+def load_ledger_for_update(filename: str, date: datetime.date):
+    """Load a ledger, or its planning state saved in the cache by a previous load.
+
+    The state is saved when the ledger has no errors and all its directives are
+    before the date, and is used instead of the ledger as long as its files are
+    unchanged.
+
+    Args:
+      filename: A string, the filename of the ledger.
+      date: The date up to which the prices are to be updated.
+    Returns:
+      A triple of a LedgerScan instance with the history of the ledger up to the
+      date, the index of its prices which must not be clobbered, and its
+      DisplayContext.
+    """
+    state = load_ledger_state(filename, date)
+    if state is not None:
+        logging.info('Using the saved state of "%s"', filename)
+        return state.scan, state.prices, state.dcontext
+
+    logging.info('Loading "%s"', filename)
+    entries, errors, options_map = loader.load_file(filename, log_errors=sys.stderr)
+    scan = scan_entries(entries, date, history=True)
+    if not errors and (not entries or entries[-1].date < date):
+        save_ledger_state(filename, scan, entries, options_map)
+    return scan, index_prices(entries), options_map["dcontext"]
+
+
+def resolve_cached_jobs(
+    jobs: List[DatedPrice], swap_inverted: bool = False
+) -> Tuple[List[data.Price], List[DatedPrice]]:
+    """Resolve the jobs whose prices are already in the cache.
+
+    All the jobs are looked up in a single cache transaction, without creating
+    any source. A job is resolved if the price from its first source is cached,
+    either on its own or as part of a series, as this is the price fetch_price()
+    would produce for it.
+
+    Args:
+      jobs: A list of DatedPrice instances.
+      swap_inverted: A boolean, true if we should invert currencies instead of
+        rate for an inverted price source.
+    Returns:
+      A pair of the list of Price entries for the resolved jobs, and the list of
+      the remaining jobs, which need to be fetched.
+    """
+    if _CACHE is None:
+        return [], list(jobs)
+    entries: List[data.Price] = []
+    misses: List[DatedPrice] = []
+    series: Dict[str, Tuple[List[beanprice.source.SourcePrice], List[Tuple]]] = {}
+    with _CACHE.transact():
+        for dprice in jobs:
+            if not dprice.sources:
+                misses.append(dprice)
+                continue
+            psource = dprice.sources[0]
+            module_name = psource.module.__name__
+            key = _get_cache_key(module_name, psource.symbol, dprice.date)
+            try:
+                srcprice = _cache_get(key)
+            except KeyError:
+                srcprice = None
+                capabilities = get_module_capabilities(psource.module)
+                if dprice.date is not None and capabilities.series:
+                    key = _get_series_key(module_name, psource.symbol)
+                    if key not in series:
+                        series[key] = _series_cache_get(key)
+                    srcprice = _find_series_price(series[key], get_query_time(dprice.date))
+            if srcprice is None:
+                # Jobs with a single source which failed recently can't produce
+                # anything; don't bother fetching them.
+                if len(dprice.sources) > 1 or not _is_suppressed(
+                    module_name, psource.symbol, dprice.date
+                ):
+                    misses.append(dprice)
+                continue
+            entries.append(make_price_entry(dprice, psource, srcprice, swap_inverted))
+    return entries, misses
 
 
 def fetch_price(dprice: DatedPrice, swap_inverted: bool = False) -> Optional[data.Price]:
@@ -598,7 +1919,7 @@ def fetch_price(dprice: DatedPrice, swap_inverted: bool = False) -> Optional[dat
     """
     for psource in dprice.sources:
         try:
-            source = psource.module.Source()
+            source = get_source(psource.module)
         except AttributeError:
             continue
         srcprice = fetch_cached_price(source, psource.symbol, dprice.date)
@@ -609,6 +1930,243 @@ def fetch_price(dprice: DatedPrice, swap_inverted: bool = False) -> Optional[dat
             logging.error("Could not fetch for job: %s", dprice)
         return None
 
+    return make_price_entry(dprice, psource, srcprice, swap_inverted)
+
+
+def fetch_price_range(
+    dprange: DatedPriceRange, swap_inverted: bool = False
+) -> List[data.Price]:
+    """Fetch the prices for all the dates of a DatedPriceRange job.
+
+    Sources which implement get_prices_series() are called once for the entire
+    range; other sources are called once per date. Dates for which a source
+    fails to provide a price are tried again with the next source.
+
+    Args:
+      dprange: A DatedPriceRange instance.
+      swap_inverted: A boolean, true if we should invert currencies instead of
+        rate for an inverted price source.
+    Returns:
+      A list of Price entries, one per distinct date fetched.
+    """
+    srcprices: Dict[datetime.date, Tuple[PriceSource, beanprice.source.SourcePrice]] = {}
+    remaining = list(dprange.dates)
+    for psource in dprange.sources:
+        if not remaining:
+            break
+        try:
+            source = get_source(psource.module)
+        except AttributeError:
+            continue
+        if beanprice.source.get_capabilities(type(source)).series:
+            results = fetch_cached_price_series(source, psource.symbol, remaining)
+        else:
+            results = {
+                date: fetch_cached_price(source, psource.symbol, date)
+                for date in remaining
+            }
+        for date in remaining:
+            srcprice = results.get(date)
+            if srcprice is not None:
+                srcprices[date] = (psource, srcprice)
+        remaining = [date for date in remaining if date not in srcprices]
+
+    for date in remaining:
+        logging.error(
+            "Could not fetch for job: %s",
+            DatedPrice(dprange.base, dprange.quote, date, dprange.sources),
+        )
+
+    # Dates on which the market was closed yield the price of an earlier date;
+    # only output each of those once.
+    entries = []
+    seen = set()
+    for date, (psource, srcprice) in sorted(srcprices.items()):
+        dprice = DatedPrice(dprange.base, dprange.quote, date, dprange.sources)
+        entry = make_price_entry(dprice, psource, srcprice, swap_inverted)
+        if (entry.date, entry.currency) not in seen:
+            seen.add((entry.date, entry.currency))
+            entries.append(entry)
+    return entries
+
+
+def fetch_price_batch(batch: PriceBatch, swap_inverted: bool = False) -> List[data.Price]:
+    """Fetch the latest prices for all the jobs of a PriceBatch.
+
+    The first source of all the jobs is called once for all of them. The jobs
+    it fails to provide a price for are then processed individually with their
+    remaining sources. If the batched call fails as a whole, all the jobs are
+    processed individually.
+
+    Args:
+      batch: A PriceBatch instance.
+      swap_inverted: A boolean, true if we should invert currencies instead of
+        rate for an inverted price source.
+    Returns:
+      A list of Price entries.
+    """
+    source = get_source(batch.module)
+    symbols = list(dict.fromkeys(dprice.sources[0].symbol for dprice in batch.jobs))
+    try:
+        srcprices = fetch_cached_latest_prices(source, symbols)
+    except ValueError as exc:
+        logging.error("Error fetching %s: %s", ",".join(symbols), exc)
+        return [
+            entry
+            for entry in (fetch_price(dprice, swap_inverted) for dprice in batch.jobs)
+            if entry is not None
+        ]
+
+    entries: List[data.Price] = []
+    for dprice in batch.jobs:
+        psource = dprice.sources[0]
+        srcprice = srcprices.get(psource.symbol, None)
+        if srcprice is not None:
+            entries.append(make_price_entry(dprice, psource, srcprice, swap_inverted))
+        elif len(dprice.sources) > 1:
+            entry = fetch_price(dprice._replace(sources=dprice.sources[1:]), swap_inverted)
+            if entry is not None:
+                entries.append(entry)
+        else:
+            logging.error("Could not fetch for job: %s", dprice)
+    return entries
+
+
+def fetch_job(
+    job: Union[DatedPrice, DatedPriceRange, PriceBatch], swap_inverted: bool = False
+) -> List[data.Price]:
+    """Fetch the prices for a single job of any kind.
+
+    Args:
+      job: A DatedPrice, DatedPriceRange or PriceBatch instance.
+      swap_inverted: A boolean, true if we should invert currencies instead of
+        rate for an inverted price source.
+    Returns:
+      A list of Price entries.
+    """
+    if isinstance(job, DatedPriceRange):
+        return fetch_price_range(job, swap_inverted)
+    if isinstance(job, PriceBatch):
+        return fetch_price_batch(job, swap_inverted)
+    entry = fetch_price(job, swap_inverted)
+    return [entry] if entry is not None else []
+
+
+async def fetch_price_async(
+    dprice: DatedPrice,
+    swap_inverted: bool,
+    executor: futures.Executor,
+    get_limit: Callable[[str], asyncio.Semaphore],
+) -> Optional[data.Price]:
+    """Asynchronous version of fetch_price().
+
+    Sources implementing the asynchronous protocol are awaited directly; other
+    sources are called in the given executor. Every call to a source is bounded
+    by the concurrency limit of its module.
+
+    Args:
+      dprice: A DatedPrice instances.
+      swap_inverted: A boolean, true if we should invert currencies instead of
+        rate for an inverted price source.
+      executor: An Executor to run synchronous calls in.
+      get_limit: A function returning the Semaphore limiting the number of
+        concurrent calls to a source module, given its name.
+    Returns:
+      A Price entry corresponding to the output of the jobs processed.
+    """
+    loop = asyncio.get_running_loop()
+    for psource in dprice.sources:
+        try:
+            source = await loop.run_in_executor(executor, get_source, psource.module)
+        except AttributeError:
+            continue
+        async with get_limit(psource.module.__name__):
+            if has_async(type(source), dprice.date):
+                srcprice = await fetch_cached_price_async(
+                    source, psource.symbol, dprice.date
+                )
+            else:
+                srcprice = await loop.run_in_executor(
+                    executor, fetch_cached_price, source, psource.symbol, dprice.date
+                )
+        if srcprice is not None:
+            break
+    else:
+        if dprice.sources:
+            logging.error("Could not fetch for job: %s", dprice)
+        return None
+
+    return make_price_entry(dprice, psource, srcprice, swap_inverted)
+
+
+async def fetch_jobs_async(
+    jobs: List[Union[DatedPrice, DatedPriceRange, PriceBatch]],
+    swap_inverted: bool = False,
+    max_workers: int = 1,
+    max_per_source: int = DEFAULT_SOURCE_CONCURRENCY,
+) -> List[data.Price]:
+    """Fetch the prices for all jobs concurrently from an asyncio event loop.
+
+    Jobs for a single date are run as coroutines; synchronous source calls,
+    range and batch jobs are adapted by running them in a bounded thread pool.
+    The number of concurrent calls to each source module is limited, as each
+    of those typically corresponds to a single host.
+
+    Args:
+      jobs: A list of DatedPrice, DatedPriceRange and PriceBatch instances.
+      swap_inverted: A boolean, true if we should invert currencies instead of
+        rate for an inverted price source.
+      max_workers: An integer, the number of threads for synchronous calls.
+      max_per_source: An integer, the maximum number of concurrent calls to
+        any single source module.
+    Returns:
+      A list of Price entries.
+    """
+    loop = asyncio.get_running_loop()
+    limits: Dict[str, asyncio.Semaphore] = {}
+
+    def get_limit(module_name: str) -> asyncio.Semaphore:
+        if module_name not in limits:
+            max_concurrency = get_rate_limiter(module_name).max_concurrency
+            limits[module_name] = asyncio.Semaphore(
+                min(max_concurrency or max_per_source, max_per_source)
+            )
+        return limits[module_name]
+
+    with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+
+        async def fetch(job):
+            if isinstance(job, DatedPrice):
+                entry = await fetch_price_async(job, swap_inverted, executor, get_limit)
+                return [entry] if entry is not None else []
+            module = job.module if isinstance(job, PriceBatch) else job.sources[0].module
+            async with get_limit(module.__name__):
+                return await loop.run_in_executor(executor, fetch_job, job, swap_inverted)
+
+        try:
+            results = await asyncio.gather(*map(fetch, jobs))
+        finally:
+            await aclose_sources()
+    return list(itertools.chain.from_iterable(results))
+
+
+def make_price_entry(
+    dprice: DatedPrice,
+    psource: PriceSource,
+    srcprice: beanprice.source.SourcePrice,
+    swap_inverted: bool = False,
+) -> data.Price:
+    """Create a Price directive from a price fetched for a job.
+
+    Args:
+      dprice: A DatedPrice instance, the job the price was fetched for.
+      psource: The PriceSource instance the price was fetched from.
+      srcprice: A SourcePrice instance, the fetched price.
+      swap_inverted: A boolean, true if we should invert currencies instead of
+        rate for an inverted price source.
+    Returns:
+      A Price entry.
+    """
     base = dprice.base
     quote = dprice.quote or srcprice.quote_currency
     price = srcprice.price
@@ -631,13 +2189,46 @@ def fetch_price(dprice: DatedPrice, swap_inverted: bool = False) -> Optional[dat
     # discussion at
     # https://groups.google.com/d/msg/beancount/9j1E_HLEMBQ/fYRuCQK_BwAJ
     srctime = srcprice.time
-    if srctime.tzinfo is None:
+    if srctime is None or srctime.tzinfo is None:
         raise ValueError("Time returned by the price source is not timezone aware.")
     date = srctime.astimezone(tz.tzlocal()).date()
 
     return data.Price(fileloc, date, base, amount.Amount(price, quote or UNKNOWN_CURRENCY))
 
 
+def unique_price_entries(price_entries: List[data.Price]) -> List[data.Price]:
+    """Remove the duplicate prices of a currency in the same quote currency at a date.
+
+    Args:
+      price_entries: A list of Price directives.
+    Returns:
+      A list of Price directives, with the last of each set of duplicates.
+    """
+    return list(
+        {
+            (entry.date, entry.currency, entry.amount.currency): entry
+            for entry in price_entries
+        }.values()
+    )
+
+
+def index_prices(
+    entries: Sequence[data.Directive],
+) -> Dict[Tuple[datetime.date, str], amount.Amount]:
+    """Index the Price directives among some entries.
+
+    Args:
+      entries: A list of directives, in any order.
+    Returns:
+      A dict of the (date, currency) of the Price directives to their amount.
+    """
+    return {
+        (entry.date, entry.currency): entry.amount
+        for entry in entries
+        if isinstance(entry, data.Price)
+    }
+
+
 def filter_redundant_prices(
     price_entries: List[data.Price], existing_entries: List[data.Price], diffs: bool = False
 ) -> Tuple[List[data.Price], List[data.Price]]:
@@ -655,22 +2246,36 @@ def filter_redundant_prices(
     Returns:
       A filtered list of remaining entries, and a list of ignored entries.
     """
+    return filter_indexed_prices(price_entries, index_prices(existing_entries), diffs)
+
+
+def filter_indexed_prices(
+    price_entries: List[data.Price],
+    existing_prices: Dict[Tuple[datetime.date, str], amount.Amount],
+    diffs: bool = False,
+) -> Tuple[List[data.Price], List[data.Price]]:
+    """Filter out new entries that are redundant from an index of existing prices.
+
+    See filter_redundant_prices().
+
+    Args:
+      price_entries: A list of newly created, proposed to be added Price directives.
+      existing_prices: A dict of existing prices, as returned by index_prices().
+      diffs: A boolean, true if we should output differing price entries
+        at the same date.
+    Returns:
+      A filtered list of remaining entries, and a list of ignored entries.
+    """
     # Note: We have to be careful with the dates, because requesting the latest
     # price for a date may yield the price at a previous date. Clobber needs to
     # take this into account. See {1cfa25e37fc1}.
-    existing_prices = {
-        (entry.date, entry.currency): entry
-        for entry in existing_entries
-        if isinstance(entry, data.Price)
-    }
     filtered_prices: List[data.Price] = []
     ignored_prices: List[data.Price] = []
     for entry in price_entries:
         key = (entry.date, entry.currency)
         if key in existing_prices:
             if diffs:
-                existing_entry = existing_prices[key]
-                if existing_entry.amount == entry.amount:
+                if existing_prices[key] == entry.amount:
                     output = ignored_prices
             else:
                 output = ignored_prices
@@ -680,10 +2285,109 @@ def filter_redundant_prices(
     return filtered_prices, ignored_prices
 
 
+def plan_ledger_jobs(filename, args, date):
+    """Load a ledger and get the list of price jobs for it.
+
+    Only the data needed by the driver is returned, so that little is sent back
+    from the worker processes loading several ledgers in parallel.
+
+    Args:
+      filename: A string, the filename of the ledger.
+      args: The parsed command-line arguments.
+      date: The date up to which to update the prices with --update, or else the
+        date at which to fetch them, or None for the latest prices.
+    Returns:
+      A triple of the list of DatedPrice jobs, the index of the prices of the
+      ledger, and its DisplayContext.
+    """
+    if args.update:
+        scan, existing_prices, dcontext = load_ledger_for_update(filename, date)
+        jobs = get_price_jobs_from_scan(
+            scan,
+            date,
+            args.inactive,
+            args.undeclared,
+            args.update_rate,
+            args.update_compress,
+        )
+    else:
+        logging.info('Loading "%s"', filename)
+        entries, _, options_map = loader.load_file(filename, log_errors=sys.stderr)
+        dcontext = options_map["dcontext"]
+        jobs = get_price_jobs_at_date(entries, date, args.inactive, args.undeclared)
+        existing_prices = index_prices(entries)
+    return jobs, existing_prices, dcontext
+
+
+def _plan_ledger_jobs_remotely(filename, args, date):
+    """Run plan_ledger_jobs() in a worker process.
+
+    The modules of the sources of the jobs are replaced by their names, in
+    order to send them back; see _get_module_names().
+    """
+    jobs, existing_prices, dcontext = plan_ledger_jobs(filename, args, date)
+    return (
+        [job._replace(sources=_get_module_names(job.sources)) for job in jobs],
+        existing_prices,
+        dcontext,
+    )
+
+
+def plan_ledgers_jobs(
+    filenames: List[str], args: argparse.Namespace, date: Optional[datetime.date]
+) -> Tuple[List[DatedPrice], Dict[Tuple[datetime.date, str], amount.Amount], Any]:
+    """Load ledgers and get the list of price jobs for them.
+
+    Several ledgers are loaded in parallel in a pool of processes.
+
+    Args:
+      filenames: A list of the filenames of the ledgers.
+      args: The parsed command-line arguments.
+      date: See plan_ledger_jobs().
+    Returns:
+      A triple of the list of DatedPrice jobs, the index of the prices of the
+      ledgers, and the DisplayContext of the first one, or None.
+    """
+    # A single ledger is planned in this process, sparing the startup of the
+    # pool and the round trip of the results.
+    if len(filenames) > 1:
+        with futures.ProcessPoolExecutor(
+            max_workers=min(len(filenames), os.cpu_count() or 1),
+            initializer=setup_cache,
+            initargs=(args.cache_filename, False),
+        ) as executor:
+            results = [
+                (
+                    [
+                        job._replace(sources=_import_modules(job.sources))
+                        for job in ledger_jobs
+                    ],
+                    ledger_prices,
+                    ledger_dcontext,
+                )
+                for ledger_jobs, ledger_prices, ledger_dcontext in executor.map(
+                    functools.partial(_plan_ledger_jobs_remotely, args=args, date=date),
+                    filenames,
+                )
+            ]
+    else:
+        results = [plan_ledger_jobs(filename, args, date) for filename in filenames]
+
+    jobs: List[DatedPrice] = []
+    existing_prices: Dict[Tuple[datetime.date, str], amount.Amount] = {}
+    dcontext = None
+    for ledger_jobs, ledger_prices, ledger_dcontext in results:
+        jobs.extend(ledger_jobs)
+        existing_prices.update(ledger_prices)
+        if dcontext is None:
+            dcontext = ledger_dcontext
+    return jobs, existing_prices, dcontext
+
+
 def process_args() -> Tuple[
     argparse.Namespace,
     List[DatedPrice],
-    data.Directives,
+    Dict[Tuple[datetime.date, str], amount.Amount],
     Optional[Any],
 ]:
     """Process the arguments. This also initializes the logging module.
@@ -692,7 +2396,8 @@ def process_args() -> Tuple[
       A tuple of:
         args: The argparse receiver of command-line arguments.
         jobs: A list of DatedPrice job objects.
-        entries: A list of all the parsed entries.
+        existing_prices: A dict of the prices of all the input files, as
+          returned by index_prices().
         dcontext: A context used to determine decimal precision when printing.
     """
     parser = argparse.ArgumentParser(description=beanprice.__doc__.splitlines()[0])
@@ -820,6 +2525,37 @@ def process_args() -> Tuple[
         help=("Specify the number of concurrent fetchers."),
     )
 
+    parser.add_argument(
+        "--http2",
+        action="store_true",
+        help=(
+            "Negotiate HTTP/2 with the price servers, multiplexing the requests to "
+            "each host over fewer connections."
+        ),
+    )
+
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help=(
+            "Fetch the prices from an asyncio event loop instead of a pool of "
+            "threads. Sources with asynchronous support are awaited directly; other "
+            "sources are called from a pool of --workers threads."
+        ),
+    )
+
+    parser.add_argument(
+        "--source-concurrency",
+        action="store",
+        type=int,
+        default=DEFAULT_SOURCE_CONCURRENCY,
+        help=(
+            "The maximum number of concurrent requests to any single source, "
+            "in --async mode."
+        ),
+    )
+
     parser.add_argument(
         "-n",
         "--dry-run",
@@ -830,6 +2566,18 @@ def process_args() -> Tuple[
         ),
     )
 
+    parser.add_argument(
+        "--rate-limit",
+        dest="rate_limits",
+        action="append",
+        metavar="SOURCE=RATE[/CONCURRENCY]",
+        help=(
+            "Limit the number of requests per second and optionally the number of "
+            "concurrent requests to a source, e.g. 'yahoo=2/4'. This option may be "
+            "repeated, and overrides the default limits of the source."
+        ),
+    )
+
     # Caching options.
     cache_group = parser.add_argument_group("cache")
     cache_filename = path.join(
@@ -854,6 +2602,17 @@ def process_args() -> Tuple[
     cache_group.add_argument(
         "--clear-cache", action="store_true", help="Clear the cache prior to startup."
     )
+    cache_group.add_argument(
+        "--negative-cache-ttl",
+        action="store",
+        type=float,
+        default=DEFAULT_NEGATIVE_EXPIRATION.total_seconds() / 60,
+        help=(
+            "The number of minutes for which a failure to fetch a price is cached "
+            "before trying again. This doubles with each consecutive failure of the "
+            "same symbol. Use 0 to always try again."
+        ),
+    )
 
     args = parser.parse_args()
 
@@ -875,14 +2634,23 @@ def process_args() -> Tuple[
         args.undeclared = DEFAULT_SOURCE
 
     # Setup for processing.
-    setup_cache(args.cache_filename, args.clear_cache)
+    try:
+        setup_rate_limits(args.rate_limits)
+    except (ValueError, ImportError) as exc:
+        parser.error(str(exc))
+    setup_cache(
+        args.cache_filename,
+        args.clear_cache,
+        datetime.timedelta(minutes=args.negative_cache_ttl),
+    )
+    net_utils.setup_session(max(args.workers, net_utils.DEFAULT_POOL_SIZE), args.http2)
 
     # Get the list of DatedPrice jobs to get from the arguments.
     dates = [args.date or None]
     logging.info("Processing at date: %s", args.date or datetime.date.today())
 
     jobs = []
-    all_entries = []
+    existing_prices: Dict[Tuple[datetime.date, str], amount.Amount] = {}
     dcontext = None
     if args.expressions:
         # Interpret the arguments as price sources.
@@ -903,57 +2671,25 @@ def process_args() -> Tuple[
                         jobs.append(
                             DatedPrice(psources[0].symbol, currency, date, psources)
                         )
-    elif args.update:
-        # Use Beancount input filename sources to create
-        # prices jobs up to present time.
-        for filename in args.sources:
-            if not path.exists(filename) or not path.isfile(filename):
-                parser.error(
-                    'File does not exist: "{}"; ' "did you mean to use -e?".format(filename)
-                )
-                continue
-            logging.info('Loading "%s"', filename)
-            entries, errors, options_map = loader.load_file(filename, log_errors=sys.stderr)
-            if dcontext is None:
-                dcontext = options_map["dcontext"]
-            if args.date is None:
-                latest_date = datetime.date.today()
-            else:
-                latest_date = args.date
-            jobs.extend(
-                get_price_jobs_up_to_date(
-                    entries,
-                    latest_date,
-                    args.inactive,
-                    args.undeclared,
-                    args.update_rate,
-                    args.update_compress,
-                )
-            )
-            all_entries.extend(entries)
     else:
-        # Interpret the arguments as Beancount input filenames.
+        # Interpret the arguments as Beancount input filenames. With --update,
+        # create price jobs up to present time.
         for filename in args.sources:
             if not path.exists(filename) or not path.isfile(filename):
                 parser.error(
                     'File does not exist: "{}"; ' "did you mean to use -e?".format(filename)
                 )
-                continue
-            logging.info('Loading "%s"', filename)
-            entries, errors, options_map = loader.load_file(filename, log_errors=sys.stderr)
-            if dcontext is None:
-                dcontext = options_map["dcontext"]
-            for date in dates:
-                jobs.extend(
-                    get_price_jobs_at_date(entries, date, args.inactive, args.undeclared)
-                )
-                all_entries.extend(entries)
+        if args.update:
+            date = args.date or datetime.date.today()
+        else:
+            date = dates[0]
+        jobs, existing_prices, dcontext = plan_ledgers_jobs(args.sources, args, date)
 
-    return args, jobs, data.sorted(all_entries), dcontext
+    return args, jobs, existing_prices, dcontext
 
 
 def main():
-    args, jobs, entries, dcontext = process_args()
+    args, jobs, existing_prices, dcontext = process_args()
 
     # If we're just being asked to list the jobs, do this here.
     if args.dry_run:
@@ -961,14 +2697,66 @@ def main():
             print(format_dated_price_str(dprice))
         return
 
-    # Fetch all the required prices, processing all the jobs.
-    executor = futures.ThreadPoolExecutor(max_workers=args.workers)
-    price_entries = filter(
-        None,
-        executor.map(
-            functools.partial(fetch_price, swap_inverted=args.swap_inverted), jobs
-        ),
-    )
+    # Resolve the jobs whose prices are cached upfront, so that only the misses
+    # are dispatched to the fetchers.
+    price_entries, jobs = resolve_cached_jobs(jobs, args.swap_inverted)
+    logging.info("Resolved %d jobs from the cache", len(price_entries))
+
+    # Merge consecutive dates for the same pair into range jobs, in order to
+    # fetch them in a single call from sources which support it.
+    fetch_jobs = merge_price_jobs(jobs) if args.update else jobs
+
+    # Group the jobs for latest prices by source, in order to fetch them with a
+    # single call from sources which support it.
+    fetch_jobs = batch_price_jobs(fetch_jobs)
+
+    # Fetch all the required prices, processing all the jobs. The sources are
+    # shared by all the workers and released once all the jobs are done.
+    if fetch_jobs:
+        try:
+            if args.use_async:
+                price_entries.extend(
+                    asyncio.run(
+                        fetch_jobs_async(
+                            fetch_jobs,
+                            args.swap_inverted,
+                            args.workers,
+                            args.source_concurrency,
+                        )
+                    )
+                )
+            else:
+                with futures.ThreadPoolExecutor(max_workers=args.workers) as executor:
+                    price_entries.extend(
+                        itertools.chain.from_iterable(
+                            executor.map(
+                                functools.partial(
+                                    fetch_job, swap_inverted=args.swap_inverted
+                                ),
+                                fetch_jobs,
+                            )
+                        )
+                    )
+        finally:
+            reset_sources()
+            net_utils.close_sessions()
+
+    # Report the symbols which were skipped due to recent failures.
+    failures = get_failures()
+    for module_name, symbol in sorted(_SUPPRESSED):
+        count, time_expires = failures.get((module_name, symbol), (0, None))
+        logging.warning(
+            "Skipped %s from %s after %d consecutive failures, until %s",
+            symbol,
+            module_name,
+            count,
+            time_expires,
+        )
+
+    # Dates on which the market was closed yield the price of an earlier date,
+    # which may have been both cached and fetched; only output each once.
+    if args.update:
+        price_entries = unique_price_entries(price_entries)
 
     # Sort them by currency, regardless of date (the dates should be close
     # anyhow, and we tend to put them in chunks in the input files anyhow).
@@ -980,7 +2768,9 @@ def main():
 
     # Avoid clobber, remove redundant entries.
     if not args.clobber:
-        price_entries, ignored_entries = filter_redundant_prices(price_entries, entries)
+        price_entries, ignored_entries = filter_indexed_prices(
+            price_entries, existing_prices
+        )
         for entry in ignored_entries:
             logging.info("Ignored to avoid clobber: %s %s", entry.date, entry.currency)
 
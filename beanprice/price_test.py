@@ -3,24 +3,33 @@
 __copyright__ = "Copyright (C) 2015-2020  Martin Blais"
 __license__ = "GNU GPLv2"
 
+import asyncio
 import datetime
 import logging
 import shutil
 import sys
 import tempfile
+import textwrap
 import types
 import unittest
+from concurrent import futures
 from os import path
 from unittest import mock
 from decimal import Decimal
 
 from dateutil import tz
 
+from beancount.core.number import ONE
 from beancount.utils import test_utils
 from beancount.parser import cmptest
+from beancount.core import getters
+from beancount.core import prices
+from beancount.ops import find_prices
+from beancount.ops import lifetimes
 from beancount import loader
 
 from beanprice.source import SourcePrice
+import beanprice.source
 from beanprice import price
 from beanprice.sources import yahoo
 
@@ -195,6 +204,84 @@ class TestCache(unittest.TestCase):
             if path.exists(tmpdir):
                 shutil.rmtree(tmpdir)
 
+    def test_fetch_cached_price__negative(self):
+        tmpdir = tempfile.mkdtemp()
+        tmpfile = path.join(tmpdir, "prices.cache")
+        try:
+            price.setup_cache(tmpfile, False, datetime.timedelta(hours=1))
+
+            source = mock.MagicMock()
+            source.get_latest_price.return_value = None
+            module_name = type(source).__module__
+
+            # Failure, which is cached.
+            self.assertIsNone(price.fetch_cached_price(source, "HOOL", None))
+            self.assertEqual(1, source.get_latest_price.call_count)
+            self.assertIsNone(price.fetch_cached_price(source, "HOOL", None))
+            self.assertEqual(1, source.get_latest_price.call_count)
+            self.assertEqual({(module_name, "HOOL")}, price._SUPPRESSED)
+
+            # The failure expires, and is cached twice as long the second time.
+            time_beyond = datetime.datetime.now(tz.tzutc()) + datetime.timedelta(hours=1.5)
+            with mock.patch("beanprice.price.now", return_value=time_beyond):
+                self.assertIsNone(price.fetch_cached_price(source, "HOOL", None))
+                self.assertEqual(2, source.get_latest_price.call_count)
+            count, time_expires = price.get_failures()[(module_name, "HOOL")]
+            self.assertEqual(2, count)
+            self.assertAlmostEqual(
+                2 * 3600,
+                (time_expires - time_beyond).total_seconds(),
+                delta=1,
+            )
+
+            # A success resets the failures.
+            srcprice = SourcePrice(
+                Decimal("1.723"), datetime.datetime.now(tz.tzutc()), "USD"
+            )
+            source.get_latest_price.return_value = srcprice
+            time_beyond += datetime.timedelta(hours=3)
+            with mock.patch("beanprice.price.now", return_value=time_beyond):
+                self.assertEqual(srcprice, price.fetch_cached_price(source, "HOOL", None))
+            self.assertEqual({}, price.get_failures())
+        finally:
+            price.reset_cache()
+            if path.exists(tmpdir):
+                shutil.rmtree(tmpdir)
+
+    def test_resolve_cached_jobs(self):
+        tmpdir = tempfile.mkdtemp()
+        tmpfile = path.join(tmpdir, "prices.cache")
+        try:
+            price.setup_cache(tmpfile, False)
+
+            day = datetime.date(2006, 1, 2)
+            time = datetime.datetime(2006, 1, 2, 16, 0, 0, tzinfo=tz.tzutc())
+            srcprice = SourcePrice(Decimal("1.723"), time, "USD")
+            key = price._get_cache_key(yahoo.__name__, "HOOL", day)
+            price._cache_set(key, srcprice)
+
+            cached = price.DatedPrice("HOOL", "USD", day, [PS(yahoo, "HOOL", False)])
+            missing = price.DatedPrice(
+                "HOOL", "USD", datetime.date(2006, 1, 3), [PS(yahoo, "HOOL", False)]
+            )
+            with mock.patch.object(price, "get_source") as get_source:
+                entries, misses = price.resolve_cached_jobs([cached, missing])
+            self.assertFalse(get_source.called)
+            self.assertEqual([missing], misses)
+            self.assertEqual(1, len(entries))
+            self.assertEqual(Decimal("1.723"), entries[0].amount.number)
+            self.assertEqual("HOOL", entries[0].currency)
+
+            # Nothing is resolved with the cache disabled.
+            price.reset_cache()
+            self.assertEqual(
+                ([], [cached, missing]), price.resolve_cached_jobs([cached, missing])
+            )
+        finally:
+            price.reset_cache()
+            if path.exists(tmpdir):
+                shutil.rmtree(tmpdir)
+
 
 class TestProcessArguments(unittest.TestCase):
     def test_filename_not_exists(self):
@@ -234,6 +321,138 @@ class TestProcessArguments(unittest.TestCase):
                 jobs,
             )
 
+    @test_utils.docfile
+    def test_single_file__in_process(self, filename):
+        """
+        2023-01-01 commodity HOOL
+          price: "USD:yahoo/HOOL"
+        """
+        with mock.patch.object(price.futures, "ProcessPoolExecutor") as executor:
+            with mock.patch.object(price, "_get_module_names") as get_module_names:
+                _, jobs, __, ___ = run_with_args(
+                    price.process_args, ["--no-cache", "--inactive", filename]
+                )
+        self.assertFalse(executor.called)
+        self.assertFalse(get_module_names.called)
+        self.assertEqual([PS(yahoo, "HOOL", False)], jobs[0].sources)
+
+    def test_multiple_files(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            filenames = []
+            for currency in "HOOL", "IBM":
+                filename = path.join(tmpdir, "{}.beancount".format(currency))
+                with open(filename, "w", encoding="utf-8") as file:
+                    file.write(
+                        textwrap.dedent(
+                            """
+                            2023-01-01 commodity {0}
+                              price: "USD:yahoo/{0}"
+                            2023-01-01 open Assets:Account1
+                            2023-01-01 open Assets:Other
+                            2023-01-05 *
+                              Assets:Account1       1 {0} {{5 USD}}
+                              Assets:Other
+                            2023-01-06 price {0} 6 USD
+                            """
+                        ).format(currency)
+                    )
+                filenames.append(filename)
+
+            with test_utils.capture("stderr"):
+                _, jobs, existing_prices, dcontext = run_with_args(
+                    price.process_args, ["--no-cache", "--date=2023-01-10"] + filenames
+                )
+            date = datetime.date(2023, 1, 10)
+            self.assertEqual(
+                [
+                    price.DatedPrice("HOOL", "USD", date, [PS(yahoo, "HOOL", False)]),
+                    price.DatedPrice("IBM", "USD", date, [PS(yahoo, "IBM", False)]),
+                ],
+                jobs,
+            )
+            self.assertEqual(
+                {(datetime.date(2023, 1, 6), "HOOL"), (datetime.date(2023, 1, 6), "IBM")},
+                set(existing_prices),
+            )
+            self.assertIsNotNone(dcontext)
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+class TestLedgerState(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        price.setup_cache(path.join(self.tmpdir, "prices.cache"), False)
+        self.filename = path.join(self.tmpdir, "ledger.beancount")
+        self.included = path.join(self.tmpdir, "commodities.beancount")
+        with open(self.included, "w", encoding="utf-8") as file:
+            file.write(
+                textwrap.dedent(
+                    """
+                    2023-01-01 commodity HOOL
+                      price: "USD:yahoo/HOOL"
+                    """
+                )
+            )
+        with open(self.filename, "w", encoding="utf-8") as file:
+            file.write(
+                textwrap.dedent(
+                    """
+                    include "commodities.beancount"
+                    2023-01-01 open Assets:Account1
+                    2023-01-01 open Assets:Other
+                    2023-01-05 *
+                      Assets:Account1       1 HOOL {5 USD}
+                      Assets:Other
+                    2023-01-09 price HOOL 6 USD
+                    """
+                )
+            )
+        self.date = datetime.date(2023, 1, 14)
+
+    def tearDown(self):
+        price.reset_cache()
+        shutil.rmtree(self.tmpdir)
+
+    def get_jobs(self, date):
+        scan, existing_prices, dcontext = price.load_ledger_for_update(self.filename, date)
+        self.assertIsNotNone(dcontext)
+        return price.get_price_jobs_from_scan(scan, date), existing_prices
+
+    def test_load_ledger_for_update(self):
+        jobs, existing_prices = self.get_jobs(self.date)
+        self.assertEqual(
+            [datetime.date(2023, 1, day) for day in (10, 11, 12, 13)],
+            [job.date for job in jobs],
+        )
+        self.assertEqual([PS(yahoo, "HOOL", False)], jobs[0].sources)
+        self.assertEqual([(datetime.date(2023, 1, 9), "HOOL")], list(existing_prices))
+
+        # The ledger is not loaded again while it is unchanged.
+        with mock.patch.object(price.loader, "load_file") as load_file:
+            cached_jobs, cached_prices = self.get_jobs(self.date)
+            self.assertEqual(jobs, cached_jobs)
+            self.assertEqual(existing_prices, cached_prices)
+            self.assertFalse(load_file.called)
+
+            # Nor for later dates.
+            self.get_jobs(self.date + datetime.timedelta(days=7))
+            self.assertFalse(load_file.called)
+
+    def test_load_ledger_for_update__invalidated(self):
+        self.get_jobs(self.date)
+
+        # The state does not apply to dates within the ledger.
+        self.assertIsNone(price.load_ledger_state(self.filename, datetime.date(2023, 1, 9)))
+
+        # Nor after any of its files is modified.
+        with open(self.included, "a", encoding="utf-8") as file:
+            file.write("2023-01-01 commodity USD\n")
+        self.assertIsNone(price.load_ledger_state(self.filename, self.date))
+        self.get_jobs(self.date)
+        self.assertIsNotNone(price.load_ledger_state(self.filename, self.date))
+
 
 class TestClobber(cmptest.TestCase):
     @loader.load_doc()
@@ -268,6 +487,25 @@ class TestClobber(cmptest.TestCase):
             dedent=True,
         )
 
+    def test_unique_price_entries(self):
+        price_entries, _, __ = loader.load_string(
+            """
+          2015-01-27 price HDV                                 76.83 USD
+          2015-01-27 price HDV                                 99.12 CAD
+          2015-01-27 price HDV                                 76.83 USD
+          2015-01-28 price HDV                                 76.90 USD
+        """,
+            dedent=True,
+        )
+        self.assertEqualEntries(
+            """
+          2015-01-27 price HDV                                 76.83 USD
+          2015-01-27 price HDV                                 99.12 CAD
+          2015-01-28 price HDV                                 76.90 USD
+        """,
+            price.unique_price_entries(price_entries),
+        )
+
     def test_clobber_nodiffs(self):
         new_price_entries, _ = price.filter_redundant_prices(
             self.price_entries, self.entries, diffs=False
@@ -344,6 +582,564 @@ class TestInverted(unittest.TestCase):
         self.assertEqual(Decimal("125.00"), entry.amount.number)
 
 
+class SeriesSource:
+    "A fake source implementing get_prices_series()."
+
+    def __init__(self):
+        self.calls = []
+
+    def get_historical_price(self, ticker, time):
+        raise AssertionError("Should not be called.")
+
+    def get_prices_series(self, ticker, time_begin, time_end):
+        self.calls.append((ticker, time_begin, time_end))
+        return [
+            SourcePrice(
+                Decimal(day),
+                datetime.datetime(2021, 1, day, 16, 0, 0, tzinfo=tz.tzlocal()),
+                "USD",
+            )
+            for day in (4, 5, 6, 7, 8)
+        ]
+
+
+class TestMergePriceJobs(unittest.TestCase):
+    def test_merge_price_jobs(self):
+        psources = [PS(yahoo, "HOOL", False)]
+        jobs = [
+            price.DatedPrice("HOOL", "USD", datetime.date(2021, 1, day), psources)
+            for day in (4, 5, 6, 7, 8, 11, 12, 28)
+        ]
+        jobs.append(price.DatedPrice("HOOL", "USD", None, psources))
+        merged = price.merge_price_jobs(jobs)
+        self.assertEqual(
+            [
+                price.DatedPrice("HOOL", "USD", None, psources),
+                price.DatedPriceRange(
+                    "HOOL",
+                    "USD",
+                    [datetime.date(2021, 1, day) for day in (4, 5, 6, 7, 8, 11, 12)],
+                    psources,
+                ),
+                price.DatedPrice("HOOL", "USD", datetime.date(2021, 1, 28), psources),
+            ],
+            merged,
+        )
+
+    def test_merge_price_jobs__distinct_sources(self):
+        jobs = [
+            price.DatedPrice(
+                "HOOL", "USD", datetime.date(2021, 1, 4), [PS(yahoo, "HOOL", False)]
+            ),
+            price.DatedPrice(
+                "HOOL", "USD", datetime.date(2021, 1, 5), [PS(yahoo, "HOOL2", False)]
+            ),
+        ]
+        self.assertEqual(jobs, price.merge_price_jobs(jobs))
+
+    def test_merge_price_jobs__no_series(self):
+        # Jobs whose sources cannot fetch series are fetched independently.
+        module = types.ModuleType("batch_source")
+        module.Source = BatchSource  # type: ignore
+        jobs = [
+            price.DatedPrice(
+                "HOOL", "USD", datetime.date(2021, 1, day), [PS(module, "HOOL", False)]
+            )
+            for day in (4, 5)
+        ]
+        self.assertEqual(jobs, price.merge_price_jobs(jobs))
+
+
+class TestCapabilities(unittest.TestCase):
+    def test_get_capabilities__inferred(self):
+        Capabilities = beanprice.source.Capabilities
+        self.assertEqual(Capabilities(), beanprice.source.get_capabilities(None))
+        self.assertEqual(
+            Capabilities(series=True), beanprice.source.get_capabilities(SeriesSource)
+        )
+        self.assertEqual(
+            Capabilities(batch=True), beanprice.source.get_capabilities(BatchSource)
+        )
+        self.assertEqual(
+            Capabilities(latest_async=True), beanprice.source.get_capabilities(AsyncSource)
+        )
+        self.assertEqual(
+            Capabilities(True, True, None, True, True),
+            beanprice.source.get_capabilities(yahoo.Source),
+        )
+
+    def test_get_capabilities__declared(self):
+        class DeclaredSource(SeriesSource):
+            capabilities = beanprice.source.Capabilities(
+                series=True, max_range=datetime.timedelta(days=2)
+            )
+
+        self.assertEqual(
+            datetime.timedelta(days=2),
+            beanprice.source.get_capabilities(DeclaredSource).max_range,
+        )
+
+
+class TestFetchPriceRange(unittest.TestCase):
+    def setUp(self):
+        self.source = SeriesSource()
+        self.module = types.ModuleType("series_source")
+        self.module.Source = lambda: self.source  # type: ignore
+        self.addCleanup(price.reset_sources)
+        self.addCleanup(mock.patch.stopall)
+        mock.patch("beanprice.price._CACHE", None).start()
+
+    def test_fetch_price_range__series(self):
+        dprange = price.DatedPriceRange(
+            "HOOL",
+            "USD",
+            [datetime.date(2021, 1, day) for day in (5, 6, 9, 10)],
+            [PS(self.module, "HOOL", False)],
+        )
+        entries = price.fetch_price_range(dprange)
+        self.assertEqual(1, len(self.source.calls))
+        self.assertEqual(
+            [
+                (datetime.date(2021, 1, 5), Decimal(5)),
+                (datetime.date(2021, 1, 6), Decimal(6)),
+                (datetime.date(2021, 1, 8), Decimal(8)),
+            ],
+            [(entry.date, entry.amount.number) for entry in entries],
+        )
+
+    def test_fetch_price_range__fallback(self):
+        fetch_cached = mock.patch("beanprice.price.fetch_cached_price").start()
+        fetch_cached.return_value = SourcePrice(
+            Decimal("1.5"),
+            datetime.datetime(2021, 1, 5, 16, 0, 0, tzinfo=tz.tzlocal()),
+            "USD",
+        )
+        module = types.ModuleType("mock_source")
+        module.Source = mock.MagicMock  # type: ignore
+        dprange = price.DatedPriceRange(
+            "HOOL",
+            "USD",
+            [datetime.date(2021, 1, 5), datetime.date(2021, 1, 6)],
+            [PS(module, "HOOL", False)],
+        )
+        entries = price.fetch_price_range(dprange)
+        self.assertEqual(2, fetch_cached.call_count)
+        self.assertEqual(1, len(entries))
+
+
+class TestSeriesCache(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        self.addCleanup(price.reset_cache)
+        price.setup_cache(path.join(tmpdir, "prices.cache"), False)
+        self.source = SeriesSource()
+
+    def fetch(self, *days):
+        dates = [datetime.date(2021, 1, day) for day in days]
+        results = price.fetch_cached_price_series(self.source, "HOOL", dates)
+        return [
+            results[date].price if results[date] is not None else None for date in dates
+        ]
+
+    def test_fetch_cached_price_series__negative(self):
+        module_name = type(self.source).__module__
+        with mock.patch.object(
+            self.source, "get_prices_series", side_effect=ValueError("Delisted")
+        ) as get_prices_series:
+            # Failure, which is cached.
+            self.assertEqual([None], self.fetch(5))
+            self.assertEqual(1, get_prices_series.call_count)
+            self.assertEqual([None], self.fetch(5))
+            self.assertEqual(1, get_prices_series.call_count)
+            self.assertEqual({(module_name, "HOOL")}, price._SUPPRESSED)
+
+            # The failure expires.
+            time_beyond = datetime.datetime.now(tz.tzutc()) + datetime.timedelta(hours=1.5)
+            with mock.patch("beanprice.price.now", return_value=time_beyond):
+                self.assertEqual([None], self.fetch(5))
+            self.assertEqual(2, get_prices_series.call_count)
+            self.assertEqual(2, price.get_failures()[(module_name, "HOOL")][0])
+
+        # An empty series is a failure as well.
+        with mock.patch.object(self.source, "get_prices_series", return_value=[]):
+            self.assertEqual([None], self.fetch(12))
+        self.assertEqual(3, price.get_failures()[(module_name, "HOOL")][0])
+
+        # A success resets the failures.
+        self.assertEqual([Decimal(6)], self.fetch(6))
+        self.assertEqual({}, price.get_failures())
+
+    def test_fetch_cached_price_series__none(self):
+        # A failed fetch does not mark the interval as known.
+        with mock.patch.object(
+            self.source, "get_prices_series", return_value=None
+        ) as get_prices_series:
+            self.assertEqual([None], self.fetch(5))
+        key = price._get_series_key(type(self.source).__module__, "HOOL")
+        self.assertEqual([], price._series_cache_get(key).coverage)
+
+        # Once the failure expires, the interval is fetched again.
+        time_beyond = datetime.datetime.now(tz.tzutc()) + datetime.timedelta(days=400)
+        with mock.patch("beanprice.price.now", return_value=time_beyond):
+            self.assertEqual([Decimal(5)], self.fetch(5))
+        self.assertEqual(1, get_prices_series.call_count)
+        self.assertEqual(1, len(self.source.calls))
+
+    def test_subtract_coverage(self):
+        needed = [(0, 10, 0), (20, 30, 0)]
+        coverage = [(2, 4, 0), (8, 22, 0), (25, 26, 0)]
+        self.assertEqual(
+            [(0, 2), (4, 8), (22, 25), (26, 30)],
+            price._subtract_coverage(needed, coverage),
+        )
+        self.assertEqual([(0, 10)], price._subtract_coverage([(0, 10, 0)], []))
+        self.assertEqual([], price._subtract_coverage([(3, 4, 0)], [(0, 10, 0)]))
+
+    def test_fetch_cached_price_series(self):
+        self.assertEqual([Decimal(5), Decimal(6)], self.fetch(5, 6))
+        self.assertEqual(1, len(self.source.calls))
+
+        # Dates within the fetched interval are answered from the cache.
+        self.assertEqual([Decimal(6)], self.fetch(6))
+        self.assertEqual(1, len(self.source.calls))
+
+        # Only the interval which is not covered yet is fetched.
+        self.assertEqual([Decimal(5), Decimal(8), Decimal(8)], self.fetch(5, 9, 10))
+        self.assertEqual(2, len(self.source.calls))
+        _, time_begin, time_end = self.source.calls[1]
+        self.assertEqual(price.get_query_time(datetime.date(2021, 1, 6)), time_begin)
+        self.assertEqual(price.get_query_time(datetime.date(2021, 1, 10)), time_end)
+
+        # A single read resolves jobs from the cached series.
+        module = types.ModuleType(SeriesSource.__module__)
+        module.Source = SeriesSource  # type: ignore
+        psources = [PS(module, "HOOL", False)]
+        jobs = [
+            price.DatedPrice("HOOL", "USD", datetime.date(2021, 1, day), psources)
+            for day in (7, 20)
+        ]
+        entries, misses = price.resolve_cached_jobs(jobs)
+        self.assertEqual([Decimal(7)], [entry.amount.number for entry in entries])
+        self.assertEqual(jobs[1:], misses)
+
+    def test_fetch_cached_price_series__expired(self):
+        # The part of the series which is not final yet expires.
+        time_fetched = datetime.datetime(2021, 1, 6, 20, 0, 0, tzinfo=tz.tzutc())
+        with mock.patch("beanprice.price.now", return_value=time_fetched):
+            self.fetch(5, 6)
+        time_beyond = time_fetched + price.RECENT_EXPIRATION * 2
+        with mock.patch("beanprice.price.now", return_value=time_beyond):
+            self.assertEqual([Decimal(5), Decimal(6)], self.fetch(5, 6))
+        self.assertEqual(2, len(self.source.calls))
+        _, time_begin, _ = self.source.calls[1]
+        self.assertEqual(datetime.datetime(2021, 1, 6, tzinfo=tz.tzutc()), time_begin)
+
+        # The rest never does.
+        time_beyond += datetime.timedelta(days=3650)
+        with mock.patch("beanprice.price.now", return_value=time_beyond):
+            self.assertEqual([Decimal(6)], self.fetch(6))
+        self.assertEqual(3, len(self.source.calls))
+        with mock.patch("beanprice.price.now", return_value=time_beyond):
+            self.assertEqual([Decimal(6)], self.fetch(6))
+        self.assertEqual(3, len(self.source.calls))
+
+    def test_fetch_cached_price_series__max_range(self):
+        # Intervals longer than the maximum range of the source are split.
+        class LimitedSource(SeriesSource):
+            capabilities = beanprice.source.Capabilities(
+                series=True, max_range=datetime.timedelta(days=2)
+            )
+
+        self.source = LimitedSource()
+        self.assertEqual([Decimal(5), Decimal(8), Decimal(8)], self.fetch(5, 9, 10))
+        self.assertEqual(5, len(self.source.calls))
+        for (_, _, time_end), (_, time_begin, _) in zip(
+            self.source.calls, self.source.calls[1:]
+        ):
+            self.assertEqual(time_end, time_begin)
+
+
+class TestExpiration(unittest.TestCase):
+    def test_get_expiration(self):
+        date = datetime.date(2021, 1, 5)
+        utc = tz.tzutc()
+
+        def expiration(*args):
+            return price.get_expiration(
+                date, datetime.datetime(2021, 1, *args, tzinfo=utc), utc
+            )
+
+        self.assertEqual(
+            price.DEFAULT_EXPIRATION,
+            price.get_expiration(None, datetime.datetime(2021, 1, 1, tzinfo=utc)),
+        )
+        with mock.patch("beanprice.price.get_query_time") as get_query_time:
+            get_query_time.return_value = datetime.datetime(2021, 1, 5, 16, tzinfo=utc)
+            self.assertEqual(price.DEFAULT_EXPIRATION, expiration(5, 10))
+            self.assertEqual(price.RECENT_EXPIRATION, expiration(5, 17))
+            self.assertEqual(price.RECENT_EXPIRATION, expiration(6, 11))
+            self.assertIsNone(expiration(6, 12))
+            self.assertIsNone(expiration(30))
+
+        # The trading day ends later in a market west of UTC.
+        est = tz.gettz("America/New_York")
+        time_fetched = datetime.datetime(2021, 1, 6, 13, tzinfo=utc)
+        self.assertIsNone(price.get_expiration(date, time_fetched, utc))
+        self.assertEqual(
+            price.RECENT_EXPIRATION, price.get_expiration(date, time_fetched, est)
+        )
+
+    def test_fetch_cached_price__historical_settled(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        self.addCleanup(price.reset_cache)
+        price.setup_cache(path.join(tmpdir, "prices.cache"), False)
+
+        srcprice = SourcePrice(
+            Decimal("1.723"), datetime.datetime(2006, 1, 2, 16, tzinfo=tz.tzutc()), "USD"
+        )
+        source = mock.MagicMock()
+        source.get_historical_price.return_value = srcprice
+        day = datetime.date(2006, 1, 2)
+        price.fetch_cached_price(source, "HOOL", day)
+
+        # Settled prices never expire.
+        time_beyond = datetime.datetime.now(tz.tzutc()) + datetime.timedelta(days=3650)
+        with mock.patch("beanprice.price.now", return_value=time_beyond):
+            self.assertEqual(srcprice, price.fetch_cached_price(source, "HOOL", day))
+        self.assertEqual(1, source.get_historical_price.call_count)
+
+
+class BatchSource:
+    "A fake source implementing get_latest_prices()."
+
+    calls: list = []
+
+    def get_latest_price(self, ticker):
+        raise AssertionError("Should not be called.")
+
+    def get_latest_prices(self, tickers):
+        self.calls.append(tickers)
+        return {
+            ticker: SourcePrice(
+                Decimal("1.5"),
+                datetime.datetime(2021, 1, 5, 16, 0, 0, tzinfo=tz.tzlocal()),
+                "USD",
+            )
+            for ticker in tickers
+            if ticker != "MISSING"
+        }
+
+
+class TestPriceBatch(unittest.TestCase):
+    def setUp(self):
+        BatchSource.calls = []
+        self.module = types.ModuleType("batch_source")
+        self.module.Source = BatchSource  # type: ignore
+        self.addCleanup(price.reset_sources)
+        self.addCleanup(mock.patch.stopall)
+        mock.patch("beanprice.price._CACHE", None).start()
+
+    def test_batch_price_jobs(self):
+        jobs = [
+            price.DatedPrice("HOOL", "USD", None, [PS(self.module, "HOOL", False)]),
+            price.DatedPrice("AAPL", "USD", None, [PS(self.module, "AAPL", False)]),
+            price.DatedPrice("IBM", "USD", None, [PS(yahoo, "IBM", False)]),
+            price.DatedPrice(
+                "HOOL", "USD", datetime.date(2021, 1, 5), [PS(self.module, "HOOL", False)]
+            ),
+        ]
+        self.assertEqual(
+            [jobs[3], price.PriceBatch(self.module, jobs[:2]), jobs[2]],
+            price.batch_price_jobs(jobs),
+        )
+
+    def test_fetch_price_batch(self):
+        fetch_price = mock.patch("beanprice.price.fetch_price").start()
+        fetch_price.return_value = None
+        fallback = PS(yahoo, "MISSING", False)
+        batch = price.PriceBatch(
+            self.module,
+            [
+                price.DatedPrice("HOOL", "USD", None, [PS(self.module, "HOOL", False)]),
+                price.DatedPrice("AAPL", "USD", None, [PS(self.module, "AAPL", True)]),
+                price.DatedPrice(
+                    "MISS", "USD", None, [PS(self.module, "MISSING", False), fallback]
+                ),
+            ],
+        )
+        entries = price.fetch_price_batch(batch)
+        self.assertEqual([["HOOL", "AAPL", "MISSING"]], BatchSource.calls)
+        self.assertEqual(
+            [("HOOL", Decimal("1.5")), ("AAPL", ONE / Decimal("1.5"))],
+            [(entry.currency, entry.amount.number) for entry in entries],
+        )
+        fetch_price.assert_called_once_with(
+            batch.jobs[2]._replace(sources=[fallback]), False
+        )
+
+
+class AsyncSource(beanprice.source.Source):
+    "A fake source implementing the asynchronous protocol."
+
+    active = 0
+    max_active = 0
+    closed = False
+
+    def get_latest_price(self, ticker):
+        raise AssertionError("Should not be called.")
+
+    async def get_latest_price_async(self, ticker):
+        cls = type(self)
+        cls.active += 1
+        cls.max_active = max(cls.max_active, cls.active)
+        await asyncio.sleep(0.01)
+        cls.active -= 1
+        return SourcePrice(
+            Decimal(len(ticker)),
+            datetime.datetime(2021, 1, 5, 16, 0, 0, tzinfo=tz.tzlocal()),
+            "USD",
+        )
+
+    async def aclose(self):
+        type(self).closed = True
+
+
+class TestFetchAsync(unittest.TestCase):
+    def setUp(self):
+        AsyncSource.active = AsyncSource.max_active = 0
+        AsyncSource.closed = False
+        self.module = types.ModuleType("async_source")
+        self.module.Source = AsyncSource  # type: ignore
+        self.addCleanup(price.reset_sources)
+        self.addCleanup(mock.patch.stopall)
+        mock.patch("beanprice.price._CACHE", None).start()
+
+    def test_fetch_jobs_async(self):
+        jobs = [
+            price.DatedPrice("A" * n, "USD", None, [PS(self.module, "A" * n, False)])
+            for n in range(1, 11)
+        ]
+        entries = asyncio.run(price.fetch_jobs_async(jobs, max_per_source=3))
+        self.assertEqual(
+            [Decimal(n) for n in range(1, 11)],
+            sorted(entry.amount.number for entry in entries),
+        )
+        self.assertEqual(3, AsyncSource.max_active)
+        self.assertTrue(AsyncSource.closed)
+
+    def test_fetch_jobs_async__sync_source(self):
+        fetch_cached = mock.patch("beanprice.price.fetch_cached_price").start()
+        fetch_cached.return_value = SourcePrice(
+            Decimal("125.00"),
+            datetime.datetime(2015, 11, 22, 16, 0, 0, tzinfo=tz.tzlocal()),
+            "JPY",
+        )
+        module = types.ModuleType("sync_source")
+        module.Source = mock.MagicMock  # type: ignore
+        jobs = [
+            price.DatedPrice(
+                "JPY", "USD", datetime.date(2015, 11, 22), [PS(module, "USDJPY", True)]
+            )
+        ]
+        entries = asyncio.run(price.fetch_jobs_async(jobs, swap_inverted=True))
+        self.assertEqual(1, fetch_cached.call_count)
+        self.assertEqual(
+            [("USD", Decimal("125.00"), "JPY")],
+            [(e.currency, e.amount.number, e.amount.currency) for e in entries],
+        )
+
+
+class TestSourceRegistry(unittest.TestCase):
+    def setUp(self):
+        self.module = types.ModuleType("counting_source")
+        self.module.Source = mock.MagicMock()  # type: ignore
+        self.addCleanup(price.reset_sources)
+
+    def test_get_source__shared(self):
+        source = price.get_source(self.module)
+        self.assertIs(source, price.get_source(self.module))
+        self.assertEqual(1, self.module.Source.call_count)
+
+    def test_get_source__threads(self):
+        with futures.ThreadPoolExecutor(max_workers=8) as executor:
+            sources = list(executor.map(price.get_source, [self.module] * 32))
+        self.assertEqual(1, len(set(map(id, sources))))
+        self.assertEqual(1, self.module.Source.call_count)
+
+    def test_reset_sources(self):
+        source = price.get_source(self.module)
+        price.reset_sources()
+        self.assertTrue(source.close.called)
+        price.get_source(self.module)
+        self.assertEqual(2, self.module.Source.call_count)
+
+    def test_get_source__cache(self):
+        self.module.Source = type("Source", (beanprice.source.Source,), {})
+        with mock.patch("beanprice.price._CACHE", {}) as cache:
+            source = price.get_source(self.module)
+        self.assertIs(cache, source.cache)
+
+    def test_get_source__cache_own(self):
+        # Sources which set their own cache, or are not Source subclasses, keep it.
+        class SlotsSource:
+            __slots__ = ()
+
+        own_cache = object()
+        self.module.Source = type(
+            "Source", (beanprice.source.Source,), {"cache": own_cache}
+        )
+        slots_module = types.ModuleType("slots_source")
+        slots_module.Source = SlotsSource  # type: ignore
+        with mock.patch("beanprice.price._CACHE", {}):
+            self.assertIs(own_cache, price.get_source(self.module).cache)
+            self.assertIsInstance(price.get_source(slots_module), SlotsSource)
+
+    def test_get_source__invalid(self):
+        with self.assertRaises(AttributeError):
+            price.get_source(types.ModuleType("empty_source"))
+
+
+class TestRateLimits(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(price.setup_rate_limits, None)
+
+    def test_parse_rate_limit(self):
+        self.assertEqual(
+            ("beanprice.sources.yahoo", 2.0, 4), price.parse_rate_limit("yahoo=2/4")
+        )
+        self.assertEqual(
+            ("beanprice.sources.yahoo", 0.5, None), price.parse_rate_limit("yahoo=0.5")
+        )
+        self.assertEqual(
+            ("beanprice.sources.yahoo", None, 1),
+            price.parse_rate_limit("beanprice.sources.yahoo=/1"),
+        )
+
+    def test_parse_rate_limit__invalid(self):
+        for spec in "yahoo", "yahoo=abc", "yahoo=1/2/3", "yahoo=0", "yahoo=1/0":
+            with self.assertRaises(ValueError):
+                price.parse_rate_limit(spec)
+        with self.assertRaises(ImportError):
+            price.parse_rate_limit("invalid.module.name=1")
+
+    def test_get_rate_limiter(self):
+        limiter = price.get_rate_limiter("beanprice.sources.alphavantage")
+        self.assertEqual(1, limiter.max_concurrency)
+        self.assertIs(limiter, price.get_rate_limiter("beanprice.sources.alphavantage"))
+        limiter = price.get_rate_limiter("beanprice.sources.yahoo")
+        self.assertIsNone(limiter.rate)
+        self.assertIsNone(limiter.max_concurrency)
+
+    def test_setup_rate_limits(self):
+        price.setup_rate_limits(["yahoo=2/4", "alphavantage="])
+        limiter = price.get_rate_limiter("beanprice.sources.yahoo")
+        self.assertEqual((2.0, 4), (limiter.rate, limiter.max_concurrency))
+        limiter = price.get_rate_limiter("beanprice.sources.alphavantage")
+        self.assertEqual((None, None), (limiter.rate, limiter.max_concurrency))
+
+
 class TestImportSource(unittest.TestCase):
     def test_import_source_valid(self):
         for name in "oanda", "yahoo":
@@ -625,6 +1421,75 @@ class TestFilters(unittest.TestCase):
         )
 
 
+class TestScanEntries(unittest.TestCase):
+    @loader.load_doc()
+    def test_scan_entries(self, entries, _, __):
+        """
+        2000-01-10 open Assets:US:Invest:QQQ
+        2000-01-10 open Assets:US:Invest:VEA
+        2000-01-10 open Assets:US:Cash
+        2000-01-10 open Assets:CA:Cash
+        2000-01-10 open Assets:US:Invest:Margin
+
+        2014-01-01 commodity QQQ
+          price: "USD:yahoo/NASDAQ:QQQ"
+
+        2014-01-01 commodity VEA
+          price: "USD:yahoo/NASDAQ:VEA"
+
+        2014-02-06 *
+          Assets:US:Invest:QQQ             100 QQQ {86.23 USD}
+          Assets:US:Invest:VEA             200 VEA {43.22 USD}
+          Assets:US:Invest:Margin
+
+        2014-03-01 price CAD 0.90 USD
+        2014-03-02 price USD 1.12 CAD
+        2014-03-05 price VEA 0 USD
+
+        2014-05-01 *
+          Assets:CA:Cash                   100 CAD @ 0.89 USD
+          Assets:US:Cash
+
+        2014-08-07 *
+          Assets:US:Invest:QQQ            -100 QQQ {86.23 USD} @ 91.23 USD
+          Assets:US:Invest:Margin
+
+        2014-12-01 commodity CAD
+          price: "USD:oanda/CAD_USD"
+
+        2015-01-15 *
+          Assets:US:Invest:QQQ              10 QQQ {92.32 USD}
+          Assets:US:Invest:VEA            -200 VEA {43.22 USD} @ 41.01 USD
+          Assets:US:Invest:Margin
+        """
+        for date in (None, datetime.date(2014, 3, 2), datetime.date(2014, 10, 1)):
+            scan = price.scan_entries(entries, date, history=True)
+            self.assertEqual(price.find_currencies_declared(entries, date), scan.declared)
+            self.assertEqual(getters.get_commodity_directives(entries), scan.commodities)
+            self.assertEqual(find_prices.find_currencies_at_cost(entries), scan.at_cost)
+            self.assertEqual(
+                find_prices.find_currencies_converted(entries, date), scan.converted
+            )
+            self.assertEqual(find_prices.find_currencies_priced(entries, date), scan.priced)
+            self.assertEqual(
+                find_prices.find_balance_currencies(entries, date), scan.balance_currencies
+            )
+            self.assertEqual(lifetimes.get_commodity_lifetimes(entries), scan.lifetimes)
+            price_map = prices.build_price_map(entries)
+            for base_quote in list(price_map) + list(scan.lifetimes):
+                self.assertEqual(
+                    prices.get_latest_price(price_map, base_quote)[0],
+                    scan.latest_dates.get(base_quote, None),
+                )
+
+        scan = price.scan_entries(entries, datetime.date(2014, 10, 1))
+        self.assertIsNone(scan.lifetimes)
+        self.assertIsNone(scan.latest_dates)
+        self.assertEqual(
+            {("VEA", "USD"), ("CAD", "USD"), ("USD", "CAD")}, scan.balance_currencies
+        )
+
+
 class TestFromFile(unittest.TestCase):
     @loader.load_doc()
     def setUp(self, entries, _, __):
@@ -0,0 +1,80 @@
+"""Rate limiting utilities."""
+
+__copyright__ = "Copyright (C) 2015-2020  Martin Blais"
+__license__ = "GNU GPLv2"
+
+import contextlib
+import math
+import threading
+import time
+from typing import Callable, Iterator, Optional
+
+
+class RateLimiter:
+    """A token bucket rate limiter combined with a cap on concurrent calls.
+
+    The bucket holds up to 'burst' tokens and is refilled at 'rate' tokens per
+    second. Each call takes a token, waiting for it if the bucket is empty. The
+    limiter is thread-safe; callers waiting for tokens are served in order.
+    """
+
+    def __init__(
+        self,
+        rate: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+        burst: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Create a limiter.
+
+        Args:
+          rate: A float, the number of calls allowed per second, or None for
+            no limit on the rate.
+          max_concurrency: An integer, the maximum number of calls allowed to
+            run at the same time, or None for no limit.
+          burst: An integer, the number of calls which may be made at once
+            before the rate applies. Defaults to the rate rounded up.
+          clock: A function returning the current time, in seconds.
+        """
+        self.rate = rate
+        self.max_concurrency = max_concurrency
+        self.burst = burst or (max(1, math.ceil(rate)) if rate else 1)
+        self._clock = clock
+        self._lock = threading.Lock()
+        # The number of tokens in the bucket and the time it was counted at.
+        self._bucket = (float(self.burst), clock())
+        self._semaphore = (
+            threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+        )
+
+    def reserve(self) -> float:
+        """Take a token from the bucket.
+
+        Returns:
+          A float, the number of seconds the caller must wait before making its
+          call. This is zero if a token was available.
+        """
+        if not self.rate:
+            return 0.0
+        with self._lock:
+            tokens, updated = self._bucket
+            now = self._clock()
+            tokens = min(float(self.burst), tokens + (now - updated) * self.rate) - 1
+            self._bucket = (tokens, now)
+            if tokens >= 0:
+                return 0.0
+            return -tokens / self.rate
+
+    @contextlib.contextmanager
+    def acquire(self) -> Iterator[None]:
+        """Wait until a call is allowed and hold a concurrency slot while it runs."""
+        if self._semaphore is not None:
+            self._semaphore.acquire()
+        try:
+            delay = self.reserve()
+            if delay > 0:
+                time.sleep(delay)
+            yield
+        finally:
+            if self._semaphore is not None:
+                self._semaphore.release()
@@ -0,0 +1,79 @@
+__copyright__ = "Copyright (C) 2015-2020  Martin Blais"
+__license__ = "GNU GPLv2"
+
+import threading
+import time
+import unittest
+from unittest import mock
+from concurrent import futures
+
+from beanprice import rate_limit
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_unlimited(self):
+        limiter = rate_limit.RateLimiter()
+        for _ in range(100):
+            self.assertEqual(0.0, limiter.reserve())
+
+    def test_reserve(self):
+        clock = FakeClock()
+        limiter = rate_limit.RateLimiter(rate=2.0, clock=clock)
+        self.assertEqual(0.0, limiter.reserve())
+        self.assertEqual(0.0, limiter.reserve())
+        self.assertEqual(0.5, limiter.reserve())
+        self.assertEqual(1.0, limiter.reserve())
+        clock.now = 10.0
+        self.assertEqual(0.0, limiter.reserve())
+
+    def test_reserve__burst(self):
+        clock = FakeClock()
+        limiter = rate_limit.RateLimiter(rate=0.1, burst=3, clock=clock)
+        self.assertEqual([0.0, 0.0, 0.0], [limiter.reserve() for _ in range(3)])
+        self.assertAlmostEqual(10.0, limiter.reserve())
+
+    def test_acquire__sleeps(self):
+        clock = FakeClock()
+        limiter = rate_limit.RateLimiter(rate=5 / 60, clock=clock)
+        with mock.patch("time.sleep", clock.sleep):
+            for _ in range(3):
+                with limiter.acquire():
+                    pass
+        self.assertEqual(2, len(clock.sleeps))
+        self.assertAlmostEqual(24.0, clock.now)
+
+    def test_acquire__concurrency(self):
+        limiter = rate_limit.RateLimiter(max_concurrency=2)
+        lock = threading.Lock()
+        running = []
+        peak = []
+
+        def call(_):
+            with limiter.acquire():
+                with lock:
+                    running.append(1)
+                    peak.append(len(running))
+                time.sleep(0.01)
+                with lock:
+                    running.pop()
+
+        with futures.ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(call, range(16)))
+        self.assertEqual(2, max(peak))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -14,7 +14,7 @@ __license__ = "GNU GPLv2"
 
 import datetime
 from decimal import Decimal
-from typing import List, Optional, NamedTuple
+from typing import Any, Dict, List, Optional, NamedTuple
 
 
 # A record that contains data for a price fetched from a source.
@@ -36,6 +36,30 @@ SourcePrice = NamedTuple(
 )
 
 
+# The capabilities of a price source, which the driver plans its requests
+# against.
+#
+# Attributes:
+#   series: A boolean, true if the source implements get_prices_series(). The
+#     driver then fetches the prices of ranges of dates with single calls.
+#   batch: A boolean, true if the source implements get_latest_prices() with
+#     requests for many tickers at once. The driver then groups the latest price
+#     jobs of the source.
+#   max_range: A datetime.timedelta instance, the longest interval which may be
+#     requested in a single call to get_prices_series(), or None if there is no
+#     limit. The driver splits longer intervals in several calls.
+#   latest_async: A boolean, true if the source implements
+#     get_latest_price_async().
+#   historical_async: A boolean, true if the source implements
+#     get_historical_price_async().
+class Capabilities(NamedTuple):
+    series: bool = False
+    batch: bool = False
+    max_range: Optional[datetime.timedelta] = None
+    latest_async: bool = False
+    historical_async: bool = False
+
+
 class Source:
     """Interface to be implemented by all price sources.
 
@@ -57,8 +81,36 @@ class Source:
 
       Also, note in the case we were able to fetch, the price's returned time
       must be timezone-aware (not naive).
+
+    About asynchronous sources:
+      Sources may additionally override the coroutines get_latest_price_async()
+      and get_historical_price_async(), typically using an asynchronous HTTP
+      session of their own. When the driver runs in asynchronous mode, it awaits
+      those instead of running the synchronous methods in a thread. The
+      synchronous methods remain required.
+
+    About capabilities:
+      Sources may declare what they support in their `capabilities` attribute,
+      a Capabilities instance. The driver plans its requests against it; see
+      get_capabilities(). When it is not declared, it is inferred from the
+      methods the source overrides, so sources need only declare it to set
+      limits such as `max_range`.
+
+    About caching:
+      When its price cache is enabled, the driver sets the `cache` attribute of
+      the sources it creates to the underlying diskcache.Cache, unless they set
+      it to something else themselves. Sources may use it to persist auxiliary
+      data which is expensive to fetch, such as an index of symbols, across
+      runs. Keys should be prefixed with the name of the source's module. It is
+      None otherwise.
     """
 
+    # The capabilities of the source, or None to infer them. See above.
+    capabilities: Optional[Capabilities] = None
+
+    # A persistent key-value store, or None. See above.
+    cache: Any = None
+
     def get_latest_price(self, ticker: str) -> Optional[SourcePrice]:
         """Fetch the current latest price. The date may differ.
 
@@ -72,6 +124,30 @@ class Source:
           A SourcePrice instance, or None if we failed to fetch.
         """
 
+    def get_latest_prices(self, tickers: List[str]) -> Dict[str, SourcePrice]:
+        """Fetch the current latest prices for many tickers at once.
+
+        Sources whose API can quote many tickers in a single request should
+        override this; the driver then groups all the latest price jobs for the
+        source and makes a single call. This default implementation simply calls
+        get_latest_price() for each ticker.
+
+        Args:
+          tickers: A list of strings, the tickers to be fetched by the source.
+        Returns:
+          A dict of ticker to SourcePrice instance. Tickers which could not be
+          fetched are absent from the dict.
+        """
+        prices = {}
+        for ticker in tickers:
+            try:
+                srcprice = self.get_latest_price(ticker)
+            except ValueError:
+                continue
+            if srcprice is not None:
+                prices[ticker] = srcprice
+        return prices
+
     def get_historical_price(
         self, ticker: str, time: datetime.datetime
     ) -> Optional[SourcePrice]:
@@ -109,3 +185,72 @@ class Source:
           failed to fetch. An empty list signals success fetching but no data in
           the requested interval.
         """
+
+    async def get_latest_price_async(self, ticker: str) -> Optional[SourcePrice]:
+        """Asynchronous version of get_latest_price(); optional.
+
+        This default implementation calls the synchronous method and blocks the
+        event loop; the driver only awaits this method if it is overridden.
+        """
+        return self.get_latest_price(ticker)
+
+    async def get_historical_price_async(
+        self, ticker: str, time: datetime.datetime
+    ) -> Optional[SourcePrice]:
+        """Asynchronous version of get_historical_price(); optional.
+
+        This default implementation calls the synchronous method and blocks the
+        event loop; the driver only awaits this method if it is overridden.
+        """
+        return self.get_historical_price(ticker, time)
+
+    async def aclose(self) -> None:
+        """Release any asynchronous resources held by the source.
+
+        This is awaited at the end of an asynchronous run, from within its
+        event loop, before close() is called.
+        """
+
+    def close(self) -> None:
+        """Release any resources held by the source, such as network sessions.
+
+        A single instance of each source is shared by all the price jobs of a
+        run and may be called from multiple threads; this is called once, after
+        all the jobs have been processed.
+        """
+
+
+def _overrides(source_class, name: str) -> bool:
+    """Return true if a source class provides its own implementation of a method.
+
+    Args:
+      source_class: A Source class, or None.
+      name: A string, the name of a method of Source.
+    Returns:
+      A boolean, true if the class overrides the default implementation.
+    """
+    method = getattr(source_class, name, None)
+    return method is not None and method is not getattr(Source, name)
+
+
+def get_capabilities(source_class) -> Capabilities:
+    """Return the capabilities of a source class.
+
+    The capabilities declared by the class are returned as is. Otherwise they
+    are inferred from the methods it overrides, which also covers sources which
+    do not derive from Source.
+
+    Args:
+      source_class: A Source class, or None.
+    Returns:
+      A Capabilities instance.
+    """
+    capabilities = getattr(source_class, "capabilities", None)
+    if isinstance(capabilities, Capabilities):
+        return capabilities
+    return Capabilities(
+        series=_overrides(source_class, "get_prices_series"),
+        batch=_overrides(source_class, "get_latest_prices"),
+        latest_async=_overrides(source_class, "get_latest_price_async"),
+        historical_async=_overrides(source_class, "get_historical_price_async"),
+    )
@@ -26,11 +26,11 @@ from decimal import Decimal
 
 import re
 from os import environ
-from time import sleep
 import requests
 from dateutil.tz import tz
 from dateutil.parser import parse
 
+from beanprice import net_utils
 from beanprice import source
 
 
@@ -55,13 +55,12 @@ def _parse_ticker(ticker):
 def _do_fetch(params):
     params["apikey"] = environ["ALPHAVANTAGE_API_KEY"]
 
-    resp = requests.get(url="https://www.alphavantage.co/query", params=params)
+    resp = net_utils.get(url="https://www.alphavantage.co/query", params=params)
     data = resp.json()
-    # This is for dealing with the rate limit, sleep for 60 seconds and then retry
+    # The requests are paced by the driver's rate limit for this source; a note
+    # means that the limit of the API key was reached nonetheless.
     if "Note" in data:
-        sleep(60)
-        resp = requests.get(url="https://www.alphavantage.co/query", params=params)
-        data = resp.json()
+        raise AlphavantageApiError("Rate limit reached: {}".format(data["Note"]))
 
     if resp.status_code != requests.codes.ok:
         raise AlphavantageApiError(
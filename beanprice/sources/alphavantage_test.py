@@ -18,7 +18,7 @@ def response(contents, status_code=requests.codes.ok):
     response.status_code = status_code
     response.text = ""
     response.json.return_value = contents
-    return mock.patch("requests.get", return_value=response)
+    return mock.patch("beanprice.net_utils.get", return_value=response)
 
 
 class AlphavantagePriceFetcher(unittest.TestCase):
@@ -37,6 +37,12 @@ class AlphavantagePriceFetcher(unittest.TestCase):
             with self.assertRaises(alphavantage.AlphavantageApiError):
                 alphavantage.Source().get_latest_price("price:IBM:USD")
 
+    def test_error_rate_limit(self):
+        with response({"Note": "Thank you for using Alpha Vantage!"}) as get:
+            with self.assertRaises(alphavantage.AlphavantageApiError):
+                alphavantage.Source().get_latest_price("price:IBM:USD")
+        self.assertEqual(1, get.call_count)
+
     def test_error_response(self):
         contents = {"Error Message": "Something wrong"}
         with response(contents):
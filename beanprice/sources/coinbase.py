@@ -18,6 +18,7 @@ from decimal import Decimal
 import requests
 from dateutil.tz import tz
 
+from beanprice import net_utils
 from beanprice import source
 
 
@@ -32,7 +33,7 @@ def fetch_quote(ticker, time=None):
     if time is not None:
         options["date"] = time.astimezone(tz.tzutc()).date().isoformat()
 
-    response = requests.get(url, options)
+    response = net_utils.get(url, options)
     if response.status_code != requests.codes.ok:
         raise CoinbaseError(
             "Invalid response ({}): {}".format(response.status_code, response.text)
@@ -17,7 +17,7 @@ def response(contents, status_code=requests.codes.ok):
     response.status_code = status_code
     response.text = ""
     response.json.return_value = contents
-    return mock.patch("requests.get", return_value=response)
+    return mock.patch("beanprice.net_utils.get", return_value=response)
 
 
 class CoinbasePriceFetcher(unittest.TestCase):
@@ -14,13 +14,22 @@ https://docs.coincap.io/
 
 from datetime import datetime, timezone, timedelta
 import math
+import threading
 from decimal import Decimal
 from typing import List, Optional, Dict
-import requests
+from beanprice import net_utils
 from beanprice import source
 
 API_BASE_URL = "https://api.coincap.io/v2/"
 
+# The cache key and expiration of the index of currency ids by symbol.
+ASSET_INDEX_KEY = "beanprice.sources.coincap:asset_index"
+ASSET_INDEX_EXPIRATION = timedelta(days=7)
+
+# The index of currency ids by symbol, once built in this process.
+_ASSET_INDEX: Optional[Dict[str, str]] = None
+_ASSET_INDEX_LOCK = threading.Lock()
+
 
 class CoincapError(ValueError):
     "An error from the Coincap importer."
@@ -34,31 +43,52 @@ def get_asset_list() -> List[Dict[str, str]]:
     """
     path = "assets/"
     url = API_BASE_URL + path
-    response = requests.get(url)
+    response = net_utils.get(url)
     data = response.json()["data"]
     return data
 
 
-def get_currency_id(currency: str) -> Optional[str]:
+def get_asset_index(cache=None) -> Dict[str, str]:
+    """
+    Get the index of Coincap ids by ticker symbol. The index is built once per
+    process and persisted in the given cache, if any, for ASSET_INDEX_EXPIRATION.
+    Ambiguous symbols map to the currency with the highest market cap.
+    """
+    global _ASSET_INDEX
+    with _ASSET_INDEX_LOCK:
+        if _ASSET_INDEX is None:
+            index = cache.get(ASSET_INDEX_KEY) if cache is not None else None
+            if index is None:
+                index = {}
+                # Array is already sorted based on market cap
+                for coin in get_asset_list():
+                    index.setdefault(coin["symbol"], coin["id"])
+                if cache is not None:
+                    cache.set(
+                        ASSET_INDEX_KEY,
+                        index,
+                        expire=ASSET_INDEX_EXPIRATION.total_seconds(),
+                    )
+            _ASSET_INDEX = index
+        return _ASSET_INDEX
+
+
+def get_currency_id(currency: str, cache=None) -> Optional[str]:
     """
     Find currency ID by its symbol.
     If results are ambiguous, select currency with the highest market cap
     """
-    # Array is already sorted based on market cap
-    for coin in get_asset_list():
-        if coin["symbol"] == currency:
-            return coin["id"]
-    return None
+    return get_asset_index(cache).get(currency)
 
 
-def resolve_currency_id(base_currency: str) -> str:
+def resolve_currency_id(base_currency: str, cache=None) -> str:
     """
     Obtain the currency ID from the ticker, which can either already be a
     currency id (bitcoin), or a coin ticker (BTC).
     """
     if base_currency.isupper():
         # Try to find currency ID by its symbol
-        base_currency_id = get_currency_id(base_currency)
+        base_currency_id = get_currency_id(base_currency, cache)
         if not isinstance(base_currency_id, str):
             raise CoincapError(
                 f"Could not find currency id with ticker '{base_currency}'"
@@ -68,13 +98,13 @@ def resolve_currency_id(base_currency: str) -> str:
         return base_currency
 
 
-def get_latest_price(base_currency: str) -> source.SourcePrice:
+def get_latest_price(base_currency: str, cache=None) -> source.SourcePrice:
     """
     Get the latest available price for a given currency.
     """
     path = "assets/"
-    url = f"{API_BASE_URL}{path}{resolve_currency_id(base_currency)}"
-    response = requests.get(url)
+    url = f"{API_BASE_URL}{path}{resolve_currency_id(base_currency, cache)}"
+    response = net_utils.get(url)
     data = response.json()
     time = datetime.fromtimestamp(data["timestamp"] / 1000.0).replace(
         tzinfo=timezone.utc
@@ -93,7 +123,7 @@ def get_price_series(
         "end": str(math.ceil(time_end.timestamp() * 1000.0)),
     }
     url = API_BASE_URL + path
-    response = requests.get(url, params=params)
+    response = net_utils.get(url, params=params)
     return [
         source.SourcePrice(
             Decimal(item["priceUsd"]),
@@ -110,7 +140,7 @@ class Source(source.Source):
     or by their ticker (BTC), in which case the highest ranked coin will be picked."""
 
     def get_latest_price(self, ticker) -> source.SourcePrice:
-        return get_latest_price(ticker)
+        return get_latest_price(ticker, self.cache)
 
     def get_historical_price(
         self, ticker: str, time: datetime
@@ -130,4 +160,6 @@ class Source(source.Source):
     def get_prices_series(
         self, ticker: str, time_begin: datetime, time_end: datetime
     ) -> List[source.SourcePrice]:
-        return get_price_series(resolve_currency_id(ticker), time_begin, time_end)
+        return get_price_series(
+            resolve_currency_id(ticker, self.cache), time_begin, time_end
+        )
@@ -99,7 +99,7 @@ def response(content, status_code=requests.codes.ok):
     response.status_code = status_code
     response.text = ""
     response.json.return_value = content
-    return mock.patch("requests.get", return_value=response)
+    return mock.patch("beanprice.net_utils.get", return_value=response)
 
 
 class Source(unittest.TestCase):
@@ -147,6 +147,38 @@ class Source(unittest.TestCase):
             )
             self.assertEqual("USD", srcprices[0].quote_currency)
 
+    @mock.patch.object(coincap, "_ASSET_INDEX", None)
+    def test_resolve_currency_id__index(self):
+        assets = {
+            "data": [
+                {"id": "bitcoin", "symbol": "BTC"},
+                {"id": "ethereum", "symbol": "ETH"},
+                {"id": "bitcoin-clone", "symbol": "BTC"},
+            ]
+        }
+        cache = mock.MagicMock()
+        cache.get.return_value = None
+        with response(content=assets) as get:
+            self.assertEqual("bitcoin", coincap.resolve_currency_id("BTC", cache))
+            self.assertEqual("ethereum", coincap.resolve_currency_id("ETH", cache))
+            self.assertEqual("bitcoin", coincap.resolve_currency_id("bitcoin", cache))
+            with self.assertRaises(coincap.CoincapError):
+                coincap.resolve_currency_id("XYZ", cache)
+        self.assertEqual(1, get.call_count)
+        cache.set.assert_called_once_with(
+            coincap.ASSET_INDEX_KEY,
+            {"BTC": "bitcoin", "ETH": "ethereum"},
+            expire=coincap.ASSET_INDEX_EXPIRATION.total_seconds(),
+        )
+
+    @mock.patch.object(coincap, "_ASSET_INDEX", None)
+    def test_resolve_currency_id__cached_index(self):
+        cache = mock.MagicMock()
+        cache.get.return_value = {"BTC": "bitcoin"}
+        with mock.patch("beanprice.net_utils.get") as get:
+            self.assertEqual("bitcoin", coincap.resolve_currency_id("BTC", cache))
+        self.assertFalse(get.called)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -9,11 +9,13 @@ Here is the API documentation:
 https://coinmarketcap.com/api/documentation/v1/
 """
 
+import collections
 from decimal import Decimal
 import re
 from os import environ
 import requests
 from dateutil.parser import parse
+from beanprice import net_utils
 from beanprice import source
 
 
@@ -35,40 +37,69 @@ def _parse_ticker(ticker):
     return match.groups()
 
 
-class Source(source.Source):
-    def get_latest_price(self, ticker):
-        symbol, base = _parse_ticker(ticker)
-        headers = {
-            "X-CMC_PRO_API_KEY": environ["COINMARKETCAP_API_KEY"],
-        }
-        params = {
-            "symbol": symbol,
-            "convert": base,
-        }
-
-        resp = requests.get(
-            url="https://pro-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest",
-            params=params,
-            headers=headers,
+def _fetch_quotes(symbols, base):
+    """Fetch the latest quotes for many symbols in a single quote currency.
+
+    Args:
+      symbols: A list of strings, the symbols to fetch.
+      base: A string, the currency to convert the quotes to.
+    Returns:
+      A dict of symbol to SourcePrice, for the symbols in the response.
+    """
+    headers = {
+        "X-CMC_PRO_API_KEY": environ["COINMARKETCAP_API_KEY"],
+    }
+    params = {
+        "symbol": ",".join(symbols),
+        "convert": base,
+    }
+
+    resp = net_utils.get(
+        url="https://pro-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest",
+        params=params,
+        headers=headers,
+    )
+    if resp.status_code != requests.codes.ok:
+        raise CoinmarketcapApiError(
+            "Invalid response ({}): {}".format(resp.status_code, resp.text)
         )
-        if resp.status_code != requests.codes.ok:
-            raise CoinmarketcapApiError(
-                "Invalid response ({}): {}".format(resp.status_code, resp.text)
-            )
-        data = resp.json()
-        if data["status"]["error_code"] != 0:
-            status = data["status"]
-            raise CoinmarketcapApiError(
-                "Invalid response ({}): {}".format(
-                    status["error_code"], status["error_message"]
-                )
+    data = resp.json()
+    if data["status"]["error_code"] != 0:
+        status = data["status"]
+        raise CoinmarketcapApiError(
+            "Invalid response ({}): {}".format(
+                status["error_code"], status["error_message"]
             )
+        )
 
+    prices = {}
+    for symbol in symbols:
+        if symbol not in data["data"]:
+            continue
         quote = data["data"][symbol]["quote"][base]
         price = Decimal(str(quote["price"]))
         date = parse(quote["last_updated"])
+        prices[symbol] = source.SourcePrice(price, date, base)
+    return prices
+
+
+class Source(source.Source):
+    def get_latest_price(self, ticker):
+        symbol, base = _parse_ticker(ticker)
+        return _fetch_quotes([symbol], base).get(symbol, None)
+
+    def get_latest_prices(self, tickers):
+        # Quotes are requested in a single quote currency at a time.
+        symbols_by_base = collections.defaultdict(list)
+        for ticker in tickers:
+            symbol, base = _parse_ticker(ticker)
+            symbols_by_base[base].append(symbol)
 
-        return source.SourcePrice(price, date, base)
+        prices = {}
+        for base, symbols in symbols_by_base.items():
+            for symbol, srcprice in _fetch_quotes(symbols, base).items():
+                prices["{}-{}".format(symbol, base)] = srcprice
+        return prices
 
     def get_historical_price(self, ticker, time):
         return None
@@ -16,7 +16,7 @@ def response(contents, status_code=requests.codes.ok):
     response.status_code = status_code
     response.text = ""
     response.json.return_value = contents
-    return mock.patch("requests.get", return_value=response)
+    return mock.patch("beanprice.net_utils.get", return_value=response)
 
 
 class CoinmarketcapPriceFetcher(unittest.TestCase):
@@ -69,6 +69,39 @@ class CoinmarketcapPriceFetcher(unittest.TestCase):
             self.assertEqual(Decimal("1234.56"), srcprice.price)
             self.assertEqual("CHF", srcprice.quote_currency)
 
+    def test_valid_response_many(self):
+        contents = {
+            "data": {
+                "BTC": {
+                    "quote": {
+                        "CHF": {
+                            "price": 1234.56,
+                            "last_updated": "2018-08-09T21:56:28.000Z",
+                        }
+                    }
+                },
+                "ETH": {
+                    "quote": {
+                        "CHF": {
+                            "price": 345.67,
+                            "last_updated": "2018-08-09T21:56:28.000Z",
+                        }
+                    }
+                },
+            },
+            "status": {
+                "error_code": 0,
+                "error_message": "",
+            },
+        }
+        with response(contents) as get:
+            srcprices = coinmarketcap.Source().get_latest_prices(["BTC-CHF", "ETH-CHF"])
+            self.assertEqual(1, get.call_count)
+            self.assertEqual("BTC,ETH", get.call_args[1]["params"]["symbol"])
+            self.assertEqual(Decimal("1234.56"), srcprices["BTC-CHF"].price)
+            self.assertEqual(Decimal("345.67"), srcprices["ETH-CHF"].price)
+            self.assertEqual("CHF", srcprices["ETH-CHF"].quote_currency)
+
 
 if __name__ == "__main__":
     unittest.main()
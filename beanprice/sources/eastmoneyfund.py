@@ -19,7 +19,9 @@ Timezone information: the http API requests GMT+8,
 import datetime
 import re
 from decimal import Decimal
+from typing import Iterator, List, Tuple
 import requests
+from beanprice import net_utils
 from beanprice import source
 
 
@@ -43,83 +45,145 @@ class EastMoneyFundError(ValueError):
 UnsupportTickerError = EastMoneyFundError("header not match, dont support this ticker type")
 
 
+# The number of rows in each page of results.
+PAGE_SIZE = 30
+
+TR_RE = re.compile(r"<tr>(.*?)</tr>")
+ITEM_RE = re.compile(
+    r"<td>(\d{4}-\d{2}-\d{2})</td><td.*?>(.*?)</td><td.*?>(.*?)</td>"
+    "<td.*?>(.*?)</td><td.*?>(.*?)</td><td.*?>(.*?)</td><td.*?></td>",
+    re.X,
+)
+HEADER_RE = re.compile(
+    r"<th.*?净值日期</th><th>单位净值</th><th>累计净值</th><th>日增长率</th>"
+    "<th>申购状态</th><th>赎回状态</th>.*?分红送配</th>"
+)
+RECORDS_RE = re.compile(r"records:(\d+)")
+
+
+def parse_records(page):
+    """Return the total number of rows of a query, from any of its pages.
+
+    Raises:
+      EastMoneyFundError: If the page has no count of rows.
+    """
+    match = RECORDS_RE.search(page)
+    if match is None:
+        raise EastMoneyFundError("Invalid response: no count of records")
+    return int(match.group(1))
+
+
 def parse_page(page):
-    tr_re = re.compile(r"<tr>(.*?)</tr>")
-    item_re = re.compile(
-        r"<td>(\d{4}-\d{2}-\d{2})</td><td.*?>(.*?)</td><td.*?>(.*?)</td>"
-        "<td.*?>(.*?)</td><td.*?>(.*?)</td><td.*?>(.*?)</td><td.*?></td>",
-        re.X,
-    )
-    header_match = re.compile(
-        r"<th.*?净值日期</th><th>单位净值</th><th>累计净值</th><th>日增长率</th>"
-        "<th>申购状态</th><th>赎回状态</th>.*?分红送配</th>"
-    )
-    table = tr_re.findall(page)
-    if not header_match.match(table[0]):
+    """Generate the (time, price) rows of a page, as they are parsed.
+
+    Parsing stops at the first row which cannot be parsed, such as the row
+    telling that there is no data.
+
+    Raises:
+      EastMoneyFundError: If the table of the page is not supported.
+    """
+    rows = TR_RE.finditer(page)
+    header = next(rows, None)
+    if header is None or not HEADER_RE.match(header.group(1)):
         raise UnsupportTickerError
-    try:
-        table = [
-            (
-                datetime.datetime.fromisoformat(t[0]).replace(hour=15, tzinfo=TIMEZONE),
-                Decimal(t[1]),
-            )
-            for t in [item_re.match(x).groups() for x in table[1:]]
-        ]
-    except AttributeError:
-        return None
-    return table
+    for row in rows:
+        match = ITEM_RE.match(row.group(1))
+        if match is None:
+            return
+        date, price = match.group(1, 2)
+        yield (
+            datetime.datetime.fromisoformat(date).replace(hour=15, tzinfo=TIMEZONE),
+            Decimal(price),
+        )
+
+
+def fetch_page(
+    ticker: str, time_begin: datetime.datetime, time_end: datetime.datetime, page: int
+) -> str:
+    """Fetch a page of the prices of a fund between two times.
+
+    Raises:
+      EastMoneyFundError: If the request fails.
+    """
+    base_url = "https://fundf10.eastmoney.com/F10DataApi.aspx"
+    query = {
+        "code": ticker,
+        "page": str(page),
+        "sdate": time_begin.astimezone(TIMEZONE).date().isoformat(),
+        "edate": time_end.astimezone(TIMEZONE).date().isoformat(),
+        "type": "lsjz",
+        "per": str(PAGE_SIZE),
+    }
+    response = net_utils.get(base_url, params=query, headers=headers)
+    if response.status_code != requests.codes.ok:
+        raise EastMoneyFundError(
+            f"Invalid response ({response.status_code}): {response.text}"
+        )
+    return response.text
+
+
+def iter_price_series(
+    ticker: str, time_begin: datetime.datetime, time_end: datetime.datetime
+) -> Iterator[Tuple[datetime.datetime, Decimal]]:
+    """Generate the (time, price) rows of a fund between two times, newest first.
+
+    The number of pages is read from the first page, and the remaining pages
+    are fetched one after the other in the calling thread, as the rows are
+    consumed, so that a query makes a single request at a time within the
+    driver's limits for this source. The rows stop at the first page without
+    any.
+
+    Raises:
+      EastMoneyFundError: If the query has no results.
+    """
+    first_page = fetch_page(ticker, time_begin, time_end, 1)
+    records = parse_records(first_page)
+    rows = parse_page(first_page)
+    first_row = next(rows, None)
+    if records == 0 or first_row is None:
+        raise EastMoneyFundError(
+            f"Invalid ticker {ticker} or "
+            f"search day {time_begin.date().isoformat()}~{time_end.date().isoformat()}"
+        )
+    yield first_row
+    yield from rows
+
+    pages = -(-records // PAGE_SIZE)
+    for page in range(2, pages + 1):
+        page_rows = parse_page(fetch_page(ticker, time_begin, time_end, page))
+        first_row = next(page_rows, None)
+        if first_row is None:
+            break
+        yield first_row
+        yield from page_rows
 
 
 def get_price_series(
     ticker: str, time_begin: datetime.datetime, time_end: datetime.datetime
-):
-    base_url = "https://fundf10.eastmoney.com/F10DataApi.aspx"
-    time_delta_day = (time_end - time_begin).days + 1
-    pages = time_delta_day // 30 + 1
-    res = []
-    for page in range(1, pages + 1):
-        query = {
-            "code": ticker,
-            "page": str(page),
-            "sdate": time_begin.astimezone(TIMEZONE).date().isoformat(),
-            "edate": time_end.astimezone(TIMEZONE).date().isoformat(),
-            "type": "lsjz",
-            "per": str(30),
-        }
-        response = requests.get(base_url, params=query, headers=headers)
-        if response.status_code != requests.codes.ok:
-            raise EastMoneyFundError(
-                f"Invalid response ({response.status_code}): {response.text}"
-            )
-
-        price = parse_page(response.text)
-        if price is None and page == 1:
-            raise EastMoneyFundError(
-                f"Invalid ticker {ticker} or "
-                f"search day {time_begin.date().isoformat()}~{time_end.date().isoformat()}"
-            )
-        if price is None:
-            break
-        res.extend(price)
-    return res
+) -> List[Tuple[datetime.datetime, Decimal]]:
+    """Return the (time, price) rows of a fund between two times, newest first.
+
+    See iter_price_series().
+    """
+    return list(iter_price_series(ticker, time_begin, time_end))
 
 
 class Source(source.Source):
     def get_latest_price(self, ticker):
         end_time = datetime.datetime.now(TIMEZONE)
         begin_time = end_time - datetime.timedelta(days=10)
-        prices = get_price_series(ticker, begin_time, end_time)
-        last_price = prices[0]
+        last_price = next(iter_price_series(ticker, begin_time, end_time))
         return source.SourcePrice(last_price[1], last_price[0], CURRENCY)
 
     def get_historical_price(self, ticker, time):
-        prices = get_price_series(ticker, time - datetime.timedelta(days=10), time)
-        last_price = prices[0]
+        last_price = next(
+            iter_price_series(ticker, time - datetime.timedelta(days=10), time)
+        )
         return source.SourcePrice(last_price[1], last_price[0], CURRENCY)
 
     def get_prices_series(self, ticker, time_begin, time_end):
         res = [
             source.SourcePrice(x[1], x[0], CURRENCY)
-            for x in get_price_series(ticker, time_begin, time_end)
+            for x in iter_price_series(ticker, time_begin, time_end)
         ]
         return sorted(res, key=lambda x: x.time)
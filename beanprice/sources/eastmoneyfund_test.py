@@ -30,7 +30,7 @@ def response(contents, status_code=requests.codes.ok):
     response = mock.Mock()
     response.status_code = status_code
     response.text = contents
-    return mock.patch("requests.get", return_value=response)
+    return mock.patch("beanprice.net_utils.get", return_value=response)
 
 
 class EastMoneyFundFetcher(unittest.TestCase):
@@ -90,6 +90,50 @@ class EastMoneyFundFetcher(unittest.TestCase):
                 srcprice[0].time,
             )
 
+    def test_get_price_series__pages(self):
+        # The page count is read from the first page, then the others are fetched.
+        pages = {
+            "1": CONTENTS.replace("records:16,pages:1", "records:75,pages:3"),
+            "2": CONTENTS.replace("5.1890", "6.1890"),
+            "3": CONTENTS.replace("5.1890", "7.1890"),
+        }
+
+        def get(unused_url, params, **unused_kwargs):
+            response = mock.Mock()
+            response.status_code = requests.codes.ok
+            response.text = pages[params["page"]]
+            return response
+
+        with mock.patch("beanprice.net_utils.get", side_effect=get) as mock_get:
+            time = datetime.datetime(2020, 10, 9, tzinfo=tz.tzutc())
+            prices = eastmoneyfund.get_price_series(
+                "377240", time - datetime.timedelta(days=100), time
+            )
+        self.assertEqual(3, mock_get.call_count)
+        self.assertEqual(48, len(prices))
+        self.assertEqual(
+            [Decimal("5.1890"), Decimal("6.1890"), Decimal("7.1890")],
+            [price for _, price in prices[::16]],
+        )
+
+    def test_get_price_series__invalid_row(self):
+        # Parsing stops at a row which cannot be parsed.
+        contents = CONTENTS.replace(
+            "<tr><td>2020-09-29</td>", "<tr><td>暂无数据</td></tr><tr><td>2020-09-29</td>"
+        )
+        with response(contents):
+            prices = eastmoneyfund.get_price_series(
+                "377240", datetime.datetime.now(), datetime.datetime.now()
+            )
+        self.assertEqual([Decimal("5.1890"), Decimal("4.9840")], [p for _, p in prices])
+
+    def test_get_price_series__no_records(self):
+        with response(CONTENTS.replace("records:16", "records:0")):
+            with self.assertRaises(eastmoneyfund.EastMoneyFundError):
+                eastmoneyfund.get_price_series(
+                    "377240", datetime.datetime.now(), datetime.datetime.now()
+                )
+
 
 if __name__ == "__main__":
     unittest.main()
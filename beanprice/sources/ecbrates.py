@@ -12,18 +12,26 @@ Timezone information: Input and output datetimes are specified via UTC
 timestamps.
 """
 
-from decimal import Decimal, getcontext
+from decimal import Context, Decimal
 
-import re
+import bisect
+import collections
 import csv
+import datetime
+import re
+import threading
 from io import StringIO
 from dateutil.tz import tz
 from dateutil.parser import parse
 import requests
 
+from beanprice import net_utils
 from beanprice import source
 
 
+INF = Decimal("Infinity")
+
+
 class ECBRatesError(ValueError):
     "An error from the ECB Rates."
 
@@ -42,67 +50,76 @@ def _parse_ticker(ticker):
     return match.groups()
 
 
-def _get_rate_EUR_to_CCY(currency, date):
-    # Call API
-    symbol = f"D.{currency}.EUR.SP00.A"
-    params = {"format": "csvdata", "detail": "full", "lastNObservations": 1}
-    if date is not None:
-        params["endPeriod"] = date
-    url = f"https://data-api.ecb.europa.eu/service/data/EXR/{symbol}"
-    response = requests.get(url, params=params)
+# The key of the daily reference rates from EUR to all the currencies.
+RATES_KEY = "D..EUR.SP00.A"
+
+# How far back before a date to look for the latest rate, in order to bridge
+# weekends and holidays.
+LOOKBACK = datetime.timedelta(days=7)
+
+ONE_DAY = datetime.timedelta(days=1)
+
+
+def _fetch_rates(params):
+    """Fetch the reference rates from EUR to all the currencies in a single table.
+
+    Args:
+      params: A dict of additional query parameters, selecting the dates.
+    Returns:
+      A dict of currency to a list of (date, rate, precision) tuples sorted by
+      date, where date is an ISO date string.
+    """
+    params = {"format": "csvdata", "detail": "full", **params}
+    url = f"https://data-api.ecb.europa.eu/service/data/EXR/{RATES_KEY}"
+    response = net_utils.get(url, params=params)
     if response.status_code != requests.codes.ok:
         raise ECBRatesError(
             f"Invalid response ({response.status_code}): {response.text}"
         )
 
-    # Parse results to a DictReader iterator
-    results = csv.DictReader(StringIO(response.text))
-
-    # Retrieve exchange rate
-    try:
-        observation = next(results)
-    except StopIteration:
-        # When there's no data for a given date, an empty string is returned
-        return None, None, None
-    else:
-        # Checking only the first observation and raising errors if there's a date mismatch
+    # Parse results to a DictReader iterator. When there's no data for the given
+    # dates, an empty string is returned.
+    rates = collections.defaultdict(list)
+    for observation in csv.DictReader(StringIO(response.text)):
         rate = observation.get("OBS_VALUE")
-        obs_date = observation.get("TIME_PERIOD")
+        if not rate:
+            continue
         decimals = observation.get("DECIMALS")
         precision = int(decimals) + len(rate.split(".")[0].lstrip("0"))
-        return Decimal(rate), obs_date, precision
+        rates[observation["CURRENCY"]].append(
+            (observation["TIME_PERIOD"], Decimal(rate), precision)
+        )
+    for observations in rates.values():
+        observations.sort()
+    return rates
+
+
+# The rate from EUR to itself, with its date and precision.
+EUR_RATE = (Decimal(1), None, 28)
 
 
-def _get_quote(ticker, date):
-    base, symbol = _parse_ticker(ticker)
+def _get_cross_rate(base, symbol, base_rate, symbol_rate):
+    """Derive the rate between two currencies from their rates from EUR.
 
+    Args:
+      base: A string, the base currency.
+      symbol: A string, the quote currency.
+      base_rate: A tuple of the rate from EUR to the base currency, the ISO date
+        string of its observation and its precision. The date is None for EUR.
+      symbol_rate: A similar tuple for the quote currency.
+    Returns:
+      A SourcePrice instance.
+    Raises:
+      ECBRatesError: If the rates are missing or for different dates.
+    """
     if base == symbol:
         raise ECBRatesError(
             f"Base currency {base} must be different than symbol currency {symbol}"
         )
-
-    # Get EUR rates by calling the API (or use defaults)
-    if base == "EUR" and symbol != "EUR":
-        eur_to_symbol, symbol_rate_date, symbol_rate_precision = _get_rate_EUR_to_CCY(
-            symbol, date
-        )
-        eur_to_base = Decimal(1)
-        base_rate_date = symbol_rate_date
-        base_rate_precision = 28
-    elif base != "EUR" and symbol == "EUR":
-        eur_to_base, base_rate_date, base_rate_precision = _get_rate_EUR_to_CCY(
-            base, date
-        )
-        eur_to_symbol = Decimal(1)
-        symbol_rate_date = base_rate_date
-        symbol_rate_precision = 28
-    else:
-        eur_to_base, base_rate_date, base_rate_precision = _get_rate_EUR_to_CCY(
-            base, date
-        )
-        eur_to_symbol, symbol_rate_date, symbol_rate_precision = _get_rate_EUR_to_CCY(
-            symbol, date
-        )
+    eur_to_base, base_rate_date, base_rate_precision = base_rate
+    eur_to_symbol, symbol_rate_date, symbol_rate_precision = symbol_rate
+    base_rate_date = base_rate_date or symbol_rate_date
+    symbol_rate_date = symbol_rate_date or base_rate_date
 
     # Raise error if retrieved subrates for differnt dates
     if base_rate_date != symbol_rate_date:
@@ -120,18 +137,156 @@ vs. ({symbol}, {symbol_rate_date})"
 
     # Derive precision from sunrates (must be at least 5)
     minimal_precision = 5
-    getcontext().prec = max(
-        minimal_precision, min(base_rate_precision, symbol_rate_precision)
+    context = Context(
+        prec=max(minimal_precision, min(base_rate_precision, symbol_rate_precision))
     )
-    price = eur_to_symbol / eur_to_base
+    price = context.divide(eur_to_symbol, eur_to_base)
     time = parse(base_rate_date).replace(tzinfo=tz.tzutc())
     return source.SourcePrice(price, time, symbol)
 
 
 class Source(source.Source):
+    """A source for the ECB reference rates.
+
+    The rates from EUR to all the currencies are fetched together and kept in
+    memory over a contiguous span of dates, which grows to cover the dates
+    requested, so that all the pairs requested are derived from the same rates.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latest = None
+        self._rates = collections.defaultdict(list)
+        # The first and last dates of the rates fetched so far, which are kept
+        # contiguous, or None.
+        self._span = None
+
+    def _get_latest_rates(self):
+        """Return the table of the latest rates.
+
+        Returns:
+          A dict of currency to a list of a single (date, rate, precision) tuple.
+        """
+        with self._lock:
+            if self._latest is None:
+                self._latest = _fetch_rates({"lastNObservations": 1})
+            return self._latest
+
+    def _extend(self, begin, end):
+        """Fetch the rates between two dates which were not fetched yet.
+
+        The dates between the rates fetched so far and the new ones are fetched
+        as well. This must be called with the lock held.
+
+        Args:
+          begin: A datetime.date instance, the first date to fetch.
+          end: A datetime.date instance, the last date to fetch.
+        """
+        spans = []
+        if self._span is None:
+            spans.append((begin, end))
+        else:
+            start, stop = self._span
+            if begin < start:
+                spans.append((begin, start - ONE_DAY))
+            if end > stop:
+                spans.append((stop + ONE_DAY, end))
+            begin, end = min(begin, start), max(end, stop)
+        for span_begin, span_end in spans:
+            params = {
+                "startPeriod": span_begin.isoformat(),
+                "endPeriod": span_end.isoformat(),
+            }
+            for currency, observations in _fetch_rates(params).items():
+                merged = dict.fromkeys(self._rates[currency])
+                merged.update(dict.fromkeys(observations))
+                self._rates[currency] = sorted(merged)
+        self._span = (begin, end)
+
+    def _find_rate(self, currency, date):
+        """Return the latest rate fetched from EUR to a currency at a date, or None."""
+        observations = self._rates.get(currency, [])
+        index = bisect.bisect_right(observations, (date.isoformat(), INF))
+        return observations[index - 1] if index else None
+
+    def _get_historical_rate(self, currency, date):
+        """Return the latest rate from EUR to a currency at a date, or None."""
+        with self._lock:
+            if self._span is None or date < self._span[0]:
+                self._extend(date - LOOKBACK, date)
+            else:
+                self._extend(date, date)
+            observation = self._find_rate(currency, date)
+
+            # The latest rate at the date may predate the rates fetched so far.
+            if observation is None and self._span[0] > date - LOOKBACK:
+                self._extend(date - LOOKBACK, date)
+                observation = self._find_rate(currency, date)
+            return observation
+
+    def _get_rate_EUR_to_CCY(self, currency, date):
+        """Return the latest rate from EUR to a currency at a date.
+
+        Args:
+          currency: A string, the currency.
+          date: A datetime.date instance, or None for the latest rate.
+        Returns:
+          A tuple of the rate, the ISO date string of the observation and its
+          precision, or a tuple of None if there is no rate.
+        """
+        if currency == "EUR":
+            return EUR_RATE
+        if date is None:
+            observations = self._get_latest_rates().get(currency, [])
+            observation = observations[-1] if observations else None
+        else:
+            observation = self._get_historical_rate(currency, date)
+        if observation is None:
+            return None, None, None
+        obs_date, rate, precision = observation
+        return rate, obs_date, precision
+
+    def _get_quote(self, ticker, date):
+        base, symbol = _parse_ticker(ticker)
+        return _get_cross_rate(
+            base,
+            symbol,
+            self._get_rate_EUR_to_CCY(base, date),
+            self._get_rate_EUR_to_CCY(symbol, date),
+        )
 
     def get_latest_price(self, ticker):
-        return _get_quote(ticker, None)
+        return self._get_quote(ticker, None)
 
     def get_historical_price(self, ticker, time):
-        return _get_quote(ticker, time.date().isoformat())
+        return self._get_quote(ticker, time.date())
+
+    def get_prices_series(self, ticker, time_begin, time_end):
+        base, symbol = _parse_ticker(ticker)
+        begin, end = time_begin.date(), time_end.date()
+
+        # The rates of each currency other than EUR within the dates, by date, from
+        # the table shared with the historical prices. Only the dates with rates for
+        # both currencies yield a price.
+        with self._lock:
+            self._extend(begin, end)
+            legs = {
+                currency: {
+                    obs_date: (rate, obs_date, precision)
+                    for obs_date, rate, precision in self._rates.get(currency, [])
+                    if begin.isoformat() <= obs_date <= end.isoformat()
+                }
+                for currency in (base, symbol)
+                if currency != "EUR"
+            }
+        dates = set.intersection(*map(set, legs.values())) if legs else set()
+        series = [
+            _get_cross_rate(
+                base,
+                symbol,
+                legs.get(base, {}).get(obs_date, EUR_RATE),
+                legs.get(symbol, {}).get(obs_date, EUR_RATE),
+            )
+            for obs_date in sorted(dates)
+        ]
+        return [srcprice for srcprice in series if time_begin <= srcprice.time <= time_end]
@@ -24,13 +24,30 @@ EXR.D.SEK.EUR.SP00.A,D,SEK,EUR,SP00,A,2024-12-06,11.523,A,F,,,P1D,,A,,,,,,,,,,4,
 Swedish krona,"ECB reference exchange rate, Euro/Swedish krona, 2:15 pm (C.E.T.)",SEK,0
 """
 
+ECB_CSV_MULTI = """KEY,FREQ,CURRENCY,CURRENCY_DENOM,EXR_TYPE,EXR_SUFFIX,TIME_PERIOD,OBS_VAL\
+UE,DECIMALS
+EXR.D.SEK.EUR.SP00.A,D,SEK,EUR,SP00,A,2024-12-05,11.5,4
+EXR.D.SEK.EUR.SP00.A,D,SEK,EUR,SP00,A,2024-12-06,11.523,4
+EXR.D.USD.EUR.SP00.A,D,USD,EUR,SP00,A,2024-12-05,1.05,4
+EXR.D.USD.EUR.SP00.A,D,USD,EUR,SP00,A,2024-12-06,1.0581,4
+"""
+
+ECB_CSV_HEADER = (
+    "KEY,FREQ,CURRENCY,CURRENCY_DENOM,EXR_TYPE,EXR_SUFFIX,TIME_PERIOD,OBS_VALUE,DECIMALS"
+)
+ECB_CSV_JAN = [
+    "EXR.D.USD.EUR.SP00.A,D,USD,EUR,SP00,A,2024-01-05,1.0921,4",
+    "EXR.D.USD.EUR.SP00.A,D,USD,EUR,SP00,A,2024-01-08,1.0946,4",
+    "EXR.D.USD.EUR.SP00.A,D,USD,EUR,SP00,A,2024-01-12,1.0968,4",
+]
+
 
 def response(contents, status_code=requests.codes.ok):
     """Return a context manager to patch a CSV response."""
     response = mock.Mock()
     response.status_code = status_code
     response.text = contents
-    return mock.patch("requests.get", return_value=response)
+    return mock.patch("beanprice.net_utils.get", return_value=response)
 
 
 class ECBRatesErrorFetcher(unittest.TestCase):
@@ -75,6 +92,118 @@ class ECBRatesErrorFetcher(unittest.TestCase):
                 datetime(2024, 12, 6, 0, 0, 0, tzinfo=tz.tzutc()), srcprice.time
             )
 
+    def test_cross_rates_single_request(self):
+        time = datetime(2024, 12, 8, 16, 0, 0, tzinfo=tz.tzutc())
+        ecb_source = ecbrates.Source()
+        with response(ECB_CSV_MULTI) as get:
+            prices = [
+                ecb_source.get_historical_price(ticker, time)
+                for ticker in ("EUR-SEK", "USD-SEK", "SEK-USD", "USD-EUR")
+            ]
+            prices.append(
+                ecb_source.get_historical_price("USD-SEK", time.replace(day=5))
+            )
+        self.assertEqual(1, get.call_count)
+        self.assertEqual("D..EUR.SP00.A", get.call_args[0][0].split("/")[-1])
+        self.assertEqual(
+            [
+                Decimal("11.523"),
+                Decimal("10.890"),
+                Decimal("0.091825"),
+                Decimal("0.94509"),
+                Decimal("10.952"),
+            ],
+            [srcprice.price for srcprice in prices],
+        )
+        self.assertEqual(
+            datetime(2024, 12, 6, 0, 0, 0, tzinfo=tz.tzutc()), prices[1].time
+        )
+
+    def test_historical_price__earlier_date(self):
+        def get(url, params):
+            # Return the observations within the requested dates.
+            rows = [
+                row
+                for row in ECB_CSV_JAN
+                if params["startPeriod"] <= row.split(",")[6] <= params["endPeriod"]
+            ]
+            return mock.Mock(
+                status_code=requests.codes.ok, text="\n".join([ECB_CSV_HEADER] + rows)
+            )
+
+        ecb_source = ecbrates.Source()
+        with mock.patch("beanprice.net_utils.get", side_effect=get) as mock_get:
+            prices = [
+                ecb_source.get_historical_price(
+                    "EUR-USD", datetime(2024, 1, day, 12, 0, 0, tzinfo=tz.tzutc())
+                )
+                for day in (13, 7, 9)
+            ]
+        self.assertEqual(2, mock_get.call_count)
+        self.assertEqual(
+            [
+                (datetime(2024, 1, 12, tzinfo=tz.tzutc()), Decimal("1.0968")),
+                (datetime(2024, 1, 5, tzinfo=tz.tzutc()), Decimal("1.0921")),
+                (datetime(2024, 1, 8, tzinfo=tz.tzutc()), Decimal("1.0946")),
+            ],
+            [(srcprice.time, srcprice.price) for srcprice in prices],
+        )
+
+    def test_historical_price__lookback_only(self):
+        # The first lookup only fetches the rates over the lookback before the date.
+        time = datetime(2024, 12, 9, 12, 0, 0, tzinfo=tz.tzutc())
+        with response(ECB_CSV_HIST) as get:
+            srcprice = ecbrates.Source().get_historical_price("EUR-SEK", time)
+        self.assertEqual(Decimal("11.523"), srcprice.price)
+        self.assertEqual(1, get.call_count)
+        params = get.call_args[1]["params"]
+        self.assertEqual(
+            ("2024-12-02", "2024-12-09"), (params["startPeriod"], params["endPeriod"])
+        )
+
+    def test_get_prices_series(self):
+        time_begin = datetime(2024, 12, 5, 0, 0, 0, tzinfo=tz.tzutc())
+        time_end = datetime(2024, 12, 8, 0, 0, 0, tzinfo=tz.tzutc())
+        with response(ECB_CSV_MULTI) as get:
+            series = ecbrates.Source().get_prices_series("USD-SEK", time_begin, time_end)
+        self.assertEqual(1, get.call_count)
+        self.assertEqual("D..EUR.SP00.A", get.call_args[0][0].split("/")[-1])
+        self.assertEqual(
+            [
+                (datetime(2024, 12, 5, tzinfo=tz.tzutc()), Decimal("10.952")),
+                (datetime(2024, 12, 6, tzinfo=tz.tzutc()), Decimal("10.890")),
+            ],
+            [(srcprice.time, srcprice.price) for srcprice in series],
+        )
+
+    def test_get_prices_series__shared_rates(self):
+        # The series and the historical prices are derived from the same table.
+        time_begin = datetime(2024, 12, 5, 0, 0, 0, tzinfo=tz.tzutc())
+        time_end = datetime(2024, 12, 6, 0, 0, 0, tzinfo=tz.tzutc())
+        ecb_source = ecbrates.Source()
+        with response(ECB_CSV_MULTI) as get:
+            series = ecb_source.get_prices_series("USD-SEK", time_begin, time_end)
+            srcprice = ecb_source.get_historical_price("SEK-USD", time_end)
+            series.extend(ecb_source.get_prices_series("EUR-USD", time_begin, time_end))
+        self.assertEqual(1, get.call_count)
+        self.assertEqual(
+            [
+                Decimal("10.952"),
+                Decimal("10.890"),
+                Decimal("1.05"),
+                Decimal("1.0581"),
+            ],
+            [srcprice.price for srcprice in series],
+        )
+        self.assertEqual(Decimal("0.091825"), srcprice.price)
+
+    def test_get_prices_series__eur(self):
+        time_begin = datetime(2024, 12, 6, 0, 0, 0, tzinfo=tz.tzutc())
+        time_end = datetime(2024, 12, 8, 0, 0, 0, tzinfo=tz.tzutc())
+        with response(ECB_CSV_MULTI):
+            series = ecbrates.Source().get_prices_series("SEK-EUR", time_begin, time_end)
+        self.assertEqual([Decimal("0.086783")], [srcprice.price for srcprice in series])
+
 
 if __name__ == "__main__":
     unittest.main()
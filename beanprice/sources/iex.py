@@ -15,6 +15,7 @@ from decimal import Decimal
 from dateutil import tz
 import requests
 
+from beanprice import net_utils
 from beanprice import source
 
 
@@ -22,21 +23,21 @@ class IEXError(ValueError):
     "An error from the IEX API."
 
 
-def fetch_quote(ticker):
-    """Fetch the latest price for the given ticker."""
-
-    url = "https://api.iextrading.com/1.0/tops/last?symbols={}".format(ticker.upper())
-    response = requests.get(url)
+def _fetch_results(tickers):
+    """Fetch the raw 'tops/last' results for a list of tickers."""
+    url = "https://api.iextrading.com/1.0/tops/last?symbols={}".format(
+        ",".join(ticker.upper() for ticker in tickers)
+    )
+    response = net_utils.get(url)
     if response.status_code != requests.codes.ok:
         raise IEXError(
             "Invalid response ({}): {}".format(response.status_code, response.text)
         )
+    return response, response.json()
 
-    results = response.json()
-    if len(results) != 1:
-        raise IEXError("Invalid number of responses from IEX: {}".format(response.text))
-    result = results[0]
 
+def _parse_result(result):
+    """Convert a single 'tops/last' result to a SourcePrice."""
     price = Decimal(result["price"]).quantize(Decimal("0.01"))
 
     # IEX is American markets.
@@ -48,6 +49,30 @@ def fetch_quote(ticker):
     return source.SourcePrice(price, time, "USD")
 
 
+def fetch_quote(ticker):
+    """Fetch the latest price for the given ticker."""
+    response, results = _fetch_results([ticker])
+    if len(results) != 1:
+        raise IEXError("Invalid number of responses from IEX: {}".format(response.text))
+    return _parse_result(results[0])
+
+
+def fetch_quotes(tickers):
+    """Fetch the latest prices for a list of tickers in a single request.
+
+    Returns:
+      A dict of ticker to SourcePrice, for the tickers returned by IEX.
+    """
+    _, results = _fetch_results(tickers)
+    by_symbol = {result["symbol"]: result for result in results}
+    prices = {}
+    for ticker in tickers:
+        result = by_symbol.get(ticker.upper(), None)
+        if result is not None:
+            prices[ticker] = _parse_result(result)
+    return prices
+
+
 class Source(source.Source):
     "IEX API price extractor."
 
@@ -55,6 +80,10 @@ class Source(source.Source):
         """See contract in beanprice.source.Source."""
         return fetch_quote(ticker)
 
+    def get_latest_prices(self, tickers):
+        """See contract in beanprice.source.Source."""
+        return fetch_quotes(tickers)
+
     def get_historical_price(self, ticker, time):
         """See contract in beanprice.source.Source."""
         raise NotImplementedError(
@@ -20,7 +20,7 @@ def response(contents, status_code=requests.codes.ok):
     response.status_code = status_code
     response.text = ""
     response.json.return_value = contents
-    return mock.patch("requests.get", return_value=response)
+    return mock.patch("beanprice.net_utils.get", return_value=response)
 
 
 class IEXPriceFetcher(unittest.TestCase):
@@ -47,6 +47,18 @@ class IEXPriceFetcher(unittest.TestCase):
             with date_utils.intimezone(tzname):
                 self._test_valid_response()
 
+    def test_valid_response_many(self):
+        contents = [
+            {"symbol": "HOOL", "price": 183.61, "size": 100, "time": 1590177596030},
+            {"symbol": "AAPL", "price": 318.89, "size": 100, "time": 1590177599993},
+        ]
+        with response(contents) as get:
+            srcprices = iex.fetch_quotes(["HOOL", "aapl", "MISSING"])
+            self.assertEqual(1, get.call_count)
+            self.assertEqual({"HOOL", "aapl"}, set(srcprices))
+            self.assertEqual(Decimal("183.61"), srcprices["HOOL"].price)
+            self.assertEqual(Decimal("318.89"), srcprices["aapl"].price)
+
 
 if __name__ == "__main__":
     unittest.main()
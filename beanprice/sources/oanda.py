@@ -23,6 +23,7 @@ from urllib import parse
 from decimal import Decimal
 
 from dateutil import tz
+import requests
 
 from beanprice import source
 from beanprice import net_utils
@@ -30,6 +31,11 @@ from beanprice import net_utils
 
 URL = "https://api-fxtrade.oanda.com/v1/candles"
 
+# The maximum number of candles returned by a single request.
+MAX_CANDLES = 5000
+
+ONE_DAY = datetime.timedelta(days=1)
+
 
 def _get_currencies(ticker):
     """Parse the base and quote currencies from the ticker.
@@ -45,11 +51,15 @@ def _get_currencies(ticker):
     return match.groups()
 
 
-def _fetch_candles(params):
+def _fetch_candles(params, at_close=False):
     """Fetch the given URL from OANDA and return a list of (utc-time, price).
 
     Args:
       params: A dict of URL params values.
+      at_close: If true, the candles are daily ones, and each is stamped at its
+        close time with its closing price instead of at its open time with its
+        opening price. A daily candle opens on the previous evening, so its
+        close is the price of the day it stands for.
     Returns:
       A sorted list of (time, price) points.
     """
@@ -58,10 +68,13 @@ def _fetch_candles(params):
     logging.info("Fetching '%s'", url)
 
     # Fetch the data.
-    response = net_utils.retrying_urlopen(url)
-    if response is None:
+    try:
+        response = net_utils.get(url)
+    except requests.RequestException:
         return None
-    data_string = response.read().decode("utf-8")
+    if response.status_code != requests.codes.ok:
+        return None
+    data_string = response.text
 
     # Parse it.
     data = json.loads(data_string, parse_float=Decimal)
@@ -69,17 +82,21 @@ def _fetch_candles(params):
         # Find the candle with the latest time before the given time we're searching
         # for.
         time_prices = []
-        candles = sorted(data["candles"], key=lambda candle: candle["time"])
-        for candle in candles:
+        for candle in data["candles"]:
             candle_dt_utc = datetime.datetime.strptime(
                 candle["time"], r"%Y-%m-%dT%H:%M:%S.%fZ"
             ).replace(tzinfo=tz.tzutc())
-            candle_price = Decimal(candle["openMid"])
+            if at_close:
+                candle_dt_utc += ONE_DAY
+                candle_price = Decimal(candle["closeMid"])
+            else:
+                candle_price = Decimal(candle["openMid"])
             time_prices.append((candle_dt_utc, candle_price))
     except KeyError:
         logging.error("Unexpected response data: %s", data)
         return None
-    return sorted(time_prices)
+    time_prices.sort()
+    return time_prices
 
 
 def _fetch_price(params_dict, time):
@@ -132,3 +149,43 @@ class Source(source.Source):
             "end": query_interval_end.isoformat("T"),
         }
         return _fetch_price(params_dict, time)
+
+    def get_prices_series(self, ticker, time_begin, time_end):
+        """See contract in beanprice.source.Source."""
+        _, quote_currency = _get_currencies(ticker)
+        if quote_currency is None:
+            logging.error(
+                "Invalid price source ticker '%s'; must be like 'EUR_USD'", ticker
+            )
+            return None
+
+        # Fetch daily candles, in chunks of at most the maximum number of
+        # candles a request may return. The candles are stamped at their close,
+        # so each request starts a day early to include the candles closing
+        # within the chunk.
+        time_begin = time_begin.astimezone(tz.tzutc())
+        time_now = datetime.datetime.now(tz.tzutc())
+        time_end = min(time_end.astimezone(tz.tzutc()), time_now)
+        chunk = datetime.timedelta(days=MAX_CANDLES - 2)
+        srcprices = []
+        chunk_begin = time_begin
+        while chunk_begin <= time_end:
+            chunk_end = min(chunk_begin + chunk, time_end)
+            params_dict = {
+                "instrument": ticker,
+                "granularity": "D",
+                "candleFormat": "midpoint",
+                "start": (chunk_begin - ONE_DAY).isoformat("T"),
+                "end": chunk_end.isoformat("T"),
+            }
+            time_prices = _fetch_candles(params_dict, at_close=True)
+            if time_prices is None:
+                logging.error("No prices returned.")
+                return None
+            srcprices.extend(
+                source.SourcePrice(price, time, quote_currency)
+                for time, price in time_prices
+                if chunk_begin <= time <= chunk_end
+            )
+            chunk_begin = chunk_end + datetime.timedelta(seconds=1)
+        return srcprices
@@ -22,13 +22,10 @@ UTC = tz.tzutc()
 
 
 def response(code, contents=None):
-    urlopen = mock.MagicMock(return_value=None)
-    if isinstance(contents, str):
-        response = mock.MagicMock()
-        response.read = mock.MagicMock(return_value=contents.encode("utf-8"))
-        response.getcode = mock.MagicMock(return_value=200)
-        urlopen.return_value = response
-    return mock.patch.object(net_utils, "retrying_urlopen", urlopen)
+    response = mock.MagicMock()
+    response.status_code = code
+    response.text = contents
+    return mock.patch.object(net_utils, "get", mock.MagicMock(return_value=response))
 
 
 class TestOandaMisc(unittest.TestCase):
@@ -210,5 +207,100 @@ class TestOandaGetHistorical(TimezoneTestBase, unittest.TestCase):
                 self._check_valid(datetime.date(2017, 1, 20), None, None)
 
 
+class TestOandaGetPricesSeries(unittest.TestCase):
+    def setUp(self):
+        self.fetcher = oanda.Source()
+
+    def test_invalid_ticker(self):
+        time = datetime.datetime(2017, 1, 21, tzinfo=UTC)
+        self.assertIsNone(self.fetcher.get_prices_series("NOTATICKER", time, time))
+
+    def test_no_candles(self):
+        time = datetime.datetime(2017, 1, 21, tzinfo=UTC)
+        with mock.patch.object(oanda, "_fetch_candles", return_value=None):
+            self.assertIsNone(self.fetcher.get_prices_series("USD_CAD", time, time))
+
+    def test_chunks(self):
+        # A range longer than the maximum number of candles is split in chunks.
+        def fetch_candles(params, at_close):
+            self.assertTrue(at_close)
+            start = datetime.datetime.fromisoformat(params["start"])
+            return [
+                (start, Decimal("1.1")),
+                (start + datetime.timedelta(days=1, hours=12), Decimal("1.2")),
+            ]
+
+        time_begin = datetime.datetime(2000, 1, 1, tzinfo=UTC)
+        time_end = datetime.datetime(2020, 1, 1, tzinfo=UTC)
+        with mock.patch.object(
+            oanda, "_fetch_candles", side_effect=fetch_candles
+        ) as mock_fetch:
+            srcprices = self.fetcher.get_prices_series("USD_CAD", time_begin, time_end)
+        self.assertEqual(2, mock_fetch.call_count)
+        params = [call[0][0] for call in mock_fetch.call_args_list]
+        self.assertEqual({"D"}, {param["granularity"] for param in params})
+        self.assertEqual("1999-12-31T00:00:00+00:00", params[0]["start"])
+        self.assertEqual("2013-09-07T00:00:00+00:00", params[0]["end"])
+        self.assertEqual("2013-09-06T00:00:01+00:00", params[1]["start"])
+        self.assertEqual("2020-01-01T00:00:00+00:00", params[1]["end"])
+        self.assertEqual(
+            [
+                source.SourcePrice(
+                    Decimal("1.2"), datetime.datetime(2000, 1, 1, 12, tzinfo=UTC), "CAD"
+                ),
+                source.SourcePrice(
+                    Decimal("1.2"),
+                    datetime.datetime(2013, 9, 7, 12, 0, 1, tzinfo=UTC),
+                    "CAD",
+                ),
+            ],
+            srcprices,
+        )
+
+    @response(
+        200,
+        """
+      {
+        "instrument" : "USD_CAD",
+        "granularity" : "D",
+        "candles" : [
+          {
+            "time" : "2017-01-18T22:00:00.000000Z",
+            "openMid" : 1.31955,
+            "closeMid" : 1.32865,
+            "complete" : true
+          },
+          {
+            "time" : "2017-01-19T22:00:00.000000Z",
+            "openMid" : 1.32865,
+            "closeMid" : 1.33515,
+            "complete" : true
+          }
+        ]
+      }
+    """,
+    )
+    def test_daily_candles_at_close(self):
+        # A daily candle opens on the previous evening; it stands for the day of
+        # its close, at its closing price.
+        time_begin = datetime.datetime(2017, 1, 19, tzinfo=UTC)
+        time_end = datetime.datetime(2017, 1, 21, tzinfo=UTC)
+        srcprices = self.fetcher.get_prices_series("USD_CAD", time_begin, time_end)
+        self.assertEqual(
+            [
+                source.SourcePrice(
+                    Decimal("1.32865"),
+                    datetime.datetime(2017, 1, 19, 22, tzinfo=UTC),
+                    "CAD",
+                ),
+                source.SourcePrice(
+                    Decimal("1.33515"),
+                    datetime.datetime(2017, 1, 20, 22, tzinfo=UTC),
+                    "CAD",
+                ),
+            ],
+            srcprices,
+        )
+
 if __name__ == "__main__":
     unittest.main()
@@ -33,18 +33,33 @@ __copyright__ = "Copyright (C) 2018-2020  Martin Blais"
 __license__ = "GNU GPLv2"
 
 import collections
+import csv
 import datetime
 import re
 import os
+import threading
 from decimal import Decimal
+from typing import Dict, List, Tuple
 
 from dateutil import tz
 
 import requests
 
+from beanprice import net_utils
 from beanprice import source
 
 
+# The prefix of the cache keys of the column names of the datasets, and how long
+# they are kept.
+COLUMN_NAMES_KEY = "beanprice.sources.quandl:column_names:"
+COLUMN_NAMES_EXPIRATION = datetime.timedelta(days=30)
+
+# The column names of the datasets by (database, dataset) codes, once fetched in
+# this process.
+_COLUMN_NAMES: Dict[Tuple[str, str], List[str]] = {}
+_COLUMN_NAMES_LOCK = threading.Lock()
+
+
 class QuandlError(ValueError):
     "An error from the Quandl API."
 
@@ -62,11 +77,119 @@ def parse_ticker(ticker):
     return TickerSpec(split[0], split[1], split[2].replace("_", " "))
 
 
+def find_columns(column_names, ticker_spec):
+    """Find the columns of the date and of the price of a dataset.
+
+    Args:
+      column_names: A list of strings, the names of the columns of the dataset.
+      ticker_spec: A TickerSpec instance. The price is in its column if set, or
+        else in the "Adj. Close" or "Close" column.
+    Returns:
+      A pair of the indexes of the date and price columns.
+    Raises:
+      QuandlError: If either column is missing.
+    """
+    try:
+        date_index = column_names.index("Date")
+        if ticker_spec.column is not None:
+            data_index = column_names.index(ticker_spec.column)
+        elif "Adj. Close" in column_names:
+            data_index = column_names.index("Adj. Close")
+        else:
+            data_index = column_names.index("Close")
+    except ValueError as exc:
+        raise QuandlError("Invalid columns from Quandl: {}".format(column_names)) from exc
+    return date_index, data_index
+
+
+def _get(url, payload):
+    """Fetch a Quandl API URL, raising the errors it returns.
+
+    The response is streamed, and must be closed by the caller.
+    """
+    # Add API key, if it is set in the environment.
+    if "QUANDL_API_KEY" in os.environ:
+        payload["api_key"] = os.environ["QUANDL_API_KEY"]
+
+    # Fetch and process errors, which are returned in JSON.
+    response = net_utils.get(url, params=payload, stream=True)
+    if response.status_code != requests.codes.ok:
+        try:
+            message = response.json()["quandl_error"]["message"]
+        except (ValueError, KeyError, TypeError):
+            message = response.text
+        finally:
+            response.close()
+        raise QuandlError("Invalid response ({}): {}".format(response.status_code, message))
+    return response
+
+
+def get_column_names(ticker_spec, cache=None) -> List[str]:
+    """Get the names of the columns of a dataset.
+
+    They are fetched from the metadata of the dataset once per process, and
+    persisted in the given cache, if any, for COLUMN_NAMES_EXPIRATION.
+    """
+    codes = (ticker_spec.database, ticker_spec.dataset)
+    with _COLUMN_NAMES_LOCK:
+        column_names = _COLUMN_NAMES.get(codes)
+        if column_names is None:
+            key = COLUMN_NAMES_KEY + "/".join(codes)
+            column_names = cache.get(key) if cache is not None else None
+            if column_names is None:
+                url = "https://www.quandl.com/api/v3/datasets/{}/{}/metadata.json".format(
+                    *codes
+                )
+                response = _get(url, {})
+                try:
+                    column_names = response.json()["dataset"]["column_names"]
+                finally:
+                    response.close()
+                if cache is not None:
+                    cache.set(
+                        key, column_names, expire=COLUMN_NAMES_EXPIRATION.total_seconds()
+                    )
+            _COLUMN_NAMES[codes] = column_names
+        return column_names
+
+
+def parse_csv(response, ticker_spec):
+    """Generate the prices of a CSV response from Quandl, as its rows are read.
+
+    Only the date and price columns of each row are converted.
+
+    Args:
+      response: A requests.Response instance for a dataset in CSV format.
+      ticker_spec: A TickerSpec instance, for the column of the price.
+    Yields:
+      SourcePrice instances, in the order of the rows.
+    Raises:
+      QuandlError: If the response has no header or no column for the price.
+    """
+    reader = csv.reader(response.iter_lines(decode_unicode=True))
+    column_names = next(reader, None)
+    if not column_names:
+        raise QuandlError("Empty response from Quandl")
+    date_index, data_index = find_columns(column_names, ticker_spec)
+
+    for row in reader:
+        if not row:
+            continue
+
+        # Gather time and assume it's in UTC timezone (Quandl does not provide
+        # the market's timezone).
+        time = datetime.datetime.strptime(row[date_index], "%Y-%m-%d")
+        time = time.replace(tzinfo=tz.tzutc())
+
+        # Note: There is no currency information in the response (surprising).
+        yield source.SourcePrice(Decimal(row[data_index]), time, None)
+
+
 def fetch_time_series(ticker, time=None):
-    """Fetch"""
+    """Fetch the latest price of a dataset, at or before a time if given."""
     # Create request payload.
     ticker_spec = parse_ticker(ticker)
-    url = "https://www.quandl.com/api/v3/datasets/{}/{}.json".format(
+    url = "https://www.quandl.com/api/v3/datasets/{}/{}.csv".format(
         ticker_spec.database, ticker_spec.dataset
     )
     payload = {"limit": 1}
@@ -75,48 +198,43 @@ def fetch_time_series(ticker, time=None):
         payload["start_date"] = (date - datetime.timedelta(days=10)).isoformat()
         payload["end_date"] = date.isoformat()
 
-    # Add API key, if it is set in the environment.
-    if "QUANDL_API_KEY" in os.environ:
-        payload["api_key"] = os.environ["QUANDL_API_KEY"]
-
-    # Fetch and process errors.
-    response = requests.get(url, params=payload)
-    if response.status_code != requests.codes.ok:
-        raise QuandlError(
-            "Invalid response ({}): {}".format(response.status_code, response.text)
-        )
-    result = response.json()
-    if "quandl_error" in result:
-        raise QuandlError(result["quandl_error"]["message"])
-
-    # Parse result container.
-    dataset = result["dataset"]
-    column_names = dataset["column_names"]
-    date_index = column_names.index("Date")
-    if ticker_spec.column is not None:
-        data_index = column_names.index(ticker_spec.column)
-    else:
-        try:
-            data_index = column_names.index("Adj. Close")
-        except ValueError:
-            data_index = column_names.index("Close")
-    data = dataset["data"][0]
+    response = _get(url, payload)
+    try:
+        srcprice = next(parse_csv(response, ticker_spec), None)
+    finally:
+        response.close()
+    if srcprice is None:
+        raise QuandlError("No data returned from Quandl for {}".format(ticker))
+    return srcprice
 
-    # Gather time and assume it's in UTC timezone (Quandl does not provide the
-    # market's timezone).
-    time = datetime.datetime.strptime(data[date_index], "%Y-%m-%d")
-    time = time.replace(tzinfo=tz.tzutc())
 
-    # Gather price.
-    # Quantize with the same precision default rendering of floats occur.
-    price_float = data[data_index]
-    price = Decimal(price_float)
-    match = re.search(r"(\..*)", str(price_float))
-    if match:
-        price = price.quantize(Decimal(match.group(1)))
+def fetch_series(ticker, time_begin, time_end, cache=None):
+    """Fetch the prices of a dataset between two times, in a single request.
 
-    # Note: There is no currency information in the response (surprising).
-    return source.SourcePrice(price, time, None)
+    Only the column of the price is requested.
+    """
+    ticker_spec = parse_ticker(ticker)
+    column_names = get_column_names(ticker_spec, cache)
+    _, data_index = find_columns(column_names, ticker_spec)
+    url = "https://www.quandl.com/api/v3/datasets/{}/{}.csv".format(
+        ticker_spec.database, ticker_spec.dataset
+    )
+    payload = {
+        "column_index": data_index,
+        "start_date": time_begin.date().isoformat(),
+        "end_date": time_end.date().isoformat(),
+        "order": "asc",
+    }
+    response = _get(url, payload)
+    ticker_spec = ticker_spec._replace(column=column_names[data_index])
+    try:
+        return [
+            srcprice
+            for srcprice in parse_csv(response, ticker_spec)
+            if time_begin <= srcprice.time <= time_end
+        ]
+    finally:
+        response.close()
 
 
 class Source(source.Source):
@@ -129,3 +247,7 @@ class Source(source.Source):
     def get_historical_price(self, ticker, time):
         """See contract in beanprice.source.Source."""
         return fetch_time_series(ticker, time)
+
+    def get_prices_series(self, ticker, time_begin, time_end):
+        """See contract in beanprice.source.Source."""
+        return fetch_series(ticker, time_begin, time_end, self.cache)
@@ -15,12 +15,15 @@ from beanprice.sources import quandl
 
 
 def response(contents, status_code=requests.codes.ok):
-    """Produce a context manager to patch a JSON response."""
+    """Produce a context manager to patch a CSV response, or a JSON error."""
     response = mock.Mock()
     response.status_code = status_code
     response.text = ""
-    response.json.return_value = contents
-    return mock.patch("requests.get", return_value=response)
+    if isinstance(contents, str):
+        response.iter_lines.return_value = iter(contents.splitlines())
+    else:
+        response.json.return_value = contents
+    return mock.patch("beanprice.net_utils.get", return_value=response)
 
 
 class QuandlPriceFetcher(unittest.TestCase):
@@ -59,7 +62,7 @@ class QuandlPriceFetcher(unittest.TestCase):
                 ),
             }
         }
-        with response(contents):
+        with response(contents, requests.codes.bad_request):
             with self.assertRaises(ValueError) as exc:
                 quandl.fetch_time_series("WIKI:FB", None)
                 self.assertRegex(exc.message, "premium")
@@ -75,7 +78,7 @@ class QuandlPriceFetcher(unittest.TestCase):
                 ),
             }
         }
-        with response(contents):
+        with response(contents, requests.codes.forbidden):
             with self.assertRaises(ValueError) as exc:
                 quandl.fetch_time_series("WIKI:FB", None)
                 self.assertRegex(exc.message, "premium")
@@ -86,64 +89,19 @@ class QuandlPriceFetcher(unittest.TestCase):
                 quandl.fetch_time_series("WIKI:FB", None)
                 self.assertRegex(exc.message, "premium")
 
+    def test_error_closes_response(self):
+        with response(None, 404) as get:
+            with self.assertRaises(quandl.QuandlError):
+                quandl.fetch_time_series("WIKI:FB", None)
+        get.return_value.close.assert_called_once_with()
+
     def _test_valid_response(self):
-        contents = {
-            "dataset": {
-                "collapse": None,
-                "column_index": None,
-                "column_names": [
-                    "Date",
-                    "Open",
-                    "High",
-                    "Low",
-                    "Close",
-                    "Volume",
-                    "Ex-Dividend",
-                    "Split Ratio",
-                    "Adj. Open",
-                    "Adj. High",
-                    "Adj. Low",
-                    "Adj. Close",
-                    "Adj. Volume",
-                ],
-                "data": [
-                    [
-                        "2018-03-27",
-                        1063.9,
-                        1064.54,
-                        997.62,
-                        1006.94,
-                        2940957.0,
-                        0.0,
-                        1.0,
-                        1063.9,
-                        1064.54,
-                        997.62,
-                        1006.94,
-                        2940957.0,
-                    ]
-                ],
-                "database_code": "WIKI",
-                "database_id": 4922,
-                "dataset_code": "GOOGL",
-                "description": "This dataset has no description.",
-                "end_date": "2018-03-27",
-                "frequency": "daily",
-                "id": 11304017,
-                "limit": 1,
-                "name": (
-                    "Alphabet Inc (GOOGL) Prices, Dividends, Splits and " "Trading Volume"
-                ),
-                "newest_available_date": "2018-03-27",
-                "oldest_available_date": "2004-08-19",
-                "order": None,
-                "premium": False,
-                "refreshed_at": "2018-03-27T21:46:11.201Z",
-                "start_date": "2004-08-19",
-                "transform": None,
-                "type": "Time Series",
-            }
-        }
+        contents = (
+            "Date,Open,High,Low,Close,Volume,Ex-Dividend,Split Ratio,"
+            "Adj. Open,Adj. High,Adj. Low,Adj. Close,Adj. Volume\n"
+            "2018-03-27,1063.9,1064.54,997.62,1006.94,2940957.0,0.0,1.0,"
+            "1063.9,1064.54,997.62,1006.94,2940957.0\n"
+        )
         with response(contents):
             srcprice = quandl.fetch_time_series("WIKI:FB", None)
             self.assertIsInstance(srcprice, source.SourcePrice)
@@ -161,30 +119,10 @@ class QuandlPriceFetcher(unittest.TestCase):
                 self._test_valid_response()
 
     def test_non_standard_columns(self):
-        contents = {
-            "dataset": {
-                "collapse": None,
-                "column_index": None,
-                "column_names": [
-                    "Date",
-                    "USD (AM)",
-                    "USD (PM)",
-                    "GBP (AM)",
-                    "GBP (PM)",
-                    "EURO (AM)",
-                    "EURO (PM)",
-                ],
-                "data": [
-                    ["2019-06-18", 1344.55, 1341.35, 1073.22, 1070.67, 1201.89, 1198.09]
-                ],
-                "end_date": "2019-06-18",
-                "frequency": "daily",
-                "order": None,
-                "limit": 1,
-                "start_date": "2019-06-08",
-                "transform": None,
-            }
-        }
+        contents = (
+            "Date,USD (AM),USD (PM),GBP (AM),GBP (PM),EURO (AM),EURO (PM)\n"
+            "2019-06-18,1344.55,1341.35,1073.22,1070.67,1201.89,1198.09\n"
+        )
         with response(contents):
             srcprice = quandl.fetch_time_series("LBMA:GOLD:USD_(PM)", None)
             self.assertIsInstance(srcprice, source.SourcePrice)
@@ -196,6 +134,62 @@ class QuandlPriceFetcher(unittest.TestCase):
             )
             self.assertEqual(None, srcprice.quote_currency)
 
+    def test_no_data(self):
+        with response("Date,Open,High,Low,Close\n"):
+            with self.assertRaises(quandl.QuandlError):
+                quandl.fetch_time_series("WIKI:FB", None)
+
+    def test_invalid_columns(self):
+        with response("Date,Open,High,Low\n2018-03-27,1063.9,1064.54,997.62\n"):
+            with self.assertRaises(quandl.QuandlError):
+                quandl.fetch_time_series("WIKI:FB", None)
+
+    @mock.patch.dict(quandl._COLUMN_NAMES, clear=True)
+    def test_get_prices_series(self):
+        metadata = mock.Mock(status_code=requests.codes.ok)
+        metadata.json.return_value = {
+            "dataset": {"column_names": ["Date", "Open", "Close", "Adj. Close"]}
+        }
+        series = mock.Mock(status_code=requests.codes.ok)
+        series.iter_lines.side_effect = lambda **kwargs: iter(
+            ["Date,Adj. Close", "2018-03-26,1005.1", "2018-03-27,1006.94", ""]
+        )
+
+        def get(url, params, **kwargs):
+            return metadata if url.endswith("metadata.json") else series
+
+        time_begin = datetime.datetime(2018, 3, 26, tzinfo=tz.tzutc())
+        time_end = datetime.datetime(2018, 3, 28, tzinfo=tz.tzutc())
+        with mock.patch("beanprice.net_utils.get", side_effect=get) as mock_get:
+            fetcher = quandl.Source()
+            srcprices = fetcher.get_prices_series("WIKI:FB", time_begin, time_end)
+            # The column names are only fetched once per dataset.
+            fetcher.get_prices_series("WIKI:FB", time_begin, time_end)
+        self.assertEqual(3, mock_get.call_count)
+        # The streamed responses are closed once read.
+        self.assertEqual(1, metadata.close.call_count)
+        self.assertEqual(2, series.close.call_count)
+        self.assertEqual(
+            {
+                "column_index": 3,
+                "start_date": "2018-03-26",
+                "end_date": "2018-03-28",
+                "order": "asc",
+            },
+            mock_get.call_args[1]["params"],
+        )
+        self.assertEqual(
+            [
+                source.SourcePrice(Decimal("1005.1"), time_begin, None),
+                source.SourcePrice(
+                    Decimal("1006.94"),
+                    datetime.datetime(2018, 3, 27, tzinfo=tz.tzutc()),
+                    None,
+                ),
+            ],
+            srcprices,
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -21,6 +21,7 @@ import requests
 from dateutil.tz import tz
 from dateutil.parser import parse
 
+from beanprice import net_utils
 from beanprice import source
 
 
@@ -49,7 +50,7 @@ def _get_quote(ticker, date):
         "base": base,
         "symbol": symbol,
     }
-    response = requests.get(url="https://api.frankfurter.app/" + date, params=params)
+    response = net_utils.get(url="https://api.frankfurter.app/" + date, params=params)
 
     if response.status_code != requests.codes.ok:
         raise RatesApiError(
@@ -64,9 +65,42 @@ def _get_quote(ticker, date):
     return source.SourcePrice(price, time, symbol)
 
 
+def _get_series(ticker, time_begin, time_end):
+    """Fetch a series of exchangerates from ratesapi."""
+    base, symbol = _parse_ticker(ticker)
+    params = {
+        "base": base,
+        "symbols": symbol,
+    }
+    url = "https://api.frankfurter.app/{}..{}".format(
+        time_begin.date().isoformat(), time_end.date().isoformat()
+    )
+    response = net_utils.get(url=url, params=params)
+
+    if response.status_code != requests.codes.ok:
+        raise RatesApiError(
+            "Invalid response ({}): {}".format(response.status_code, response.text)
+        )
+
+    result = response.json()
+
+    series = []
+    for date, rates in sorted(result["rates"].items()):
+        if symbol not in rates:
+            continue
+        price = Decimal(str(rates[symbol]))
+        time = parse(date).replace(tzinfo=tz.tzutc())
+        if time_begin <= time <= time_end:
+            series.append(source.SourcePrice(price, time, symbol))
+    return series
+
+
 class Source(source.Source):
     def get_latest_price(self, ticker):
         return _get_quote(ticker, "latest")
 
     def get_historical_price(self, ticker, time):
         return _get_quote(ticker, time.date().isoformat())
+
+    def get_prices_series(self, ticker, time_begin, time_end):
+        return _get_series(ticker, time_begin, time_end)
@@ -17,7 +17,7 @@ def response(contents, status_code=requests.codes.ok):
     response.status_code = status_code
     response.text = ""
     response.json.return_value = contents
-    return mock.patch("requests.get", return_value=response)
+    return mock.patch("beanprice.net_utils.get", return_value=response)
 
 
 class RatesapiPriceFetcher(unittest.TestCase):
@@ -58,6 +58,32 @@ class RatesapiPriceFetcher(unittest.TestCase):
                 datetime.datetime(2018, 3, 27, 0, 0, 0, tzinfo=tz.tzutc()), srcprice.time
             )
 
+    def test_get_prices_series(self):
+        time_begin = datetime.datetime(2018, 3, 26, 0, 0, 0, tzinfo=tz.tzutc())
+        time_end = datetime.datetime(2018, 3, 29, 0, 0, 0, tzinfo=tz.tzutc())
+        contents = {
+            "base": "EUR",
+            "start_date": "2018-03-26",
+            "end_date": "2018-03-29",
+            "rates": {
+                "2018-03-28": {"CHF": 1.1777},
+                "2018-03-26": {"CHF": 1.1725},
+                "2018-03-27": {"CHF": 1.1762},
+                "2018-03-29": {"CHF": 1.1781},
+            },
+        }
+        with response(contents) as get:
+            series = ratesapi.Source().get_prices_series("EUR-CHF", time_begin, time_end)
+        self.assertEqual(1, get.call_count)
+        self.assertEqual(
+            "https://api.frankfurter.app/2018-03-26..2018-03-29", get.call_args[1]["url"]
+        )
+        self.assertEqual(
+            [Decimal("1.1725"), Decimal("1.1762"), Decimal("1.1777"), Decimal("1.1781")],
+            [srcprice.price for srcprice in series],
+        )
+        self.assertEqual(time_end, series[-1].time)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -11,13 +11,17 @@ https://secure.tsp.gov/components/CORS/
 __copyright__ = "Copyright (C) 2020 Martin Blais"
 __license__ = "GNU GPLv2"
 
+import bisect
 import csv
 from collections import OrderedDict
 import datetime
 from decimal import Decimal
+import threading
+from typing import List, Optional
 
 import requests
 
+from beanprice import net_utils
 from beanprice import source
 
 # All of the TSP funds are in USD.
@@ -25,6 +29,25 @@ CURRENCY = "USD"
 
 TIMEZONE = datetime.timezone(datetime.timedelta(hours=-4), "America/New_York")
 
+# The names of the columns of the funds in the CSV, in the same order.
+TSP_FUND_COLUMNS = [
+    "L Income",
+    "L 2025",
+    "L 2030",
+    "L 2035",
+    "L 2040",
+    "L 2045",
+    "L 2050",
+    "L 2055",
+    "L 2060",
+    "L 2065",
+    "G Fund",
+    "F Fund",
+    "C Fund",
+    "S Fund",
+    "I Fund",
+]
+
 TSP_FUND_NAMES = [
     "LInco",  # 0
     "L2025",  # 1
@@ -75,25 +98,8 @@ def parse_tsp_csv(response: requests.models.Response) -> OrderedDict:
         # There is indeed a period after the day of month.
         date = datetime.datetime.strptime(row["Date"], "%b %d. %Y")
         date = date.replace(hour=16, tzinfo=TIMEZONE)
-        names = [
-            "L Income",
-            "L 2025",
-            "L 2030",
-            "L 2035",
-            "L 2040",
-            "L 2045",
-            "L 2050",
-            "L 2055",
-            "L 2060",
-            "L 2065",
-            "G Fund",
-            "F Fund",
-            "C Fund",
-            "S Fund",
-            "I Fund",
-        ]
         data[date] = [
-            Decimal(row[name]) if row[name] else Decimal() for name in map(str.strip, names)
+            Decimal(row[name]) if row[name] else Decimal() for name in TSP_FUND_COLUMNS
         ]
 
     return OrderedDict(sorted(data.items(), key=lambda t: t[0], reverse=True))
@@ -111,8 +117,102 @@ def parse_response(response: requests.models.Response) -> OrderedDict:
     return parse_tsp_csv(response)
 
 
+class PriceTable:
+    """The prices of all the funds over a range of dates.
+
+    The prices are stored by column, one list per fund in the order of
+    TSP_FUND_NAMES, aligned with the sorted list of trade times.
+    """
+
+    def __init__(self, start_date: datetime.date, end_date: datetime.date, data):
+        """Create a table from the parsed response of a request.
+
+        Args:
+          start_date: The first date requested.
+          end_date: The last date requested.
+          data: A mapping of trade time to the list of prices of the funds.
+        """
+        self.start_date = start_date
+        self.end_date = end_date
+        self.times = sorted(data)
+        self.dates = [time.date() for time in self.times]
+        self.columns = [
+            [data[time][index] for time in self.times]
+            for index in range(len(TSP_FUND_NAMES))
+        ]
+
+    def covers(self, start_date: datetime.date, end_date: datetime.date) -> bool:
+        """Return true if the table holds all the prices between two dates."""
+        return self.start_date <= start_date and end_date <= self.end_date
+
+    def get_price(self, fund: str, date: datetime.date) -> Optional[source.SourcePrice]:
+        """Return the price of a fund on the latest trade date at or before a date.
+
+        Returns:
+          A SourcePrice, or None if the table does not cover the date or holds
+          no trade date before it.
+        """
+        if not self.start_date <= date <= self.end_date:
+            return None
+        index = bisect.bisect_right(self.dates, date) - 1
+        if index < 0:
+            return None
+        column = self.columns[TSP_FUND_NAMES.index(fund)]
+        return source.SourcePrice(column[index], self.times[index], CURRENCY)
+
+    def get_prices(
+        self, fund: str, start_date: datetime.date, end_date: datetime.date
+    ) -> List[source.SourcePrice]:
+        """Return the prices of a fund between two dates."""
+        column = self.columns[TSP_FUND_NAMES.index(fund)]
+        begin = bisect.bisect_left(self.dates, start_date)
+        end = bisect.bisect_right(self.dates, end_date)
+        return [
+            source.SourcePrice(column[index], self.times[index], CURRENCY)
+            for index in range(begin, end)
+        ]
+
+
+def _check_fund(fund):
+    if fund not in TSP_FUND_NAMES:
+        raise TSPError(
+            "Invalid TSP Fund Name '{}'. Valid Funds are:\n\t{}".format(
+                fund, "\n\t".join(TSP_FUND_NAMES)
+            )
+        )
+
+
 class Source(source.Source):
-    "US Thrift Savings Plan API Price Extractor"
+    """US Thrift Savings Plan API Price Extractor
+
+    The prices of all the funds are fetched together. The tables fetched are
+    kept for the lifetime of the source and serve all the funds and dates they
+    cover.
+    """
+
+    def __init__(self):
+        self._tables: List[PriceTable] = []
+        self._lock = threading.Lock()
+
+    def _get_table(self, start_date, end_date) -> PriceTable:
+        """Return a table of the prices of all the funds between two dates."""
+        with self._lock:
+            for table in self._tables:
+                if table.covers(start_date, end_date):
+                    return table
+
+            url = "https://secure.tsp.gov/components/CORS/getSharePricesRaw.html"
+            payload = {
+                "startdate": start_date.strftime("%Y%m%d"),
+                "enddate": end_date.strftime("%Y%m%d"),
+                "download": "0",
+                "Lfunds": "1",
+                "InvFunds": "1",
+            }
+            response = net_utils.get(url, params=payload)
+            table = PriceTable(start_date, end_date, parse_response(response))
+            self._tables.append(table)
+            return table
 
     def get_latest_price(self, fund):
         """See contract in beanprice.source.Source."""
@@ -120,36 +220,30 @@ class Source(source.Source):
 
     def get_historical_price(self, fund, time):
         """See contract in beanprice.source.Source."""
-        if requests is None:
-            raise TSPError("You must install the 'requests' library.")
-
-        if fund not in TSP_FUND_NAMES:
-            raise TSPError(
-                "Invalid TSP Fund Name '{}'. Valid Funds are:\n\t{}".format(
-                    fund, "\n\t".join(TSP_FUND_NAMES)
-                )
-            )
-
-        url = "https://secure.tsp.gov/components/CORS/getSharePricesRaw.html"
-        payload = {
-            # Grabbing the last fourteen days of data in event the markets were closed.
-            "startdate": (time - datetime.timedelta(days=14)).strftime("%Y%m%d"),
-            "enddate": time.strftime("%Y%m%d"),
-            "download": "0",
-            "Lfunds": "1",
-            "InvFunds": "1",
-        }
-
-        response = requests.get(url, params=payload)
-        result = parse_response(response)
-        trade_day = next(iter(result.items()))
-        prices = trade_day[1]
-
-        try:
-            price = prices[TSP_FUND_NAMES.index(fund)]
-
-            trade_time = trade_day[0]
-        except KeyError as exc:
-            raise TSPError("Invalid response from TSP: {}".format(repr(result))) from exc
-
-        return source.SourcePrice(price, trade_time, CURRENCY)
+        _check_fund(fund)
+
+        # Any table holding a trade date between its start and the date has the
+        # price, as it holds all the trade dates in between.
+        date = time.date()
+        with self._lock:
+            for table in self._tables:
+                srcprice = table.get_price(fund, date)
+                if srcprice is not None:
+                    return srcprice
+
+        # Grabbing the last fourteen days of data in event the markets were closed.
+        table = self._get_table(date - datetime.timedelta(days=14), date)
+        srcprice = table.get_price(fund, date)
+        if srcprice is None:
+            raise TSPError("Invalid response from TSP: no prices before {}".format(date))
+        return srcprice
+
+    def get_prices_series(self, fund, time_begin, time_end):
+        """See contract in beanprice.source.Source."""
+        _check_fund(fund)
+        table = self._get_table(time_begin.date(), time_end.date())
+        return [
+            srcprice
+            for srcprice in table.get_prices(fund, time_begin.date(), time_end.date())
+            if time_begin <= srcprice.time <= time_end
+        ]
@@ -78,7 +78,7 @@ class MockResponse:
 class TSPFinancePriceFetcher(unittest.TestCase):
     def test_get_latest_price_L2050(self):
         response = MockResponse(textwrap.dedent(CURRENT_DATA))
-        with mock.patch("requests.get", return_value=response):
+        with mock.patch("beanprice.net_utils.get", return_value=response):
             srcprice = tsp.Source().get_latest_price("L2050")
         self.assertTrue(isinstance(srcprice.price, Decimal))
         self.assertEqual(Decimal("22.2736"), srcprice.price)
@@ -90,7 +90,7 @@ class TSPFinancePriceFetcher(unittest.TestCase):
 
     def test_get_latest_price_SFund(self):
         response = MockResponse(textwrap.dedent(CURRENT_DATA))
-        with mock.patch("requests.get", return_value=response):
+        with mock.patch("beanprice.net_utils.get", return_value=response):
             srcprice = tsp.Source().get_latest_price("SFund")
         self.assertTrue(isinstance(srcprice.price, Decimal))
         self.assertEqual(Decimal("55.2910"), srcprice.price)
@@ -102,7 +102,7 @@ class TSPFinancePriceFetcher(unittest.TestCase):
 
     def test_get_historical_price(self):
         response = MockResponse(textwrap.dedent(HISTORIC_DATA))
-        with mock.patch("requests.get", return_value=response):
+        with mock.patch("beanprice.net_utils.get", return_value=response):
             srcprice = tsp.Source().get_historical_price(
                 "CFund", time=datetime.datetime(2020, 6, 19)
             )
@@ -117,7 +117,7 @@ class TSPFinancePriceFetcher(unittest.TestCase):
     def test_get_historical_price_L2060(self):
         # This fund did not exist until 01 Jul 2020. Ensuring we get a Decimal(0.0) back.
         response = MockResponse(textwrap.dedent(HISTORIC_DATA))
-        with mock.patch("requests.get", return_value=response):
+        with mock.patch("beanprice.net_utils.get", return_value=response):
             srcprice = tsp.Source().get_historical_price(
                 "L2060", time=datetime.datetime(2020, 6, 19)
             )
@@ -129,6 +129,48 @@ class TSPFinancePriceFetcher(unittest.TestCase):
         )
         self.assertEqual("USD", srcprice.quote_currency)
 
+    def test_shared_table(self):
+        # All the funds and dates covered by a download are served from it.
+        response = MockResponse(textwrap.dedent(CURRENT_DATA))
+        source = tsp.Source()
+        with mock.patch("beanprice.net_utils.get", return_value=response) as mock_get:
+            time = datetime.datetime(2020, 7, 15)
+            self.assertEqual(
+                Decimal("22.2736"), source.get_historical_price("L2050", time).price
+            )
+            self.assertEqual(
+                Decimal("55.2910"), source.get_historical_price("SFund", time).price
+            )
+            self.assertEqual(
+                Decimal("29.6343"),
+                source.get_historical_price("IFund", datetime.datetime(2020, 7, 11)).price,
+            )
+        self.assertEqual(1, mock_get.call_count)
+
+    def test_get_prices_series(self):
+        response = MockResponse(textwrap.dedent(CURRENT_DATA))
+        timezone = datetime.timezone(datetime.timedelta(hours=-4), "America/New_York")
+        with mock.patch("beanprice.net_utils.get", return_value=response) as mock_get:
+            srcprices = tsp.Source().get_prices_series(
+                "CFund",
+                datetime.datetime(2020, 7, 8, tzinfo=timezone),
+                datetime.datetime(2020, 7, 13, 23, tzinfo=timezone),
+            )
+        self.assertEqual(1, mock_get.call_count)
+        self.assertEqual(
+            {"startdate": "20200708", "enddate": "20200713"},
+            {key: mock_get.call_args[1]["params"][key] for key in ("startdate", "enddate")},
+        )
+        self.assertEqual(
+            [
+                (datetime.datetime(2020, 7, 8, 16, tzinfo=timezone), Decimal("46.8131")),
+                (datetime.datetime(2020, 7, 9, 16, tzinfo=timezone), Decimal("46.5615")),
+                (datetime.datetime(2020, 7, 10, 16, tzinfo=timezone), Decimal("47.0497")),
+                (datetime.datetime(2020, 7, 13, 16, tzinfo=timezone), Decimal("46.6089")),
+            ],
+            [(srcprice.time, srcprice.price) for srcprice in srcprices],
+        )
+
     def test_invalid_fund_latest(self):
         with self.assertRaises(tsp.TSPError):
             tsp.Source().get_latest_price("InvalidFund")
@@ -18,9 +18,12 @@ timestamps, but the timezone of the particular market is included in the output.
 __copyright__ = "Copyright (C) 2015-2020  Martin Blais"
 __license__ = "GNU GPLv2"
 
+import bisect
+import collections
 from datetime import datetime, timedelta, timezone
 from decimal import Decimal
-from typing import Any, Dict, List, Optional, Tuple, Union
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
 
 from curl_cffi import requests
 
@@ -31,8 +34,8 @@ class YahooError(ValueError):
     "An error from the Yahoo API."
 
 
-def parse_response(response: requests.models.Response) -> Dict:
-    """Process as response from Yahoo.
+def parse_response_results(response: requests.models.Response) -> List[Dict]:
+    """Process as response from Yahoo and return all of its results.
 
     Raises:
       YahooError: If there is an error in the response.
@@ -51,7 +54,16 @@ def parse_response(response: requests.models.Response) -> Dict:
         raise YahooError("Error fetching Yahoo data: {}".format(content["error"]))
     if not content["result"]:
         raise YahooError("No data returned from Yahoo, ensure that the symbol is correct")
-    return content["result"][0]
+    return content["result"]
+
+
+def parse_response(response: requests.models.Response) -> Dict:
+    """Process as response from Yahoo.
+
+    Raises:
+      YahooError: If there is an error in the response.
+    """
+    return parse_response_results(response)[0]
 
 
 # Note: Feel free to suggest more here via a PR.
@@ -69,6 +81,10 @@ def parse_currency(result: Dict[str, Any]) -> Optional[str]:
     return _MARKETS.get(result["market"], None)
 
 
+# The maximum number of symbols we request in a single v7 quote query.
+_MAX_QUOTE_SYMBOLS = 100
+
+
 _DEFAULT_PARAMS = {
     "lang": "en-US",
     "corsDomain": "finance.yahoo.com",
@@ -76,16 +92,10 @@ _DEFAULT_PARAMS = {
 }
 
 
-def get_price_series(
-    ticker: str,
-    time_begin: datetime,
-    time_end: datetime,
-    session: requests.Session,
-) -> Tuple[List[Tuple[datetime, Decimal]], str]:
-    """Return a series of timestamped prices."""
-
-    if requests is None:
-        raise YahooError("You must install the 'requests' library.")
+def _price_series_request(
+    ticker: str, time_begin: datetime, time_end: datetime
+) -> Tuple[str, Dict[str, Union[int, str]]]:
+    """Return the URL and query parameters to fetch a series of prices."""
     url = "https://query1.finance.yahoo.com/v8/finance/chart/{}".format(ticker)
     payload: Dict[str, Union[int, str]] = {
         "period1": int(time_begin.timestamp()),
@@ -93,7 +103,20 @@ def get_price_series(
         "interval": "1d",
     }
     payload.update(_DEFAULT_PARAMS)
-    response = session.get(url, params=payload)  # Use shared session
+    return url, payload
+
+
+def parse_price_series(
+    response: requests.models.Response,
+    ticker: str,
+    time_begin: datetime,
+    time_end: datetime,
+) -> Tuple[List[Tuple[datetime, Decimal]], str]:
+    """Process a chart response from Yahoo into a series of timestamped prices.
+
+    Raises:
+      YahooError: If there is an error in the response.
+    """
     result = parse_response(response)
 
     meta = result["meta"]
@@ -120,8 +143,116 @@ def get_price_series(
     return series, currency
 
 
+def get_price_series(
+    ticker: str,
+    time_begin: datetime,
+    time_end: datetime,
+    session: requests.Session,
+) -> Tuple[List[Tuple[datetime, Decimal]], str]:
+    """Return a series of timestamped prices."""
+
+    if requests is None:
+        raise YahooError("You must install the 'requests' library.")
+    url, payload = _price_series_request(ticker, time_begin, time_end)
+    response = session.get(url, params=payload)  # Use shared session
+    return parse_price_series(response, ticker, time_begin, time_end)
+
+
+# The number of days before the time of a historical query in which its price is
+# searched for.
+_HISTORICAL_LOOKBACK = timedelta(days=5)
+
+
+# A chunk of the daily prices of a ticker, loaded once to answer all the
+# historical queries falling in it.
+#
+# Attributes:
+#   times: A sorted list of the datetimes of the prices.
+#   prices: A list of Decimal prices, parallel to 'times'.
+#   currency: A string, the quote currency of the prices.
+#   time_end: A datetime, the end of the span loaded. This is before the end of
+#     the chunk if the chunk was loaded before it was over.
+class _Chunk(NamedTuple):
+    times: List[datetime]
+    prices: List[Decimal]
+    currency: str
+    time_end: datetime
+
+
+def _chunk_span(year: int) -> Tuple[datetime, datetime]:
+    """Return the span of time of the chunk of a year, up to the present."""
+    time_begin = datetime(year, 1, 1, tzinfo=timezone.utc)
+    time_end = datetime(year + 1, 1, 1, tzinfo=timezone.utc)
+    return time_begin, min(time_end, datetime.now(timezone.utc))
+
+
+def _chunk_years(time: datetime) -> List[int]:
+    """Return the years of the chunks holding the prices of a historical query.
+
+    The years are returned newest first, the order they should be searched in.
+    """
+    time_begin = (time - _HISTORICAL_LOOKBACK).astimezone(timezone.utc)
+    return list(range(time.astimezone(timezone.utc).year, time_begin.year - 1, -1))
+
+
+def _make_chunk(
+    series: List[Tuple[datetime, Decimal]], currency: str, time_end: datetime
+) -> _Chunk:
+    """Make a chunk from a series of timestamped prices."""
+    points = sorted(series)
+    return _Chunk(
+        [data_dt for data_dt, _ in points],
+        [price for _, price in points],
+        currency,
+        time_end,
+    )
+
+
+def find_chunk_price(chunk: _Chunk, time: datetime) -> Optional[source.SourcePrice]:
+    """Find the latest price of a chunk strictly before the given time.
+
+    Returns:
+      A SourcePrice, or None if the chunk has no price within the lookback
+      period before that time.
+    """
+    index = bisect.bisect_left(chunk.times, time) - 1
+    if index < 0 or chunk.times[index] < time - _HISTORICAL_LOOKBACK:
+        return None
+    return source.SourcePrice(chunk.prices[index], chunk.times[index], chunk.currency)
+
+
+def parse_quote(result: Dict[str, Any]) -> source.SourcePrice:
+    """Convert a single v7 quote result to a SourcePrice.
+
+    Raises:
+      YahooError: If the result is missing some of the required fields.
+    """
+    try:
+        price = Decimal(result["regularMarketPrice"])
+
+        tzone = timezone(
+            timedelta(hours=result["gmtOffSetMilliseconds"] / 3600000),
+            result["exchangeTimezoneName"],
+        )
+        trade_time = datetime.fromtimestamp(result["regularMarketTime"], tz=tzone)
+    except KeyError as exc:
+        raise YahooError("Invalid response from Yahoo: {}".format(repr(result))) from exc
+
+    currency = parse_currency(result)
+
+    return source.SourcePrice(price, trade_time, currency)
+
+
 class Source(source.Source):
-    "Yahoo Finance CSV API price extractor."
+    """Yahoo Finance CSV API price extractor.
+
+    Historical prices are answered from the daily prices of their ticker, which
+    are loaded a year at a time and kept for the lifetime of the source.
+    """
+
+    # An asynchronous session sharing the same headers and cookies, created on
+    # first use from within the event loop.
+    async_session: Optional[requests.AsyncSession] = None
 
     def __init__(self):
         """Initialize a shared session with the required headers and cookies."""
@@ -144,43 +275,114 @@ class Source(source.Source):
         self.crumb = self.session.get(
             "https://query1.finance.yahoo.com/v1/test/getcrumb"
         ).text
+        # The chunks of daily prices loaded, by ticker and year, and a lock per
+        # ticker serializing their loading.
+        self._chunks: Dict[Tuple[str, int], _Chunk] = {}
+        self._lock = threading.Lock()
+        self._ticker_locks: Dict[str, threading.Lock] = collections.defaultdict(
+            threading.Lock
+        )
 
-    def get_latest_price(self, ticker: str) -> Optional[source.SourcePrice]:
+    def close(self) -> None:
+        """See contract in beanprice.source.Source."""
+        self.session.close()
+
+    async def aclose(self) -> None:
         """See contract in beanprice.source.Source."""
+        if self.async_session is not None:
+            await self.async_session.close()
+            self.async_session = None
+
+    def _get_async_session(self) -> requests.AsyncSession:
+        """Return the asynchronous session, creating it if needed."""
+        if self.async_session is None:
+            self.async_session = requests.AsyncSession(
+                impersonate="chrome",
+                headers=dict(self.session.headers),
+                cookies=self.session.cookies,
+            )
+        return self.async_session
 
+    def _quotes_request(self, tickers: List[str]) -> Tuple[str, Dict[str, str]]:
+        """Return the URL and query parameters to fetch v7 quotes for tickers."""
         url = "https://query1.finance.yahoo.com/v7/finance/quote"
         fields = ["symbol", "regularMarketPrice", "regularMarketTime"]
         payload = {
-            "symbols": ticker,
+            "symbols": ",".join(tickers),
             "fields": ",".join(fields),
             "exchange": "NYSE",
             "crumb": self.crumb,  # Use the session’s crumb
         }
         payload.update(_DEFAULT_PARAMS)
+        return url, payload
+
+    def _fetch_quotes(self, tickers: List[str]) -> List[Dict]:
+        """Fetch the v7 quote results for a list of tickers in a single request."""
+        url, payload = self._quotes_request(tickers)
         response = self.session.get(url, params=payload)  # Use shared session
+        return parse_response_results(response)
+
+    def _get_chunk(self, ticker: str, year: int, time: datetime) -> _Chunk:
+        """Return the chunk of the prices of a ticker in a year, loading it if needed.
+
+        A chunk loaded before the given time is loaded again, as it may miss
+        prices before that time.
+        """
+        with self._lock:
+            ticker_lock = self._ticker_locks[ticker]
+        with ticker_lock:
+            chunk = self._chunks.get((ticker, year))
+            if chunk is None or chunk.time_end < time:
+                time_begin, time_end = _chunk_span(year)
+                series, currency = get_price_series(
+                    ticker, time_begin, time_end, self.session
+                )
+                chunk = _make_chunk(series, currency, time_end)
+                self._chunks[(ticker, year)] = chunk
+            return chunk
+
+    async def _get_chunk_async(self, ticker: str, year: int, time: datetime) -> _Chunk:
+        """Return the chunk of the prices of a ticker in a year, loading it if needed."""
+        chunk = self._chunks.get((ticker, year))
+        if chunk is None or chunk.time_end < time:
+            time_begin, time_end = _chunk_span(year)
+            url, payload = _price_series_request(ticker, time_begin, time_end)
+            response = await self._get_async_session().get(url, params=payload)
+            series, currency = parse_price_series(response, ticker, time_begin, time_end)
+            chunk = _make_chunk(series, currency, time_end)
+            self._chunks[(ticker, year)] = chunk
+        return chunk
+
+    def get_latest_price(self, ticker: str) -> Optional[source.SourcePrice]:
+        """See contract in beanprice.source.Source."""
 
         try:
-            result = parse_response(response)
+            result = self._fetch_quotes([ticker])[0]
         except YahooError as error:
             # The parse_response method cannot know which ticker failed,
             # but the user definitely needs to know which ticker failed!
             raise YahooError("%s (ticker: %s)" % (error, ticker)) from error
-        try:
-            price = Decimal(result["regularMarketPrice"])
+        return parse_quote(result)
 
-            tzone = timezone(
-                timedelta(hours=result["gmtOffSetMilliseconds"] / 3600000),
-                result["exchangeTimezoneName"],
-            )
-            trade_time = datetime.fromtimestamp(result["regularMarketTime"], tz=tzone)
-        except KeyError as exc:
-            raise YahooError(
-                "Invalid response from Yahoo: {}".format(repr(result))
-            ) from exc
-
-        currency = parse_currency(result)
-
-        return source.SourcePrice(price, trade_time, currency)
+    def get_latest_prices(self, tickers: List[str]) -> Dict[str, source.SourcePrice]:
+        """See contract in beanprice.source.Source."""
+        prices = {}
+        for index in range(0, len(tickers), _MAX_QUOTE_SYMBOLS):
+            chunk = tickers[index : index + _MAX_QUOTE_SYMBOLS]
+            # Yahoo returns the symbols in upper case.
+            by_symbol = {
+                result.get("symbol", "").upper(): result
+                for result in self._fetch_quotes(chunk)
+            }
+            for ticker in chunk:
+                result = by_symbol.get(ticker.upper(), None)
+                if result is None:
+                    continue
+                try:
+                    prices[ticker] = parse_quote(result)
+                except (KeyError, YahooError):
+                    continue
+        return prices
 
     def get_historical_price(
         self, ticker: str, time: datetime
@@ -188,22 +390,42 @@ class Source(source.Source):
         """See contract in beanprice.source.Source."""
 
         # Get the latest data returned over the last 5 days.
-        series, currency = get_price_series(
-            ticker, time - timedelta(days=5), time, self.session
-        )
-        latest = None
-        for data_dt, price in sorted(series):
-            if data_dt >= time:
-                break
-            latest = data_dt, price
-        if latest is None:
-            raise YahooError("Could not find price before {} in {}".format(time, series))
+        for year in _chunk_years(time):
+            srcprice = find_chunk_price(self._get_chunk(ticker, year, time), time)
+            if srcprice is not None:
+                return srcprice
+        raise YahooError("Could not find price before {} for {}".format(time, ticker))
 
-        return source.SourcePrice(price, data_dt, currency)
+    async def get_latest_price_async(self, ticker: str) -> Optional[source.SourcePrice]:
+        """See contract in beanprice.source.Source."""
+        url, payload = self._quotes_request([ticker])
+        response = await self._get_async_session().get(url, params=payload)
+        try:
+            result = parse_response(response)
+        except YahooError as error:
+            raise YahooError("%s (ticker: %s)" % (error, ticker)) from error
+        return parse_quote(result)
 
-    def get_daily_prices(
+    async def get_historical_price_async(
+        self, ticker: str, time: datetime
+    ) -> Optional[source.SourcePrice]:
+        """See contract in beanprice.source.Source."""
+        for year in _chunk_years(time):
+            chunk = await self._get_chunk_async(ticker, year, time)
+            srcprice = find_chunk_price(chunk, time)
+            if srcprice is not None:
+                return srcprice
+        raise YahooError("Could not find price before {} for {}".format(time, ticker))
+
+    def get_prices_series(
         self, ticker: str, time_begin: datetime, time_end: datetime
     ) -> Optional[List[source.SourcePrice]]:
         """See contract in beanprice.source.Source."""
         series, currency = get_price_series(ticker, time_begin, time_end, self.session)
         return [source.SourcePrice(price, time, currency) for time, price in series]
+
+    def get_daily_prices(
+        self, ticker: str, time_begin: datetime, time_end: datetime
+    ) -> Optional[List[source.SourcePrice]]:
+        """Deprecated name of get_prices_series(), kept for existing callers."""
+        return self.get_prices_series(ticker, time_begin, time_end)
@@ -1,6 +1,7 @@
 __copyright__ = "Copyright (C) 2015-2020  Martin Blais"
 __license__ = "GNU GPLv2"
 
+import asyncio
 import datetime
 import json
 import textwrap
@@ -66,6 +67,82 @@ class YahooFinancePriceFetcher(unittest.TestCase):
             with date_utils.intimezone(tzname):
                 self._test_get_latest_price()
 
+    def test_get_latest_prices(self):
+        response = MockResponse(
+            textwrap.dedent("""
+            {"quoteResponse":
+             {"error": null,
+              "result": [{"exchangeTimezoneName": "America/Toronto",
+                          "gmtOffSetMilliseconds": -14400000,
+                          "market": "ca_market",
+                          "regularMarketPrice": 29.99,
+                          "regularMarketTime": 1522353589,
+                          "symbol": "XSP.TO"},
+                         {"exchangeTimezoneName": "America/New_York",
+                          "gmtOffSetMilliseconds": -14400000,
+                          "market": "us_market",
+                          "regularMarketPrice": 168.34,
+                          "regularMarketTime": 1522353600,
+                          "symbol": "AAPL"}]}}
+            """)
+        )
+        with mock.patch.object(yahoo.requests.Session, "get"):
+            yahoo_source = yahoo.Source()
+        with mock.patch.object(yahoo_source.session, "get", return_value=response) as get:
+            srcprices = yahoo_source.get_latest_prices(["XSP.TO", "AAPL", "INVALID"])
+        self.assertEqual(1, get.call_count)
+        self.assertEqual("XSP.TO,AAPL,INVALID", get.call_args[1]["params"]["symbols"])
+        self.assertEqual({"XSP.TO", "AAPL"}, set(srcprices))
+        self.assertEqual(Decimal("29.99"), srcprices["XSP.TO"].price)
+        self.assertEqual("CAD", srcprices["XSP.TO"].quote_currency)
+        self.assertEqual(Decimal("168.34"), srcprices["AAPL"].price)
+        self.assertEqual("USD", srcprices["AAPL"].quote_currency)
+
+    def test_get_latest_prices__lowercase(self):
+        response = MockResponse(
+            textwrap.dedent("""
+            {"quoteResponse":
+             {"error": null,
+              "result": [{"exchangeTimezoneName": "America/Toronto",
+                          "gmtOffSetMilliseconds": -14400000,
+                          "market": "ca_market",
+                          "regularMarketPrice": 29.99,
+                          "regularMarketTime": 1522353589,
+                          "symbol": "XSP.TO"}]}}
+            """)
+        )
+        with mock.patch.object(yahoo.requests.Session, "get"):
+            yahoo_source = yahoo.Source()
+        with mock.patch.object(yahoo_source.session, "get", return_value=response):
+            srcprices = yahoo_source.get_latest_prices(["xsp.to"])
+        self.assertEqual({"xsp.to"}, set(srcprices))
+        self.assertEqual(Decimal("29.99"), srcprices["xsp.to"].price)
+
+    def test_get_latest_price_async(self):
+        response = MockResponse(
+            textwrap.dedent("""
+            {"quoteResponse":
+             {"error": null,
+              "result": [{"exchangeTimezoneName": "America/Toronto",
+                          "gmtOffSetMilliseconds": -14400000,
+                          "market": "ca_market",
+                          "regularMarketPrice": 29.99,
+                          "regularMarketTime": 1522353589,
+                          "symbol": "XSP.TO"}]}}
+            """)
+        )
+        with mock.patch.object(yahoo.requests.Session, "get"):
+            yahoo_source = yahoo.Source()
+        yahoo_source.async_session = mock.MagicMock()
+        yahoo_source.async_session.get = mock.AsyncMock(return_value=response)
+        yahoo_source.async_session.close = mock.AsyncMock()
+        srcprice = asyncio.run(yahoo_source.get_latest_price_async("XSP.TO"))
+        self.assertEqual(Decimal("29.99"), srcprice.price)
+        self.assertEqual("CAD", srcprice.quote_currency)
+
+        asyncio.run(yahoo_source.aclose())
+        self.assertIsNone(yahoo_source.async_session)
+
     def _test_get_historical_price(self):
         response = MockResponse(
             textwrap.dedent("""
@@ -142,6 +219,45 @@ class YahooFinancePriceFetcher(unittest.TestCase):
             with date_utils.intimezone(tzname):
                 self._test_get_historical_price()
 
+    def test_get_historical_price__chunked(self):
+        response = MockResponse(
+            textwrap.dedent("""
+            {"chart":
+             {"error": null,
+              "result": [{"indicators": {"quote": [{"close": [29.48, 29.41, 29.44, 29.47]}]},
+                          "meta": {"currency": "CAD",
+                                   "exchangeTimezoneName": "America/Toronto",
+                                   "gmtoffset": -14400},
+                          "timestamp": [1509111000,
+                                        1509370200,
+                                        1509456600,
+                                        1509543000]}]}}""")
+        )
+        with mock.patch.object(yahoo.requests.Session, "get"):
+            yahoo_source = yahoo.Source()
+        with mock.patch.object(yahoo_source.session, "get", return_value=response) as get:
+            prices = [
+                yahoo_source.get_historical_price(
+                    "XSP.TO", datetime.datetime(2017, 11, day, 16, tzinfo=tz.tzutc())
+                ).price
+                for day in (1, 2)
+            ] + [
+                yahoo_source.get_historical_price(
+                    "XSP.TO", datetime.datetime(2017, 10, 31, 16, tzinfo=tz.tzutc())
+                ).price
+            ]
+            with self.assertRaises(yahoo.YahooError):
+                yahoo_source.get_historical_price(
+                    "XSP.TO", datetime.datetime(2017, 10, 1, 16, tzinfo=tz.tzutc())
+                )
+        self.assertEqual([Decimal("29.47"), Decimal("29.47"), Decimal("29.44")], prices)
+        # A single request loads the prices of the whole year.
+        get.assert_called_once()
+        self.assertEqual(
+            (1483228800, 1514764800),
+            (get.call_args[1]["params"]["period1"], get.call_args[1]["params"]["period2"]),
+        )
+
     def test_parse_response_error_status_code(self):
         response = MockResponse(
             '{"quoteResponse": {"error": "Not supported", "result": [{}]}}', status_code=400
@@ -255,6 +371,16 @@ class YahooFinancePriceFetcher(unittest.TestCase):
             )
             self.assertEqual("USD", srcprice.quote_currency)
 
+    def test_get_daily_prices(self):
+        with mock.patch.object(yahoo.requests.Session, "get"):
+            yahoo_source = yahoo.Source()
+        time_begin = datetime.datetime(2018, 3, 1, tzinfo=datetime.timezone.utc)
+        time_end = datetime.datetime(2018, 3, 5, tzinfo=datetime.timezone.utc)
+        with mock.patch.object(yahoo_source, "get_prices_series") as get_prices_series:
+            result = yahoo_source.get_daily_prices("XSP.TO", time_begin, time_end)
+        get_prices_series.assert_called_once_with("XSP.TO", time_begin, time_end)
+        self.assertIs(get_prices_series.return_value, result)
+
 
 if __name__ == "__main__":
     unittest.main()